@@ -1,8 +1,27 @@
+import time
+STARTUP_T0 = time.perf_counter()  # before pygame's import, for --startup-report
 import pygame
 import sys
 import os
 import random
 import math
+import queue
+import threading
+import argparse
+from collections import OrderedDict
+import struct
+import array
+import json
+from collections import deque
+import gc
+import traceback
+import asyncio
+import sqlite3
+import weakref
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # -------------------------
 # Config
@@ -38,36 +57,366 @@ def find_best_file(prefix, exts=("png","jpg","jpeg","gif","bmp","webp")):
             continue
     return None
 
-def try_load_image_fuzzy(prefix, size):
+# -------------------------
+# Surface store (byte-budgeted LRU shared by the image loaders)
+# -------------------------
+SURFACE_CAP_MB = 64
+
+class SurfaceStore:
+    # Entries are (surface, bytes, last frame used). Pinned keys and anything
+    # used during the current frame (i.e. on screen) are never evicted.
+    def __init__(self, cap_bytes=SURFACE_CAP_MB * 1024 * 1024):
+        self.cap_bytes = cap_bytes
+        self.entries = OrderedDict()
+        self.missing = set()
+        self.pins = {}
+        self.bytes_used = 0
+        self.peak_bytes = 0
+        self.frame = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+    @staticmethod
+    def surface_bytes(surf):
+        w, h = surf.get_size()
+        return w * h * surf.get_bytesize()
+    def begin_frame(self):
+        self.frame += 1
+    def get(self, key, loader):
+        e = self.entries.get(key)
+        if e is not None:
+            self.entries.move_to_end(key)
+            self.entries[key] = (e[0], e[1], self.frame)
+            self.hits += 1
+            return e[0]
+        if key in self.missing:
+            return None
+        self.misses += 1
+        surf = loader()
+        if surf is None:
+            self.missing.add(key)
+            return None
+        self.put(key, surf)
+        return surf
+    def put(self, key, surf):
+        self.discard(key)
+        nbytes = self.surface_bytes(surf)
+        self.entries[key] = (surf, nbytes, self.frame)
+        self.bytes_used += nbytes
+        self.peak_bytes = max(self.peak_bytes, self.bytes_used)
+        self._evict()
+    def discard(self, key):
+        e = self.entries.pop(key, None)
+        if e is not None:
+            self.bytes_used -= e[1]
+    def pin(self, key):
+        self.pins[key] = self.pins.get(key, 0) + 1
+    def unpin(self, key):
+        n = self.pins.get(key, 0) - 1
+        if n > 0:
+            self.pins[key] = n
+        else:
+            self.pins.pop(key, None)
+    def _evict(self):
+        if self.bytes_used <= self.cap_bytes:
+            return
+        for key in list(self.entries):
+            surf, nbytes, last = self.entries[key]
+            if key in self.pins or last == self.frame:
+                continue
+            del self.entries[key]
+            self.bytes_used -= nbytes
+            self.evictions += 1
+            self.evicted_bytes += nbytes
+            if self.bytes_used <= self.cap_bytes:
+                return
+    def stats(self):
+        return {'surfaces': len(self.entries), 'bytes': self.bytes_used, 'peak_bytes': self.peak_bytes,
+                'cap_bytes': self.cap_bytes, 'pinned': len(self.pins), 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions, 'evicted_bytes': self.evicted_bytes}
+    def summary(self):
+        st = self.stats()
+        return (f"{st['surfaces']} surfaces, {st['bytes']/1048576:.1f}/{st['cap_bytes']/1048576:.0f} MB "
+                f"(peak {st['peak_bytes']/1048576:.1f} MB), {st['hits']} hits, {st['misses']} misses, "
+                f"{st['evictions']} evictions ({st['evicted_bytes']/1048576:.1f} MB)")
+
+SURFACES = SurfaceStore()
+
+def image_key(prefix, size):
+    return ('image', prefix, tuple(size))
+
+# -------------------------
+# Surface allocation probe
+# -------------------------
+ALLOC_WINDOW = 60
+ALLOC_TOP = 6
+ALLOC_TRANSFORMS = ('scale', 'smoothscale', 'scale_by', 'smoothscale_by', 'flip', 'rotate', 'rotozoom', 'grayscale')
+# generic helpers are skipped when attributing, so an allocation is charged
+# to the draw function that called them
+ALLOC_HELPERS = frozenset(('render_text', 'draw_text_center', 'draw_rounded_rect', 'dim_overlay'))
+
+class AllocProbe:
+    # Opt-in (--alloc-probe). Swaps pygame.Surface, the allocating transform
+    # calls and Font.render for counting wrappers; every new surface is
+    # charged to the calling function and line. Per-frame counts feed the
+    # overlay; screen changes diff tracemalloc snapshots of the Python heap.
+    def __init__(self):
+        self.enabled = False
+        self.paused = 0
+        self.frames = 0
+        self.clean_frames = 0
+        self.count = 0
+        self.bytes = 0
+        self.sites = {}
+        self.window = deque(maxlen=ALLOC_WINDOW)
+        self.totals = {}
+        self.total_count = 0
+        self.total_bytes = 0
+        self.screen_frames = 0
+        self.screen_count = 0
+        self.snapshot = None
+    def install(self):
+        import tracemalloc
+        if self.enabled:
+            return
+        self.enabled = True
+        probe = self
+        class CountedSurface(pygame.Surface):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                probe.record(self)
+        class CountedFont(pygame.font.Font):
+            def render(self, *args, **kwargs):
+                surf = super().render(*args, **kwargs)
+                probe.record(surf)
+                return surf
+        def counted(fn):
+            def wrapper(*args, **kwargs):
+                out = fn(*args, **kwargs)
+                if all(out is not a for a in args) and out is not kwargs.get('dest_surface'):
+                    probe.record(out)
+                return out
+            return wrapper
+        pygame.Surface = CountedSurface
+        pygame.font.Font = CountedFont
+        from pygame import sysfont
+        sysfont.Font = CountedFont
+        for name in ALLOC_TRANSFORMS:
+            fn = getattr(pygame.transform, name, None)
+            if fn is not None:
+                setattr(pygame.transform, name, counted(fn))
+        tracemalloc.start()
+    def site(self):
+        f = sys._getframe(3)
+        via = None
+        while f.f_code.co_name in ALLOC_HELPERS and f.f_back is not None:
+            via = via or f.f_code.co_name
+            f = f.f_back
+        name = f"{getattr(f.f_code, 'co_qualname', f.f_code.co_name)}:{f.f_lineno}"
+        return f"{name} ({via})" if via else name
+    def record(self, surf):
+        if self.paused:
+            return
+        nbytes = surf.get_pitch() * surf.get_height()
+        site = self.site()
+        self.count += 1
+        self.bytes += nbytes
+        e = self.sites.get(site)
+        if e is None:
+            self.sites[site] = [1, nbytes]
+        else:
+            e[0] += 1
+            e[1] += nbytes
+    def begin_frame(self):
+        # closes the previous frame
+        if not self.enabled:
+            return
+        self.frames += 1
+        self.screen_frames += 1
+        self.screen_count += self.count
+        self.total_count += self.count
+        self.total_bytes += self.bytes
+        if self.count == 0:
+            self.clean_frames += 1
+        for site, (n, nbytes) in self.sites.items():
+            e = self.totals.setdefault(site, [0, 0])
+            e[0] += n
+            e[1] += nbytes
+        self.window.append((self.count, self.bytes, self.sites))
+        self.count = self.bytes = 0
+        self.sites = {}
+    def top(self, sites, n=ALLOC_TOP):
+        return sorted(sites.items(), key=lambda kv: (-kv[1][1], kv[0]))[:n]
+    def recent(self):
+        sites = {}
+        for _, _, frame_sites in self.window:
+            for site, (n, nbytes) in frame_sites.items():
+                e = sites.setdefault(site, [0, 0])
+                e[0] += n
+                e[1] += nbytes
+        return sites
+    def screen_changed(self, old, new):
+        if not self.enabled:
+            return
+        import tracemalloc
+        self.paused += 1
+        snap = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        per_frame = self.screen_count / max(1, self.screen_frames)
+        line = f"[alloc] {old} -> {new}: {per_frame:.2f} surfaces/frame over {self.screen_frames} frames"
+        if self.snapshot is not None:
+            stats = snap.compare_to(self.snapshot, 'lineno')
+            growth = sum(st.size_diff for st in stats)
+            line += f", python heap {growth / 1024:+.1f} KB"
+            for st in stats[:3]:
+                if st.size_diff:
+                    fr = st.traceback[0]
+                    line += f"; {os.path.basename(fr.filename)}:{fr.lineno} {st.size_diff / 1024:+.1f} KB"
+        print(line)
+        self.snapshot = snap
+        self.screen_frames = self.screen_count = 0
+        self.paused -= 1
+    def draw(self, surface, font):
+        if not self.enabled:
+            return
+        self.paused += 1
+        frames = max(1, len(self.window))
+        count = sum(w[0] for w in self.window) / frames
+        nbytes = sum(w[1] for w in self.window) / frames
+        lines = [f"alloc {count:.1f} surf/frame  {nbytes / 1024:.1f} KB/frame"]
+        for site, (n, b) in self.top(self.recent()):
+            lines.append(f"{n / frames:5.1f} {b / 1024 / frames:7.1f} KB  {site}")
+        h = 18 * len(lines) + 8
+        surface.blit(dim_overlay((360, h)), (10, 150))
+        for i, text in enumerate(lines):
+            surface.blit(font.render(text, True, (255,220,120)), (16, 154 + i * 18))
+        self.paused -= 1
+    def summary(self):
+        top = ", ".join(f"{site} {n} ({b / 1024:.0f} KB)" for site, (n, b) in self.top(self.totals, 3))
+        return (f"{self.total_count} surfaces ({self.total_bytes / 1048576:.1f} MB) over {self.frames} frames, "
+                f"{self.clean_frames} frames without allocations" + (f"; top: {top}" if top else ""))
+
+ALLOCS = AllocProbe()
+
+# -------------------------
+# Blit formats
+# -------------------------
+# Opaque images become plain display-format surfaces, images whose alpha is
+# only ever 0 or 255 become RLE colorkey surfaces; per-pixel alpha is kept
+# only for images that really blend.
+COLORKEY_CANDIDATES = ((255,0,255), (0,255,255), (1,254,1), (254,1,254))
+
+def surface_format(surf):
+    if surf.get_colorkey() is not None:
+        return 'colorkey'
+    if surf.get_flags() & pygame.SRCALPHA:
+        return 'alpha'
+    return 'opaque'
+
+def optimize_surface(surf):
+    w, h = surf.get_size()
+    solid = pygame.mask.from_surface(surf, 254)
+    if solid.count() == w * h:
+        return surf.convert()
+    if pygame.mask.from_surface(surf, 0).count() != solid.count():
+        return surf
+    for key in COLORKEY_CANDIDATES:
+        clash = pygame.mask.from_threshold(surf, key + (255,), (1, 1, 1, 255))
+        if not clash.overlap_area(solid, (0, 0)):
+            break
+    else:
+        return surf
+    out = pygame.Surface((w, h)).convert()
+    out.fill(key)
+    out.blit(surf, (0, 0))
+    out.set_colorkey(key, pygame.RLEACCEL)
+    return out
+
+def _load_image_fuzzy(prefix, size):
     p = find_best_file(prefix)
     if not p:
         return None
     try:
-        surf = pygame.image.load(p).convert_alpha()
-        surf = pygame.transform.scale(surf, size)
-        print(f"[image] Loaded {os.path.basename(p)} for '{prefix}'")
+        surf = PREFETCHED.pop(image_key(prefix, size), None)
+        surf = surf.convert_alpha() if surf else pygame.transform.scale(pygame.image.load(p).convert_alpha(), size)
+        surf = optimize_surface(surf)
+        print(f"[image] Loaded {os.path.basename(p)} for '{prefix}' ({surface_format(surf)})")
         return surf
     except Exception as e:
         print(f"[image] Failed to load {p}: {e}")
         return None
 
-def try_load_avatar_by_prefix(base_prefix, size):
-    p = find_best_file("avatar" + base_prefix)
-    if not p:
-        p = find_best_file(base_prefix)
+def try_load_image_fuzzy(prefix, size):
+    return SURFACES.get(image_key(prefix, size), lambda: _load_image_fuzzy(prefix, size))
+
+def avatar_file(base_prefix):
+    return find_best_file("avatar" + base_prefix) or find_best_file(base_prefix)
+
+def avatar_key(base_prefix, size):
+    return ('avatar', base_prefix, tuple(size))
+
+def _load_avatar_by_prefix(base_prefix, size):
+    p = avatar_file(base_prefix)
     if not p:
         return None
     try:
-        surf = pygame.image.load(p).convert_alpha()
-        surf = pygame.transform.scale(surf, size)
-        return surf
+        surf = PREFETCHED.pop(avatar_key(base_prefix, size), None)
+        surf = surf.convert_alpha() if surf else pygame.transform.scale(pygame.image.load(p).convert_alpha(), size)
+        return optimize_surface(surf)
     except Exception:
         return None
 
+def try_load_avatar_by_prefix(base_prefix, size):
+    return SURFACES.get(avatar_key(base_prefix, size), lambda: _load_avatar_by_prefix(base_prefix, size))
+
+# Decoded, scaled but not yet converted surfaces by store key. Decoding is the
+# slow part of a load and image.load releases the GIL, so a worker can do it
+# ahead of time; the loaders above then only convert on the main thread.
+PREFETCHED = {}
+PREFETCH_LOCK = threading.Lock()
+
+def prefetch_images(images=(), avatars=()):
+    # one thread per call decodes its images in order, and the lock keeps it
+    # to one decode at a time across calls. A key the main thread has loaded
+    # by the time the worker reaches it is skipped, or dropped if the load
+    # finished during its decode
+    jobs = [(image_key(prefix, size), prefix, size, find_best_file) for prefix, size in images]
+    jobs += [(avatar_key(prefix, size), prefix, size, avatar_file) for prefix, size in avatars]
+    jobs = [j for j in jobs if j[0] not in SURFACES.entries and j[0] not in PREFETCHED]
+    def work():
+        with PREFETCH_LOCK:
+            for key, prefix, size, finder in jobs:
+                if key in SURFACES.entries or key in PREFETCHED:
+                    continue
+                p = finder(prefix)
+                if not p:
+                    continue
+                try:
+                    surf = pygame.transform.scale(pygame.image.load(p), size)
+                except Exception:
+                    continue  # the main-thread loader reports it
+                if key not in SURFACES.entries:
+                    PREFETCHED[key] = surf
+            for key, *_ in jobs:
+                if key in SURFACES.entries:
+                    PREFETCHED.pop(key, None)
+    t = threading.Thread(target=work, name="image-prefetch", daemon=True)
+    t.start()
+    return t
+
 # -------------------------
 # Font loader
 # -------------------------
+_fonts = {}
+
 def get_font(size, force_ttf_filename=None, prefer_family="arial"):
+    key = (size, force_ttf_filename, prefer_family)
+    font = _fonts.get(key)
+    if font is None:
+        font = _fonts[key] = _load_font(size, force_ttf_filename, prefer_family)
+    return font
+
+def _load_font(size, force_ttf_filename, prefer_family):
     if not pygame.font.get_init():
         pygame.font.init()
     base_dir = os.path.dirname(os.path.abspath(__file__)) if "__file__" in globals() else os.getcwd()
@@ -94,35 +443,346 @@ def get_font(size, force_ttf_filename=None, prefer_family="arial"):
     except Exception:
         return pygame.font.Font(None, size)
 
+# Labels, numbers and messages repeat frame after frame; rendering them once
+# and blitting the cached surface keeps steady-state frames allocation free.
+TEXT_CACHE_SIZE = 256
+_text_cache = OrderedDict()
+
+def render_text(font, text, color):
+    key = (font, text, color)
+    surf = _text_cache.get(key)
+    if surf is None:
+        surf = _text_cache[key] = font.render(text, True, color)
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+    else:
+        _text_cache.move_to_end(key)
+    return surf
+
 # -------------------------
-# Vector sprite fallback
+# Glyph atlas (numbers and short combat labels)
 # -------------------------
-class AnimatedSprite:
-    def __init__(self, frames, frame_time=150):
-        self.frames = frames
-        self.frame_time = frame_time
-        self.current = 0
-        self.timer = 0
-        self.playing = True
+GLYPH_DIGITS = "0123456789"
+GLYPH_CHARS = GLYPH_DIGITS + "+-/%.:! "
+GLYPH_LABELS = ("CRIT!", "DODGED", "DODGE", "BLOCKED", "BURN", "SLOW", "TAUNT", "ABS GUARD", "IRON SKIN", "RAGE")
+GLYPH_LAYOUTS = 4096
+GLYPH_BAKED = 16
+
+def _glyph_shelves(widths, h):
+    # a transparent surface as wide as the widest image and a slot for each,
+    # packed left to right into rows of height h
+    row = max(widths)
+    slots = []
+    x = y = 0
+    for w in widths:
+        if x + w > row:
+            x, y = 0, y + h
+        slots.append(pygame.Rect(x, y, w, h))
+        x += w
+    return pygame.Surface((row, y + h), pygame.SRCALPHA), slots
+
+class GlyphAtlas:
+    # Digits, signs and the floating-text labels rendered once per (font,
+    # color) and drawn piece by piece from atlas regions trimmed to their
+    # ink. A unit sits where the font's own layout puts it, size(text) -
+    # size(unit), which carries the fractional advances and kerning
+    # font.render uses. Layouts are cached per string, and a string ending
+    # in a plain character is its cached prefix plus one unit, so a new
+    # number costs one font.size call. With NumPy the atlas also holds every
+    # two-digit pair (a number is about half as many blits) and, for glyphs
+    # whose ink overlaps, the columns font.render ORs together, so nothing
+    # is blended twice. A string drawn again soon after is baked into a
+    # sheet row and becomes one blit. Anything the atlas lacks falls back to
+    # render_text.
+    def __init__(self, font, color):
+        self.font = font
+        self.color = color
+        self.units = sorted(GLYPH_LABELS, key=len, reverse=True)
+        units = self.units + list(GLYPH_CHARS)
+        # characters that never finish a label, so text[:-1] splits the same
+        self.tails = set(GLYPH_CHARS) - {u[-1] for u in self.units}
+        glyphs = {u: font.render(u, True, color) for u in units}
+        widths = {u: font.size(u)[0] for u in units}
+        h = self.height = font.get_height()
+        pairs, joins = [], []
+        if np is not None:
+            alpha = {u: pygame.surfarray.array_alpha(g)[:widths[u], :h] for u, g in glyphs.items()}
+            for a in GLYPH_CHARS:
+                for b in GLYPH_CHARS:
+                    # the pen step from a to b lands on one of two pixels
+                    step = font.size(a + b)[0] - widths[b]
+                    for dx in (step, step + 1):
+                        if dx <= 0:
+                            continue
+                        jw = widths[a] - dx
+                        touch = 0 < jw <= widths[b] and ((alpha[a][dx:] > 0) & (alpha[b][:jw] > 0)).any()
+                        if touch:
+                            joins.append(((a, b, dx), alpha[a][dx:] | alpha[b][:jw]))
+                        if (touch or a in GLYPH_DIGITS and b in GLYPH_DIGITS) and dx + widths[b] >= widths[a]:
+                            ored = np.zeros((dx + widths[b], h), np.uint8)
+                            ored[:widths[a]] = alpha[a]
+                            ored[dx:] |= alpha[b]
+                            pairs.append(((a, b, dx), ored))
+        # labels get a surface of their own, so the characters, pairs and
+        # joins pack into one about a pair wide, where each image's rows
+        # sit next to each other in memory
+        self.labels, label_slots = _glyph_shelves([widths[u] for u in self.units], h)
+        self.surface, slots = _glyph_shelves([widths[u] for u in GLYPH_CHARS] + [o.shape[0] for _, o in pairs + joins], h)
+        slots = iter(label_slots + slots)
+        self.images = {}
+        for u in units:
+            # max blend copies the glyph's own alpha instead of blending it
+            # over the transparent atlas
+            source = self.labels if len(u) > 1 else self.surface
+            rect = next(slots)
+            source.blit(glyphs[u], rect, special_flags=pygame.BLEND_RGBA_MAX)
+            self.images[u] = (source, rect, glyphs[u].get_bounding_rect().move(rect.topleft))
+        self.pairs = {}
+        self.joins = {}
+        composed = [(self.pairs, key, ored, next(slots)) for key, ored in pairs] + [(self.joins, key, ored, next(slots)) for key, ored in joins]
+        if composed:
+            for _, _, _, rect in composed:
+                self.surface.fill((*color[:3], 0), rect)
+            px = pygame.surfarray.pixels_alpha(self.surface)
+            for _, _, ored, rect in composed:
+                px[rect.x:rect.right, rect.y:rect.bottom] = ored
+            del px
+        for images, key, _, rect in composed:
+            images[key] = (self.surface, rect, self.surface.subsurface(rect).get_bounding_rect().move(rect.topleft))
+        # one Rect per distinct piece, shared by every layout that draws it
+        self.clips = {}
+        self.widths = widths
+        self.layouts = OrderedDict()
+        # rows of the sheet hold whole strings composed from the atlas,
+        # reused in turn; owners[i] is the layout baked into row i
+        self.sheet = pygame.Surface((h * 8, h * GLYPH_BAKED), pygame.SRCALPHA)
+        self.owners = [None] * GLYPH_BAKED
+        self.row = 0
+        self.draws = 0
+        self.alpha = 255
+    def _place(self, prev, head, u):
+        # layout of `head`, which is prev's text followed by unit u:
+        # [width, blits, boxes, u, its x, the unit u was paired with or None,
+        # sheet rect once baked, draw count when last blitted directly].
+        # A box is (x, (surface, rect, ink), first column, end column).
+        w = self.widths[u]
+        x = self.font.size(head)[0] - w
+        single = (x, self.images[u], 0, w)
+        paired = None
+        if prev is None:
+            boxes = [single]
+        else:
+            boxes, pu, px, opened = prev[2:6]
+            key = (pu, u, x - px)
+            bx, image, first, end = boxes[-1]
+            if opened is None and first == 0 and key in self.pairs:
+                pair = self.pairs[key]
+                boxes = boxes[:-1] + [(px, pair, 0, pair[1].w)]
+                paired = pu
+            elif opened is not None and key in self.joins and key in self.pairs and (opened, pu, px - bx) not in self.joins:
+                # u touches the second half of a pair whose halves don't
+                # touch: split it and pair pu with u instead
+                pair = self.pairs[key]
+                boxes = boxes[:-1] + [(bx, self.images[opened], 0, self.widths[opened]), (px, pair, 0, pair[1].w)]
+                paired = pu
+            elif key in self.joins and x - bx > first and key in self.pairs:
+                # the last box up to u, then the pair from where u starts,
+                # which is the ORed columns and the rest of u in one piece
+                pair = self.pairs[key]
+                boxes = boxes[:-1] + [(bx, image, first, x - bx), (px, pair, x - px, pair[1].w)]
+            elif key in self.joins and x - bx > first:
+                # the last box up to u, the ORed columns, then the rest of u
+                join = self.joins[key]
+                boxes = boxes[:-1] + [(bx, image, first, x - bx), (x, join, 0, join[1].w),
+                                      (x, self.images[u], join[1].w, w)]
+            else:
+                boxes = boxes + [single]
+        blits = []
+        for bx, (source, rect, ink), first, end in boxes:
+            r = pygame.Rect(rect.x + first, rect.y, end - first, self.height).clip(ink)
+            if r.w and r.h:
+                r = self.clips.setdefault((source, *r), r)
+                blits.append((bx + r.x - rect.x, r.y - rect.y, source, r))
+        return [x + w, blits, boxes, u, x, paired, None, -GLYPH_BAKED - 1]
+    def layout(self, text):
+        # [width, [(dx, dy, surface, rect)], ...] or None when text has
+        # uncovered characters
+        lay = self.layouts.get(text)
+        if lay is not None:
+            return lay
+        if len(text) > 1 and text[-1] in self.tails:
+            lay = self.layout(text[:-1])
+            if lay is None:
+                return None
+            lay = self._place(lay, text, text[-1])
+        else:
+            i = 0
+            while i < len(text):
+                u = text[i]
+                if u not in self.images:
+                    for u in self.units:
+                        if text.startswith(u, i):
+                            break
+                    else:
+                        return None
+                i += len(u)
+                lay = self._place(lay, text[:i], u)
+            if lay is None:
+                return None
+        self.layouts[text] = lay
+        if len(self.layouts) > GLYPH_LAYOUTS:
+            self.layouts.popitem(last=False)
+        return lay
+    def size(self, text):
+        lay = self.layout(text)
+        if lay is None:
+            return self.font.size(text)
+        return lay[0], self.height
+    def _bake(self, lay):
+        # compose lay into the next sheet row; the blits are disjoint, so max
+        # blending copies them
+        if lay[0] > self.sheet.get_width():
+            return None
+        old = self.owners[self.row]
+        if old is not None:
+            old[6] = None
+        self.owners[self.row] = lay
+        y = self.row * self.height
+        self.row = (self.row + 1) % GLYPH_BAKED
+        area = lay[6] = pygame.Rect(0, y, lay[0], self.height)
+        self.sheet.fill((*self.color[:3], 0), area)
+        self.sheet.blits([(source, (dx, y + dy), rect, pygame.BLEND_RGBA_MAX) for dx, dy, source, rect in lay[1]], False)
+        return area
+    def draw(self, surface, text, pos, alpha=255):
+        if alpha != self.alpha:
+            self.surface.set_alpha(alpha)
+            self.labels.set_alpha(alpha)
+            self.sheet.set_alpha(alpha)
+            self.alpha = alpha
+        lay = self.layouts.get(text) or self.layout(text)
+        if lay is None:
+            s = render_text(self.font, text, self.color)
+            s.set_alpha(alpha)
+            surface.blit(s, pos)
+            s.set_alpha(255)
+            return
+        area = lay[6]
+        if area is None:
+            # a string drawn again within the last few direct draws is baked;
+            # one-off strings are blitted from the atlas directly, piece by
+            # piece (cheaper than building a blits() list for two or three)
+            draws = self.draws = self.draws + 1
+            if draws - lay[7] > GLYPH_BAKED or self._bake(lay) is None:
+                lay[7] = draws
+                x, y = pos
+                for dx, dy, source, rect in lay[1]:
+                    surface.blit(source, (x + dx, y + dy), rect)
+                return
+            area = lay[6]
+        surface.blit(self.sheet, pos, area)
+
+_glyph_atlases = {}
+
+def glyph_atlas(font, color):
+    atlas = _glyph_atlases.get((font, color))
+    if atlas is None:
+        atlas = _glyph_atlases[(font, color)] = GlyphAtlas(font, color)
+    return atlas
+
+# -------------------------
+# Animation timeline
+# -------------------------
+# Easing curves are sampled once into tables; a tween reads its value with
+# one index instead of calling math.sin every frame.
+EASE_STEPS = 256
+
+def _ease_table(fn):
+    return [fn(i / (EASE_STEPS - 1)) for i in range(EASE_STEPS)]
+
+EASINGS = {
+    'linear': _ease_table(lambda t: t),
+    'out_quad': _ease_table(lambda t: 1 - (1 - t) * (1 - t)),
+    'swing': _ease_table(lambda t: math.sin(t * math.pi)),
+    'shake': _ease_table(lambda t: math.sin(t * 6.28 * 4)),
+}
+
+class Tween:
+    __slots__ = ('target', 'attr', 'start', 'delta', 'duration', 'elapsed', 'table', 'to_int', 'on_done', 'alive')
+    def __init__(self, target, attr, duration, start, end, ease, to_int, on_done):
+        self.target = target
+        self.attr = attr
+        self.start = start
+        self.delta = end - start
+        self.duration = max(1, duration)
+        self.elapsed = 0
+        self.table = EASINGS[ease]
+        self.to_int = to_int
+        self.on_done = on_done
+        self.alive = True
+    def value(self, i):
+        v = self.start + self.delta * self.table[i]
+        return int(v) if self.to_int else v
+
+class Timeline:
+    # Every running tween, advanced together once per frame. Nothing that is
+    # at rest has a tween, so idle characters and settled UI cost nothing;
+    # looping idle frames are derived from `time` when drawn. Completion
+    # callbacks run after the pass and may start new tweens.
+    def __init__(self):
+        self.tweens = []
+        self.time = 0
+        self.finished = 0
+    def add(self, target, attr, duration, start=0, end=1, ease='linear', to_int=False, on_done=None):
+        tw = Tween(target, attr, duration, start, end, ease, to_int, on_done)
+        setattr(target, attr, tw.value(0))
+        self.tweens.append(tw)
+        return tw
+    def cancel(self, tween):
+        tween.alive = False
+    def clear(self):
+        for tw in self.tweens:
+            tw.alive = False
+        self.tweens = []
+    def complete(self, tween):
+        # jump a running tween to its end now, callback included
+        if tween.alive:
+            tween.elapsed = tween.duration
+            setattr(tween.target, tween.attr, tween.value(EASE_STEPS - 1))
+            tween.alive = False
+            self.finished += 1
+            if tween.on_done:
+                tween.on_done()
     def update(self, dt):
-        if not self.playing:
+        self.time += dt
+        if not self.tweens:
             return
-        self.timer += dt
-        if self.timer >= self.frame_time:
-            self.timer -= self.frame_time
-            self.current = (self.current + 1) % len(self.frames)
-    def draw(self, surface, pos, is_flipped=False):
-        f = self.frames[self.current]
-        if is_flipped:
-            try:
-                f = pygame.transform.flip(f, True, False)
-            except Exception:
-                pass
-        r = f.get_rect(center=pos)
-        surface.blit(f, r)
-    def reset(self):
-        self.current = 0
-        self.timer = 0
+        last = EASE_STEPS - 1
+        keep = []
+        done = []
+        for tw in self.tweens:
+            if not tw.alive:
+                continue
+            tw.elapsed += dt
+            if tw.elapsed >= tw.duration:
+                setattr(tw.target, tw.attr, tw.value(last))
+                tw.alive = False
+                done.append(tw)
+            else:
+                setattr(tw.target, tw.attr, tw.value(int(tw.elapsed * last / tw.duration)))
+                keep.append(tw)
+        self.tweens = keep
+        self.finished += len(done)
+        for tw in done:
+            if tw.on_done:
+                tw.on_done()
+
+TIMELINE = Timeline()
+
+# -------------------------
+# Vector sprite fallback
+# -------------------------
+# pose: frame time in ms; defend reuses the idle frames
+POSE_FRAME_MS = {'idle': 200, 'attack': 120, 'hurt': 180, 'defend': 200}
 
 def make_frames(color, pose='idle'):
     frames = []
@@ -155,35 +815,452 @@ def make_frames(color, pose='idle'):
 # Floating Damage Text Class
 # -------------------------
 class FloatingText:
+    # rise and fade are two timeline tweens; digits and labels come from the
+    # glyph atlas, so a new number renders nothing
     def __init__(self, x, y, value, color, duration=1000, size=22, offset_y=-40):
         self.x = x
-        self.y = y + offset_y
         self.value = str(value)
         self.base_color = color if isinstance(color, tuple) else (255,255,255)
-        self.color = self.base_color
         self.duration = duration
-        self.timer = 0
-        self.font = get_font(size)
+        self.expired = False
+        font = get_font(size)
+        self.shadow = glyph_atlas(font, (0,0,0))
+        self.text = glyph_atlas(font, self.base_color[:3])
+        self.width = self.text.size(self.value)[0]
         self.y_speed = -0.04
-    def update(self, dt):
-        self.timer += dt
-        self.y += self.y_speed * dt
-        alpha = max(0, 255 - int(255 * (self.timer / self.duration)))
-        if len(self.base_color) == 4:
-            self.color = self.base_color[:3] + (alpha,)
-        else:
-            self.color = self.base_color + (alpha,)
+        TIMELINE.add(self, 'y', duration, y + offset_y, y + offset_y + self.y_speed * duration)
+        TIMELINE.add(self, 'alpha', duration, 255, 0, to_int=True, on_done=self._expire)
+    def _expire(self):
+        self.expired = True
     def draw(self, surface):
-        alpha = max(0, 255 - int(255 * (self.timer / self.duration)))
-        r,g,b = self.base_color[:3]
-        text_surf = self.font.render(self.value, True, (0,0,0))
-        text_surf.set_alpha(alpha)
-        surface.blit(text_surf, (self.x - text_surf.get_width()//2 + 2, self.y + 2))
-        text_surf = self.font.render(self.value, True, (r,g,b))
-        text_surf.set_alpha(alpha)
-        surface.blit(text_surf, (self.x - text_surf.get_width()//2, self.y))
+        x = self.x - self.width//2
+        self.shadow.draw(surface, self.value, (x + 2, self.y + 2), self.alpha)
+        self.text.draw(surface, self.value, (x, self.y), self.alpha)
     def is_expired(self):
-        return self.timer >= self.duration
+        return self.expired
+
+# -------------------------
+# Particles (NumPy arrays, drawn through surfarray)
+# -------------------------
+# preset: (count, colors, speed px/ms, life ms, gravity px/ms^2, spread px, rise)
+PARTICLE_PRESETS = {
+    'inferno': (2500, ((255,90,0), (255,160,40), (255,220,120), (200,40,10)), 0.25, 900, -0.0002, 50, 0.12),
+    'arrows': (1800, ((230,220,180), (255,200,80), (180,170,140)), 0.05, 500, 0.0015, 90, -0.6),
+    'burn': (500, ((255,100,20), (255,170,60)), 0.08, 600, -0.0001, 30, 0.06),
+    'poison': (400, ((190,80,255), (140,40,200), (220,140,255)), 0.04, 800, -0.00005, 30, 0.03),
+    'hit': (160, ((255,255,255), (255,220,120)), 0.3, 250, 0.0008, 6, 0.0),
+}
+
+class ParticleSystem:
+    # Fixed-capacity arrays; a slot is free when its life is <= 0. Updates are
+    # whole-array NumPy ops, drawing blends 2x2 dots straight into the target
+    # surface's pixel array. Without NumPy every call is a no-op.
+    def __init__(self, capacity=8192):
+        self.capacity = capacity
+        self.active = 0
+        self.enabled = np is not None
+        if not self.enabled:
+            return
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.life = np.zeros(capacity, np.float32)
+        self.max_life = np.ones(capacity, np.float32)
+        self.gravity = np.zeros(capacity, np.float32)
+        self.color = np.zeros((capacity, 3), np.float32)
+        self._step = np.zeros((capacity, 2), np.float32)
+        self._rng = np.random.default_rng()
+    def emit(self, preset, x, y):
+        if not self.enabled:
+            return 0
+        count, colors, speed, life, gravity, spread, rise = PARTICLE_PRESETS[preset]
+        free = np.flatnonzero(self.life <= 0)[:count]
+        n = len(free)
+        if n == 0:
+            return 0
+        rng = self._rng
+        if preset == 'arrows':
+            # a curtain of streaks falling onto the target from above
+            self.pos[free, 0] = x + rng.uniform(-spread, spread, n)
+            self.pos[free, 1] = y - 260 + rng.uniform(-40, 40, n)
+        else:
+            ang = rng.uniform(0, 2 * math.pi, n)
+            rad = rng.uniform(0, spread, n)
+            self.pos[free, 0] = x + np.cos(ang) * rad
+            self.pos[free, 1] = y + np.sin(ang) * rad
+        ang = rng.uniform(0, 2 * math.pi, n)
+        sp = rng.uniform(0.2, 1.0, n) * speed
+        self.vel[free, 0] = np.cos(ang) * sp
+        self.vel[free, 1] = np.sin(ang) * sp - rise
+        lives = rng.uniform(0.5, 1.0, n) * life
+        self.life[free] = lives
+        self.max_life[free] = lives
+        self.gravity[free] = gravity
+        self.color[free] = np.asarray(colors, np.float32)[rng.integers(0, len(colors), n)]
+        self.active = int(np.count_nonzero(self.life > 0))
+        return n
+    def update(self, dt):
+        if not self.enabled or not self.active:
+            return
+        np.multiply(self.gravity, dt, out=self._step[:, 0])
+        self.vel[:, 1] += self._step[:, 0]
+        np.multiply(self.vel, dt, out=self._step)
+        self.pos += self._step
+        self.life -= dt
+        self.active = int(np.count_nonzero(self.life > 0))
+    def draw(self, surface):
+        if not self.enabled or not self.active:
+            return
+        idx = np.flatnonzero(self.life > 0)
+        xs = self.pos[idx, 0].astype(np.int32)
+        ys = self.pos[idx, 1].astype(np.int32)
+        w, h = surface.get_size()
+        ok = (xs >= 0) & (ys >= 0) & (xs < w - 1) & (ys < h - 1)
+        idx, xs, ys = idx[ok], xs[ok], ys[ok]
+        if not len(idx):
+            return
+        a = (self.life[idx] / self.max_life[idx])[:, None]
+        col = self.color[idx] * a
+        inv = 1.0 - a
+        px = pygame.surfarray.pixels3d(surface)
+        for ox, oy in ((0,0), (1,0), (0,1), (1,1)):
+            px[xs + ox, ys + oy] = (px[xs + ox, ys + oy] * inv + col).astype(np.uint8)
+        del px
+    def clear(self):
+        if self.enabled:
+            self.life[:] = 0
+        self.active = 0
+
+PARTICLES = ParticleSystem()
+
+# -------------------------
+# Screen post effects (damage flash, low HP vignette, status tint, defeat)
+# -------------------------
+POST_STEPS = 8              # blend resolution: a pixel moves toward a colour in 1/8 steps
+FLASH_MS = 280
+FLASH_COLOR = (255, 30, 20)
+FLASH_ALPHA = (0.15, 0.4)   # alpha for a scratch / for a hit worth half the max HP or more
+LOW_HP = 0.35               # vignette fades in below this HP fraction
+VIGNETTE_COLOR = (90, 0, 0)
+VIGNETTE_INNER = 0.55       # normalized radius where the vignette starts
+VIGNETTE_PULSE_MS = 900
+STATUS_TINTS = {'poison': ((150, 60, 230), 0.2), 'burn': ((255, 110, 20), 0.2)}
+DEFEAT_BRIGHTNESS = 0.55
+LUMA = (77, 150, 29)        # R, G, B weights out of 256
+
+class PostEffects:
+    # Full-screen effects on the canvas through surfarray.pixels2d: one
+    # packed 32-bit pixel per element, so each step is one NumPy pass over
+    # the frame instead of three per-channel ones. A blend toward colour c
+    # by k/8 is px - k*((px >> 3) & low) + k*(c >> 3): no channel can carry
+    # into its neighbour, so all three move in the same integer ops. The
+    # vignette's uint8 level maps (one per strength, so no frame builds
+    # one), packed colours and scratch arrays are made once for the canvas
+    # format; flash and status tints compose into a single blend pass.
+    # Without NumPy, or on an unusual pixel format, nothing runs.
+    def __init__(self, surface):
+        self.flash = 0.0
+        self.flash_tween = None
+        self.defeat_bg = None
+        self.ns = {}
+        w, h = surface.get_size()
+        shifts = surface.get_shifts()[:3]
+        self.enabled = (np is not None and surface.get_bytesize() == 4
+                        and sorted(shifts) == [0, 8, 16] and surface.get_losses()[:3] == (0, 0, 0))
+        if not self.enabled:
+            return
+        self.shifts = shifts
+        self.low = sum(0x1F << s for s in shifts)
+        # arrays in the (w, h) layout pixels2d returns, so passes run in memory order
+        self._q = np.empty((h, w), np.uint32).T
+        nx = (np.arange(w, dtype=np.float32) - w / 2) / (w / 2)
+        ny = (np.arange(h, dtype=np.float32) - h / 2) / (h / 2)
+        r = np.sqrt(ny[:, None] ** 2 + nx[None, :] ** 2) / math.sqrt(2)
+        edge = np.clip((r - VIGNETTE_INNER) / (1 - VIGNETTE_INNER), 0, 1)
+        # ordered dither thresholds, so the 1/8 steps do not show as rings
+        bayer = (np.array([[0, 8, 2, 10], [12, 4, 14, 6], [3, 11, 1, 9], [15, 7, 13, 5]], np.float32) + 0.5) / 16
+        vignette = (edge * np.sqrt(edge) * POST_STEPS).T
+        dither = np.tile(bayer, (h // 4 + 1, w // 4 + 1))[:h, :w].T
+        self._vignette_levels = [(vignette * (s / POST_STEPS) + dither).astype(np.uint8) for s in range(POST_STEPS + 1)]
+        self._vignette_color = np.uint32(self.pack(VIGNETTE_COLOR) >> 3 & self.low)
+        self._luma = dict(zip(shifts, LUMA))
+    def pack(self, color):
+        return sum(c << s for c, s in zip(color, self.shifts))
+    def hit(self, damage, max_hp):
+        # a red flash that fades out, stronger for bigger hits
+        if not self.enabled or damage <= 0:
+            return
+        lo, hi = FLASH_ALPHA
+        alpha = lo + (hi - lo) * min(1.0, 2 * damage / max(1, max_hp))
+        if self.flash_tween:
+            TIMELINE.cancel(self.flash_tween)
+            alpha = max(alpha, self.flash)
+        self.flash_tween = TIMELINE.add(self, 'flash', FLASH_MS, alpha, 0.0, 'out_quad')
+    def clear(self):
+        if self.flash_tween:
+            TIMELINE.cancel(self.flash_tween)
+        self.flash_tween = None
+        self.flash = 0.0
+    def _time(self, name, t0):
+        total, n = self.ns.get(name, (0, 0))
+        self.ns[name] = (total + time.perf_counter_ns() - t0, n + 1)
+    def blend(self, px, color, steps):
+        # every pixel of px a step/POST_STEPS of the way toward color
+        q = self._q
+        np.right_shift(px, 3, out=q)
+        np.bitwise_and(q, self.low, out=q)
+        np.multiply(q, steps, out=q)
+        np.subtract(px, q, out=px)
+        np.add(px, (self.pack(color) >> 3 & self.low) * steps, out=px)
+    def vignette(self, px, strength):
+        # toward VIGNETTE_COLOR by the level map at strength 1..8, in place.
+        # The per-pixel step is px + k*(c - q): c - q goes negative per
+        # channel, but every channel of the sum lands in 0..255, so the
+        # wrapped uint32 result is exact
+        q = self._q
+        np.right_shift(px, 3, out=q)
+        np.bitwise_and(q, self.low, out=q)
+        np.subtract(self._vignette_color, q, out=q)
+        np.multiply(q, self._vignette_levels[strength], out=q)
+        np.add(px, q, out=px)
+    def desaturate(self, px, brightness=1.0):
+        # grey from the luminance weights scaled by brightness. The channels
+        # at bits 16 and 0 are weighted by one multiply that leaves their sum
+        # at bits 16-31 (the cross term wraps past 32 bits), the middle
+        # channel by another
+        q = self._q
+        w = {shift: round(v * min(1.0, max(0.0, brightness))) for shift, v in self._luma.items()}
+        np.bitwise_and(px, 0xFF00FF, out=q)
+        np.multiply(q, w[16] + (w[0] << 16), out=q)
+        np.bitwise_and(px, 0xFF00, out=px)
+        np.multiply(px, w[8] << 8, out=px)
+        np.add(px, q, out=px)
+        np.right_shift(px, 24, out=px)
+        np.multiply(px, 0x010101, out=px)
+    def apply(self, surface, player):
+        # flash, status tint and low HP vignette for this frame's battle view
+        if not self.enabled or player is None:
+            return
+        t0 = time.perf_counter_ns()
+        if self.flash_tween is not None and not self.flash_tween.alive:
+            # finished, or dropped by TIMELINE.clear() at a battle start
+            self.flash_tween = None
+            self.flash = 0.0
+        # flash and tints compose into one blend: alpha over alpha
+        r = g = b = 0.0
+        keep = 1.0
+        for status, (color, alpha) in STATUS_TINTS.items():
+            if player.status_effects.get(status, 0) > 0:
+                r, g, b = (v * (1 - alpha) + c * alpha for v, c in zip((r, g, b), color))
+                keep *= 1 - alpha
+        if self.flash > 0:
+            r, g, b = (v * (1 - self.flash) + c * self.flash for v, c in zip((r, g, b), FLASH_COLOR))
+            keep *= 1 - self.flash
+        steps = round((1 - keep) * POST_STEPS)
+        frac = player.hp / player.max_hp if player.max_hp else 1.0
+        strength = 0
+        if 0 < frac < LOW_HP:
+            pulse = 0.85 + 0.15 * math.sin(TIMELINE.time * 2 * math.pi / VIGNETTE_PULSE_MS)
+            strength = round(min(1.0, (LOW_HP - frac) / LOW_HP * 1.5) * pulse * POST_STEPS)
+        if not steps and not strength:
+            return
+        px = pygame.surfarray.pixels2d(surface)
+        if steps:
+            a = 1 - keep
+            self.blend(px, (int(r / a), int(g / a), int(b / a)), steps)
+            self._time('tint' if self.flash <= 0 else 'flash', t0)
+            t0 = time.perf_counter_ns()
+        if strength:
+            self.vignette(px, strength)
+            self._time('vignette', t0)
+        del px
+    def capture_defeat(self, surface):
+        # the last battle frame, desaturated and dimmed, behind the defeat modal
+        self.clear()
+        if not self.enabled:
+            self.defeat_bg = None
+            return
+        t0 = time.perf_counter_ns()
+        self.defeat_bg = surface.copy()
+        px = pygame.surfarray.pixels2d(self.defeat_bg)
+        self.desaturate(px, DEFEAT_BRIGHTNESS)
+        del px
+        self._time('desaturate', t0)
+    def summary(self):
+        if not self.enabled:
+            return "disabled (needs NumPy and a 32-bit canvas)"
+        if not self.ns:
+            return "no effects shown"
+        return ", ".join(f"{name} {n} frames avg {total / n / 1e6:.2f} ms" for name, (total, n) in sorted(self.ns.items()))
+
+# -------------------------
+# Audio (preloaded effects, reserved channel pool, streamed floor music)
+# -------------------------
+AUDIO_RATE = 22050
+AUDIO_BUFFER = 512
+AUDIO_CHANNELS = 8
+AUDIO_EXTS = ("wav", "ogg", "mp3")
+# effect: (priority, synth fallback (wave, start Hz, end Hz, ms, volume));
+# a file named sfx_<effect>.* replaces the synthesized buffer
+SOUND_EFFECTS = {
+    'hit': (2, ('square', 180, 70, 110, 0.30)),
+    'crit': (3, ('square', 320, 90, 180, 0.35)),
+    'dodge': (1, ('sine', 900, 1400, 80, 0.20)),
+    'hurt': (2, ('noise', 0, 0, 140, 0.30)),
+    'heal': (1, ('sine', 440, 880, 220, 0.25)),
+    'shield': (1, ('sine', 260, 240, 160, 0.25)),
+    'skill': (2, ('square', 520, 780, 150, 0.22)),
+    'ultimate': (4, ('noise', 0, 0, 600, 0.40)),
+    'poison': (0, ('sine', 200, 150, 120, 0.18)),
+    'burn': (0, ('noise', 0, 0, 120, 0.18)),
+}
+
+def synth_effect(wave, f0, f1, ms, volume, rate, channels):
+    # 5 ms attack, linear release; noise uses its own RNG so loading sounds
+    # never moves the game's random stream
+    n = max(1, rate * ms // 1000)
+    attack = max(1, rate // 200)
+    rng = random.Random(n)
+    out = array.array('h')
+    phase = 0.0
+    for i in range(n):
+        t = i / n
+        phase += (f0 + (f1 - f0) * t) / rate
+        if wave == 'sine':
+            v = math.sin(2 * math.pi * phase)
+        elif wave == 'square':
+            v = 1.0 if phase % 1.0 < 0.5 else -1.0
+        else:
+            v = rng.uniform(-1.0, 1.0)
+        sample = int(v * min(1.0, i / attack) * (1.0 - t) * volume * 32767)
+        out.extend((sample,) * channels)
+    if sys.byteorder == 'big':
+        out.byteswap()
+    return out.tobytes()
+
+class AudioSystem:
+    # Effects are decoded or synthesized into Sound buffers once at load.
+    # play() only picks a channel from a fixed reserved pool (a free one, else
+    # the lowest-priority, oldest one it may steal) and queues the buffer, so
+    # combat code never waits on disk. Music streams through mixer.music.
+    def __init__(self):
+        self.enabled = False
+        self.sounds = {}
+        self.priority = {}
+        self.lengths = {}
+        self.channels = []
+        self.busy_until = []
+        self.busy_prio = []
+        self.music_files = {}
+        self.music_path = None
+        self.plays = 0
+        self.steals = 0
+        self.drops = 0
+        self.latency_ns = deque(maxlen=4096)
+        self.load_ms = 0.0
+        self.buffer_bytes = 0
+    def load(self, channels=AUDIO_CHANNELS):
+        for _ in self.load_steps(channels):
+            pass
+        return self.enabled
+    def load_steps(self, channels=AUDIO_CHANNELS):
+        # one effect per step, so startup can spread loading over frames;
+        # play() stays a no-op until the last step enables the system
+        t0 = time.perf_counter()
+        init = pygame.mixer.get_init()
+        if not init:
+            print("[audio] Mixer unavailable, sound disabled")
+            return
+        rate, fmt, n_out = init
+        pygame.mixer.set_num_channels(max(channels, pygame.mixer.get_num_channels()))
+        pygame.mixer.set_reserved(channels)
+        self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+        self.busy_until = [0] * channels
+        self.busy_prio = [0] * channels
+        for name, (prio, synth) in SOUND_EFFECTS.items():
+            snd = None
+            p = find_best_file("sfx_" + name, AUDIO_EXTS)
+            if p:
+                try:
+                    snd = pygame.mixer.Sound(p)
+                except pygame.error as e:
+                    print(f"[audio] Failed to load {p}: {e}")
+            if snd is None and fmt == -16:
+                snd = pygame.mixer.Sound(buffer=synth_effect(*synth, rate, n_out))
+            if snd is None:
+                continue
+            self.sounds[name] = snd
+            self.priority[name] = prio
+            self.lengths[name] = int(snd.get_length() * 1e9)
+            self.buffer_bytes += len(snd.get_raw())
+            self.load_ms += (time.perf_counter() - t0) * 1000
+            yield name
+            t0 = time.perf_counter()
+        for floor in range(1, TOWER_FLOORS + 1):
+            p = find_best_file(f"music{floor}", AUDIO_EXTS) or find_best_file("music", AUDIO_EXTS)
+            if p:
+                self.music_files[floor] = p
+        self.enabled = True
+        self.load_ms += (time.perf_counter() - t0) * 1000
+        print(f"[audio] {len(self.sounds)} effects ({self.buffer_bytes // 1024} KB) on {channels} reserved channels, "
+              f"{len(set(self.music_files.values()))} music files, {rate} Hz, loaded in {self.load_ms:.1f} ms")
+        return True
+    def play(self, name):
+        if not self.enabled:
+            return
+        t0 = time.perf_counter_ns()
+        snd = self.sounds.get(name)
+        if snd is None:
+            return
+        prio = self.priority[name]
+        until, prios = self.busy_until, self.busy_prio
+        pick = -1
+        for i in range(len(until)):
+            if until[i] <= t0:
+                pick = i
+                break
+            if prios[i] <= prio and (pick < 0 or (prios[i], until[i]) < (prios[pick], until[pick])):
+                pick = i
+        else:
+            if pick < 0:
+                self.drops += 1
+                return
+            self.steals += 1
+        self.channels[pick].play(snd)
+        until[pick] = t0 + self.lengths[name]
+        prios[pick] = prio
+        self.plays += 1
+        self.latency_ns.append(time.perf_counter_ns() - t0)
+    def play_music(self, floor):
+        p = self.music_files.get((floor - 1) % TOWER_FLOORS + 1) if self.enabled else None
+        if p is None or p == self.music_path:
+            return
+        try:
+            pygame.mixer.music.load(p)
+            pygame.mixer.music.play(-1, fade_ms=400)
+            self.music_path = p
+        except pygame.error as e:
+            print(f"[audio] Failed to stream {p}: {e}")
+    def pause_music(self):
+        if self.enabled:
+            pygame.mixer.music.pause()
+    def resume_music(self):
+        if self.enabled:
+            pygame.mixer.music.unpause()
+    def stop_music(self):
+        if self.enabled and self.music_path is not None:
+            pygame.mixer.music.fadeout(300)
+            self.music_path = None
+    def summary(self):
+        if not self.enabled:
+            return "disabled"
+        lat = sorted(self.latency_ns)
+        pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] / 1000 if lat else 0.0
+        rate = pygame.mixer.get_init()[0]
+        return (f"{self.plays} plays, {self.steals} stolen, {self.drops} dropped; trigger-to-queue p50 {pct(0.5):.1f} us, "
+                f"p99 {pct(0.99):.1f} us, max {lat[-1] / 1000 if lat else 0.0:.1f} us; "
+                f"device buffer {AUDIO_BUFFER * 1000 / rate:.1f} ms")
+
+AUDIO = AudioSystem()
 
 # -------------------------
 # Character
@@ -197,12 +1274,11 @@ class Character:
         self.pos = list(pos)
         self.image = image_surface
         self.prefix = prefix
-        self.anim_idle = AnimatedSprite(make_frames(color, 'idle'), frame_time=200)
-        self.anim_attack = AnimatedSprite(make_frames(color, 'attack'), frame_time=120)
-        self.anim_hurt = AnimatedSprite(make_frames(color, 'hurt'), frame_time=180)
-        self.anim_defend = AnimatedSprite(make_frames(color, 'idle'), frame_time=200)
+        self.frames = {}
         self.state = 'idle'
-        self.anim_timer = 0
+        self.tween = None
+        self._on_done = None
+        self.anim_start = 0
         self.attack_duration = 500
         self.hurt_duration = 600
         self.offset_x = 0
@@ -219,57 +1295,67 @@ class Character:
         self.defend_damage_reduction = 0.3
         self.counter_attack_ready = False
         self.class_type = None
-    def update(self, dt):
-        self.anim_idle.update(dt)
-        self.anim_attack.update(dt)
-        self.anim_hurt.update(dt)
-        self.anim_defend.update(dt)
-        if self.anim_timer > 0:
-            self.anim_timer = max(0, self.anim_timer - dt)
-            if self.image is not None and self.state == 'attack':
-                prog = 1.0 - (self.anim_timer / self.attack_duration)
-                swing = int(18 * math.sin(prog * math.pi))
-                self.offset_x = swing
-            elif self.image is not None and self.state == 'hurt':
-                prog = 1.0 - (self.anim_timer / self.hurt_duration)
-                self.offset_x = int(6 * math.sin(prog * 6.28 * 4))
-            else:
-                self.offset_x = 0
-        if self.anim_timer == 0 and self.state in ('attack','hurt','defend'):
-            self.state = 'idle'
-            self.offset_x = 0
-    def draw(self, surface):
-        x,y = self.pos
+        self._flip_cache = {}
+    @property
+    def anim_timer(self):
+        return self.tween.duration - self.tween.elapsed if self.tween else 0
+    def _play(self, pose, duration, ease, amplitude, on_done):
+        # a new action replaces the running one; like the old anim_timer
+        # polling, its completion callback then waits for the new action
+        if self.tween:
+            TIMELINE.cancel(self.tween)
+            on_done = on_done or self._on_done
+        self.state = pose
+        self.anim_start = TIMELINE.time
+        self._on_done = on_done
+        self.tween = TIMELINE.add(self, 'offset_x', duration, 0, amplitude if self.image is not None else 0,
+                                  ease, to_int=True, on_done=self._finish)
+    def _finish(self):
+        on_done = self._on_done
+        self.tween = self._on_done = None
+        self.state = 'idle'
+        self.offset_x = 0
+        if on_done:
+            on_done()
+    def stop_animation(self):
+        if self.tween:
+            TIMELINE.cancel(self.tween)
+        self.tween = self._on_done = None
+        self.state = 'idle'
+        self.offset_x = 0
+    def current_image(self):
         if self.image is not None:
             img = self.image
-            if self.is_flipped:
-                try:
-                    img = pygame.transform.flip(img, True, False)
-                except Exception:
-                    pass
-            rect = img.get_rect(center=(x + self.offset_x, y))
-            surface.blit(img, rect)
         else:
+            pose = 'idle' if self.state == 'defend' else self.state
+            frames = self.frames.get(pose)
+            if frames is None:
+                frames = self.frames[pose] = make_frames(self.color, pose)
             if self.state == 'idle':
-                self.anim_idle.draw(surface, self.pos, self.is_flipped)
-            elif self.state == 'attack':
-                self.anim_attack.draw(surface, self.pos, self.is_flipped)
-            elif self.state == 'hurt':
-                self.anim_hurt.draw(surface, self.pos, self.is_flipped)
-            elif self.state == 'defend':
-                self.anim_defend.draw(surface, self.pos, self.is_flipped)
-    def play_attack(self, duration=None):
-        self.state = 'attack'
-        self.anim_timer = duration if duration is not None else self.attack_duration
-        self.anim_attack.reset()
-    def play_hurt(self, duration=None):
-        self.state = 'hurt'
-        self.anim_timer = duration if duration is not None else self.hurt_duration
-        self.anim_hurt.reset()
-    def play_defend(self, duration=None):
-        self.state = 'defend'
-        self.anim_timer = duration if duration is not None else 400
-        self.anim_defend.reset()
+                img = frames[TIMELINE.time // POSE_FRAME_MS['idle'] % len(frames)]
+            else:
+                img = frames[(TIMELINE.time - self.anim_start) // POSE_FRAME_MS[self.state] % len(frames)]
+        if self.is_flipped:
+            flipped = self._flip_cache.get(img)
+            if flipped is None:
+                try:
+                    flipped = pygame.transform.flip(img, True, False)
+                except Exception:
+                    flipped = img
+                self._flip_cache[img] = flipped
+            img = flipped
+        return img
+    def draw(self, surface):
+        x,y = self.pos
+        img = self.current_image()
+        rect = img.get_rect(center=(x + self.offset_x, y))
+        surface.blit(img, rect)
+    def play_attack(self, duration=None, on_done=None):
+        self._play('attack', duration if duration is not None else self.attack_duration, 'swing', 18, on_done)
+    def play_hurt(self, duration=None, on_done=None):
+        self._play('hurt', duration if duration is not None else self.hurt_duration, 'shake', 6, on_done)
+    def play_defend(self, duration=None, on_done=None):
+        self._play('defend', duration if duration is not None else 400, 'linear', 0, on_done)
     def is_alive(self):
         return self.hp > 0
     def is_stunned(self):
@@ -284,12 +1370,18 @@ class Character:
             poison_dmg = max(1, math.ceil(self.max_hp * 0.03))
             self.hp = max(0, self.hp - poison_dmg)
             add_floating_text_func(self, poison_dmg, (190,80,255), True, size=20)
+            PARTICLES.emit('poison', self.pos[0], self.pos[1])
+            AUDIO.play('poison')
+            EVENTS.emit('status_tick', target=self.name, status='poison', damage=poison_dmg, hp=self.hp)
             if not self.is_alive():
                 return 'dead_by_dot'
         if self.status_effects.get('burn',0) > 0:
             burn_dmg = 15
             self.hp = max(0, self.hp - burn_dmg)
             add_floating_text_func(self, burn_dmg, (255,100,20), True, size=20)
+            PARTICLES.emit('burn', self.pos[0], self.pos[1])
+            AUDIO.play('burn')
+            EVENTS.emit('status_tick', target=self.name, status='burn', damage=burn_dmg, hp=self.hp)
             if not self.is_alive():
                 return 'dead_by_dot'
         return 'continue'
@@ -299,6 +1391,11 @@ class Character:
 # -------------------------
 def draw_rounded_rect(surface, rect, color, radius=8, border=0, border_color=(0,0,0)):
     x,y,w,h = rect
+    if len(color) == 3 and len(border_color) == 3:
+        pygame.draw.rect(surface, color, (x,y,w,h), border_radius=radius)
+        if border > 0:
+            pygame.draw.rect(surface, border_color, (x,y,w,h), border, border_radius=radius)
+        return
     temp = pygame.Surface((w,h), pygame.SRCALPHA)
     pygame.draw.rect(temp, color, (0,0,w,h), border_radius=radius)
     if border > 0:
@@ -306,7 +1403,7 @@ def draw_rounded_rect(surface, rect, color, radius=8, border=0, border_color=(0,
     surface.blit(temp, (x,y))
 
 def draw_text_center(surface, text, font, pos, color=WHITE):
-    s = font.render(text, True, color)
+    s = render_text(font, text, color)
     surface.blit(s, (pos[0]-s.get_width()//2, pos[1]-s.get_height()//2))
 
 def draw_hp_bar_colored(surface, x, y, w, h, current, maximum, color):
@@ -315,14 +1412,23 @@ def draw_hp_bar_colored(surface, x, y, w, h, current, maximum, color):
         filled = 0
     else:
         filled = int(w * (max(0, current) / maximum))
-    grad = pygame.Surface((filled, h), pygame.SRCALPHA)
-    for i in range(filled):
-        a = 255 - int(150 * (.0 / max(1, filled)))
-        grad.fill((*color, a), (i,0,1,h))
     if filled > 0:
-        surface.blit(grad, (x,y))
+        surface.fill(color, (x,y,filled,h))
     pygame.draw.rect(surface, (18,20,22), (x,y,w,h), 2, border_radius=6)
 
+_dim_overlays = {}
+
+def dim_overlay(size):
+    # flat translucent shade: surface alpha on a display-format surface,
+    # built once per size instead of a per-pixel alpha surface every frame
+    surf = _dim_overlays.get(size)
+    if surf is None:
+        surf = pygame.Surface(size).convert()
+        surf.fill((6,8,10))
+        surf.set_alpha(140)
+        _dim_overlays[size] = surf
+    return surf
+
 # -------------------------
 # Header / Pause (small)
 # -------------------------
@@ -330,51 +1436,77 @@ def draw_pause_button(surface, font):
     btn_w, btn_h = 80, 30
     r = pygame.Rect(WIDTH - btn_w - 10, 10, btn_w, btn_h)
     draw_rounded_rect(surface, (r.x,r.y,r.w,r.h), (40,60,80), radius=6, border=2, border_color=(10,14,18))
-    txt = font.render('Pause', True, WHITE)
+    txt = render_text(font, 'Pause', WHITE)
     surface.blit(txt, (r.x + (r.width - txt.get_width())//2, r.y + (r.height - txt.get_height())//2))
     return ('Pause', r)
 
+def draw_hint_button(surface, font):
+    btn_w, btn_h = 80, 30
+    r = pygame.Rect(WIDTH - 2*btn_w - 20, 10, btn_w, btn_h)
+    draw_rounded_rect(surface, (r.x,r.y,r.w,r.h), (60,80,40), radius=6, border=2, border_color=(10,14,18))
+    txt = render_text(font, 'Hint', WHITE)
+    surface.blit(txt, (r.x + (r.width - txt.get_width())//2, r.y + (r.height - txt.get_height())//2))
+    return ('Hint', r)
+
+BATTLE_SPEEDS = ('1x', '2x', '4x', 'instant')
+# animation time scale per speed; instant resolves a whole turn in one frame
+BATTLE_SPEED_SCALE = {'1x': 1, '2x': 2, '4x': 4}
+
+def draw_speed_button(surface, font, speed):
+    btn_w, btn_h = 80, 30
+    r = pygame.Rect(WIDTH - 3*btn_w - 30, 10, btn_w, btn_h)
+    draw_rounded_rect(surface, (r.x,r.y,r.w,r.h), (70,50,90), radius=6, border=2, border_color=(10,14,18))
+    txt = render_text(font, speed.capitalize(), WHITE)
+    surface.blit(txt, (r.x + (r.width - txt.get_width())//2, r.y + (r.height - txt.get_height())//2))
+    return ('Speed', r)
+
 # -------------------------
 # Battle panel (Modernized, left/right aligned)
 # -------------------------
-def draw_battle_panel_lr(surface, font, bigfont, player, enemy, message, state, floor):
+AVATAR_SIZE = 64
+
+def panel_avatar(c, size, flipped=False):
+    # avatar file, or the scaled sprite when there is none; flipped and
+    # scaled variants live in the store so the panel allocates nothing per frame
+    if c.prefix:
+        avatar = try_load_avatar_by_prefix(c.prefix, size)
+        if avatar is not None:
+            if not flipped:
+                return avatar
+            return SURFACES.get(avatar_key(c.prefix, size) + ('flipped',), lambda: pygame.transform.flip(avatar, True, False))
+    if c.image is None:
+        return None
+    image = c.image
+    def thumb():
+        t = pygame.transform.scale(image, size)
+        return pygame.transform.flip(t, True, False) if flipped else t
+    return SURFACES.get(('thumb', c.prefix or c.name, tuple(size), flipped), thumb)
+
+def draw_battle_panel_lr(surface, font, bigfont, player, enemy, message, state, floor, win_chance=None):
     panel_x = 16
     panel_y = 12
     panel_w = WIDTH - 32
     panel_h = 120
     draw_rounded_rect(surface, (panel_x, panel_y, panel_w, panel_h), (18,22,28), radius=10, border=2, border_color=(8,10,14))
-    title = bigfont.render(f'FLOOR {floor} - BATTLE', True, (220,220,230))
+    title = render_text(bigfont, f'FLOOR {floor} - BATTLE', (220,220,230))
     surface.blit(title, (WIDTH//2 - title.get_width()//2, panel_y + 8))
-    avatar_size = 64
+    avatar_size = AVATAR_SIZE
     left_x = panel_x + 18
     avatar_p_rect = pygame.Rect(left_x, panel_y + 36, avatar_size, avatar_size)
-    avatar_thumb_p = None
-    if player.prefix:
-        avatar_thumb_p = try_load_avatar_by_prefix(player.prefix, (avatar_size, avatar_size))
+    avatar_thumb_p = panel_avatar(player, (avatar_size, avatar_size))
     if avatar_thumb_p:
         surface.blit(avatar_thumb_p, avatar_p_rect.topleft)
-    elif player.image:
-        thumb = pygame.transform.scale(player.image, (avatar_size, avatar_size))
-        surface.blit(thumb, avatar_p_rect.topleft)
     else:
         draw_rounded_rect(surface, (avatar_p_rect.x, avatar_p_rect.y, avatar_p_rect.w, avatar_p_rect.h), (40,160,120), radius=8)
     bars_x = avatar_p_rect.right + 12
     bars_w = 220
     draw_hp_bar_colored(surface, bars_x, panel_y + 38, bars_w, 14, player.hp, player.max_hp, (28,200,40))
     draw_hp_bar_colored(surface, bars_x, panel_y + 56, bars_w, 12, player.mp, player.max_mp, (64,150,255))
-    rage_txt = get_font(13).render(f"RAGE {player.rage}/{player.max_rage}", True, (255,200,120))
-    surface.blit(rage_txt, (bars_x, panel_y + 74))
+    glyph_atlas(get_font(13), (255,200,120)).draw(surface, f"RAGE {player.rage}/{player.max_rage}", (bars_x, panel_y + 74))
     avatar_e_rect = pygame.Rect(panel_x + panel_w - 18 - avatar_size, panel_y + 36, avatar_size, avatar_size)
-    avatar_thumb_e = None
-    if enemy.prefix:
-        avatar_thumb_e = try_load_avatar_by_prefix(enemy.prefix, (avatar_size, avatar_size))
+    avatar_thumb_e = panel_avatar(enemy, (avatar_size, avatar_size), flipped=True)
     if avatar_thumb_e:
-        t = pygame.transform.flip(avatar_thumb_e, True, False)
-        surface.blit(t, avatar_e_rect.topleft)
-    elif enemy.image:
-        thumb = pygame.transform.scale(enemy.image, (avatar_size, avatar_size))
-        thumb = pygame.transform.flip(thumb, True, False)
-        surface.blit(thumb, avatar_e_rect.topleft)
+        surface.blit(avatar_thumb_e, avatar_e_rect.topleft)
     else:
         draw_rounded_rect(surface, (avatar_e_rect.x, avatar_e_rect.y, avatar_e_rect.w, avatar_e_rect.h), (200,80,80), radius=8)
     bars_x_e = avatar_e_rect.left - 12 - 220
@@ -390,8 +1522,9 @@ def draw_battle_panel_lr(surface, font, bigfont, player, enemy, message, state,
             if k == 'stun': color = (255,255,80)
             if k == 'invulnerable': color = (100,180,255)
             draw_rounded_rect(surface, (sx, sy, status_icon_size, status_icon_size), color, radius=6)
-            nt = get_font(12).render(str(v), True, BLACK)
-            surface.blit(nt, (sx + (status_icon_size - nt.get_width())//2, sy + (status_icon_size - nt.get_height())//2))
+            digits = glyph_atlas(get_font(12), BLACK)
+            nw, nh = digits.size(str(v))
+            digits.draw(surface, str(v), (sx + (status_icon_size - nw)//2, sy + (status_icon_size - nh)//2))
             sx += status_icon_size + 6
     sx_e = bars_x_e - 12 - (status_icon_size + 6)*2
     for k,v in enemy.status_effects.items():
@@ -401,63 +1534,1007 @@ def draw_battle_panel_lr(surface, font, bigfont, player, enemy, message, state,
             if k == 'stun': color = (255,255,80)
             if k == 'invulnerable': color = (100,180,255)
             draw_rounded_rect(surface, (sx_e, sy, status_icon_size, status_icon_size), color, radius=6)
-            nt = get_font(12).render(str(v), True, BLACK)
-            surface.blit(nt, (sx_e + (status_icon_size - nt.get_width())//2, sy + (status_icon_size - nt.get_height())//2))
+            digits = glyph_atlas(get_font(12), BLACK)
+            nw, nh = digits.size(str(v))
+            digits.draw(surface, str(v), (sx_e + (status_icon_size - nw)//2, sy + (status_icon_size - nh)//2))
             sx_e += status_icon_size + 6
-    msg_font = get_font(18)
-    msg = msg_font.render(message, True, (200,200,210))
+    if win_chance is not None:
+        draw_win_chance(surface, win_chance, panel_y + 72)
+    msg = render_text(get_font(18), message, (200,200,210))
     surface.blit(msg, (WIDTH//2 - msg.get_width()//2, panel_y + panel_h - 28))
     return panel_y + panel_h + 8
 
 # -------------------------
-# Battle sprites
+# Battle sprites (LayeredDirty stage)
 # -------------------------
-def draw_battle_sprites(surface, player, enemy, status_panel_bottom_y, font, message, floor):
-    ground_y = HEIGHT - 150
-    actual_floor_num = (floor - 1) % 8 + 1
-    bg_prefix = f"floor{actual_floor_num}"
-    bg_w = WIDTH
-    bg_h = ground_y - status_panel_bottom_y
-    bg_surf = try_load_image_fuzzy(bg_prefix, (bg_w, bg_h))
-    if bg_surf:
-        surface.blit(bg_surf, (0, status_panel_bottom_y))
-    else:
-        temp = pygame.Surface((WIDTH, bg_h))
-        temp.fill((14,18,22))
-        surface.blit(temp, (0, status_panel_bottom_y))
-        pygame.draw.line(surface, (40,40,50), (0, ground_y), (WIDTH, ground_y), 4)
-    player.pos[0] = WIDTH // 4
-    player.pos[1] = ground_y - SPRITE_H//2
-    enemy.pos[0] = WIDTH * 3 // 4
-    enemy.pos[1] = ground_y - SPRITE_H//2
-    enemy.is_flipped = True
-    shadow_w = 160
-    s = pygame.Surface((shadow_w, 26), pygame.SRCALPHA)
-    pygame.draw.ellipse(s, (0,0,0,120), (0,0,shadow_w,26))
-    surface.blit(s, (player.pos[0]-shadow_w//2, ground_y - 18))
-    surface.blit(s, (enemy.pos[0]-shadow_w//2, ground_y - 18))
-    player.draw(surface)
-    enemy.draw(surface)
-    msg = font.render(message, True, WHITE)
-    surface.blit(msg, (WIDTH//2 - msg.get_width()//2, status_panel_bottom_y + 8))
+BATTLE_PANEL_BOTTOM = 140
+GROUND_Y = HEIGHT - 150
+MAX_ENEMIES = 6
+
+def enemy_anchors(count):
+    # one enemy stands where the classic 1v1 enemy stood; bigger groups spread
+    # over the right half in a front and a back row
+    base_y = GROUND_Y - SPRITE_H//2
+    if count <= 1:
+        return [(WIDTH * 3 // 4, base_y)]
+    left, right = WIDTH//2 + 90, WIDTH - 90
+    step = (right - left) / (count - 1)
+    return [(int(left + i*step), base_y - (50 if i % 2 else 0)) for i in range(count)]
+
+class CharacterSprite(pygame.sprite.DirtySprite):
+    def __init__(self, character, top):
+        super().__init__()
+        self.character = character
+        self.top = top
+        self.image = character.current_image()
+        self.rect = self.image.get_rect(center=(character.pos[0] + character.offset_x, character.pos[1] - top))
+        self._layer = int(character.pos[1])
+        self.dirty = 1
+    def update(self):
+        c = self.character
+        if not c.is_alive():
+            if self.visible:
+                self.visible = 0
+                self.dirty = 1
+            return
+        img = c.current_image()
+        rect = img.get_rect(center=(c.pos[0] + c.offset_x, c.pos[1] - self.top))
+        if img is not self.image or rect != self.rect:
+            self.image = img
+            self.rect = rect
+            self.dirty = 1
+
+SHADOW_SIZE = (160, 26)
+
+class BattleStage:
+    # Built once per floor. The background, ground line and the shadows of
+    # everyone still standing are pre-composited into one surface; characters
+    # are dirty sprites in a LayeredDirty group sorted by ground position, so
+    # a frame is one blit of the stage plus whatever sprites moved or changed
+    # animation frame. A death recomposes the background without that shadow.
+    def __init__(self, player, enemies, floor, top=BATTLE_PANEL_BOTTOM):
+        self.player = player
+        self.enemies = list(enemies)
+        self.top = top
+        self.rect = pygame.Rect(0, top, WIDTH, GROUND_Y + 10 - top)
+        player.pos[0] = WIDTH // 4
+        player.pos[1] = GROUND_Y - SPRITE_H//2
+        for e, (x, y) in zip(self.enemies, enemy_anchors(len(self.enemies))):
+            e.pos[0], e.pos[1] = x, y
+            e.is_flipped = True
+        self.scenery = pygame.Surface(self.rect.size).convert()
+        self.scenery.fill((8,10,12))
+        bg_h = GROUND_Y - top
+        bg_surf = FLOOR_ASSETS.get(floor_background_prefix(floor), (WIDTH, bg_h))
+        if bg_surf:
+            self.scenery.blit(bg_surf, (0, 0))
+        else:
+            self.scenery.fill((14,18,22), (0, 0, WIDTH, bg_h))
+            pygame.draw.line(self.scenery, (40,40,50), (0, bg_h), (WIDTH, bg_h), 4)
+        self.shadow = pygame.Surface(SHADOW_SIZE, pygame.SRCALPHA)
+        pygame.draw.ellipse(self.shadow, (0,0,0,120), self.shadow.get_rect())
+        self.shadow_pos = {c: (c.pos[0] - SHADOW_SIZE[0]//2, c.pos[1] + SPRITE_H//2 - 18 - top)
+                           for c in [player] + self.enemies}
+        self.background = self.scenery.copy()
+        self.surface = self.scenery.copy()
+        self.group = pygame.sprite.LayeredDirty()
+        self.char_sprites = {}
+        for c in [player] + self.enemies:
+            sp = CharacterSprite(c, top)
+            self.char_sprites[c] = sp
+            self.group.add(sp)
+        self.compose()
+    def compose(self):
+        self.standing = [c for c in self.shadow_pos if c.is_alive()]
+        self.background.blit(self.scenery, (0, 0))
+        for c in self.standing:
+            self.background.blit(self.shadow, self.shadow_pos[c])
+        self.surface.blit(self.background, (0, 0))
+        self.group.clear(self.surface, self.background)
+        self.group.repaint_rect(self.surface.get_rect())
+    def close(self):
+        # sprites and groups reference each other; break the cycle so the
+        # stage surfaces are freed right away instead of at the next full GC
+        self.group.empty()
+        self.char_sprites.clear()
+    def sprite_rect(self, character):
+        sp = self.char_sprites.get(character)
+        return sp.rect.move(0, self.top) if sp else None
+    def draw(self, surface):
+        for c in self.standing:
+            if not c.is_alive():
+                self.compose()
+                break
+        self.group.update()
+        self.group.draw(self.surface)
+        surface.blit(self.surface, self.rect.topleft)
+
+def draw_battle_sprites(surface, stage, font, message, target=None):
+    stage.draw(surface)
+    if len(stage.enemies) > 1:
+        for e in stage.enemies:
+            if not e.is_alive():
+                continue
+            r = stage.sprite_rect(e)
+            bx, by = r.centerx - 40, r.top + 6
+            pygame.draw.rect(surface, (30,30,34), (bx, by, 80, 6))
+            pygame.draw.rect(surface, (28,200,40), (bx, by, int(80 * e.hp / max(1, e.max_hp)), 6))
+            if e is target:
+                pygame.draw.polygon(surface, (255,220,80), [(r.centerx - 8, by - 14), (r.centerx + 8, by - 14), (r.centerx, by - 4)])
+    msg = render_text(font, message, WHITE)
+    surface.blit(msg, (WIDTH//2 - msg.get_width()//2, stage.top + 8))
 
 # -------------------------
 # Tower enemy picker (WEAKENED)
 # -------------------------
+# floors 1..8: (name, base HP, MP, prefix); endless runs cycle through the
+# roster again with HP still scaling by floor
+ENEMY_ROSTER = (
+    ('Goblin', 80, 20, 'goblin'),
+    ('Orc', 120, 30, 'orc'),
+    ('Golem', 160, 12, 'golem'),
+    ('Dino', 260, 100, 'dino'),
+    ('Giant Spider', 320, 50, 'spider'),
+    ('Dark Mage Lord', 420, 65, 'darkmage'),
+    ('Devil', 520, 80, 'devil'),
+    ('Dragon', 650, 100, 'dragon'),
+)
+TOWER_FLOORS = len(ENEMY_ROSTER)
+FLOOR_HP_STEP = 0.12  # NERFED SCALING
+
 def pick_enemy_for_floor(floor):
-    if floor == 1: return ('Goblin', 80, 20, 'goblin')
-    if floor == 2: return ('Orc', 120, 30, 'orc')
-    if floor == 3: return ('Golem', 160, 12, 'golem')
-    if floor == 4: return ('Dino', 260, 100, 'dino')
-    if floor == 5: return ('Giant Spider', 320, 50, 'spider')
-    if floor == 6: return ('Dark Mage Lord', 420, 65, 'darkmage')
-    if floor == 7: return ('Devil', 520, 80, 'devil')
-    if floor == 8: return ('Dragon', 650, 100, 'dragon')
-    return pick_enemy_for_floor((floor - 1) % 8 + 1)
+    return ENEMY_ROSTER[(floor - 1) % TOWER_FLOORS]
+
+def scaled_enemy_hp(base_hp, floor):
+    return int(base_hp * (1 + (floor-1)*FLOOR_HP_STEP))
+
+def floor_enemy_stats(floor):
+    name, base_hp, mp, prefix = ENEMY_ROSTER[(floor - 1) % TOWER_FLOORS]
+    cycle = (floor - 1) // TOWER_FLOORS
+    if cycle:
+        name = f"{name} +{cycle}"
+    return name, scaled_enemy_hp(base_hp, floor), mp, prefix
+
+def floor_background_prefix(floor):
+    return f"floor{(floor - 1) % TOWER_FLOORS + 1}"
+
+# -------------------------
+# Per-floor asset working set
+# -------------------------
+FLOOR_ASSET_FLOORS = 2
+
+class FloorAssetCache:
+    # asset-keyed working set: surfaces used on the floor being played and the
+    # one before it (whose enemies come back as the next floor's extras) stay
+    # pinned in SURFACES; older ones are only unpinned, so the store's byte
+    # budget decides when they go and a later floor that reuses a background
+    # or sprite gets it back without decoding the PNG again
+    def __init__(self):
+        self.floor = None
+        self.entered = 0
+        self.surfaces = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+    def enter_floor(self, floor):
+        if floor != self.floor:
+            self.floor = floor
+            self.entered += 1
+            for key in list(self.surfaces):
+                if self.surfaces[key][1] > self.entered - FLOOR_ASSET_FLOORS:
+                    break
+                del self.surfaces[key]
+                SURFACES.unpin(key)
+                self.evictions += 1
+    def get(self, prefix, size):
+        key = image_key(prefix, size)
+        e = self.surfaces.pop(key, None)
+        if e is None:
+            e = (try_load_image_fuzzy(prefix, size), self.entered)
+            SURFACES.pin(key)
+            self.loads += 1
+        self.surfaces[key] = (e[0], self.entered)
+        return e[0]
+
+FLOOR_ASSETS = FloorAssetCache()
+
+def encounter_size(floor, max_enemies):
+    return max(1, min(max_enemies, MAX_ENEMIES, (floor + 1) // 2))
+
+def spawn_encounter(floor, max_enemies=1, fallback_img=None):
+    # the floor's own enemy leads; extra members are earlier roster entries at
+    # half the floor's HP scaling
+    enemies = [spawn_enemy(floor, fallback_img)]
+    for i in range(1, encounter_size(floor, max_enemies)):
+        name, base_hp, mp, prefix = ENEMY_ROSTER[(floor - 1 - i) % TOWER_FLOORS]
+        minion = Character(name, (200,60,80), (0,0), image_surface=FLOOR_ASSETS.get(prefix, (SPRITE_W, SPRITE_H)) or fallback_img, prefix=prefix)
+        minion.max_hp = minion.hp = max(1, scaled_enemy_hp(base_hp, floor) // 2)
+        minion.max_mp = minion.mp = mp
+        enemies.append(minion)
+    return enemies
+
+def spawn_enemy(floor, fallback_img=None):
+    FLOOR_ASSETS.enter_floor(floor)
+    e_name, e_hp, e_mp, e_prefix = floor_enemy_stats(floor)
+    enemy_img = FLOOR_ASSETS.get(e_prefix, (SPRITE_W, SPRITE_H)) or fallback_img
+    enemy = Character(e_name, (200,60,80), (0,0), image_surface=enemy_img, prefix=e_prefix)
+    enemy.max_hp = enemy.hp = e_hp
+    enemy.max_mp = enemy.mp = e_mp
+    return enemy
+
+def floor_images(floor, max_enemies=1):
+    # (prefix, size) of every image spawn_encounter and BattleStage load for a floor
+    images = [(floor_background_prefix(floor), (WIDTH, GROUND_Y - BATTLE_PANEL_BOTTOM))]
+    for i in range(encounter_size(floor, max_enemies)):
+        images.append((ENEMY_ROSTER[(floor - 1 - i) % TOWER_FLOORS][3], (SPRITE_W, SPRITE_H)))
+    return images
+
+# class: (max HP, max MP, crit chance, dodge chance)
+CLASS_STATS = {
+    'Warrior': (150, 30, 0.15, 0.05),
+    'Mage': (90, 100, 0.1, 0.05),
+    'Archer': (110, 50, 0.1, 0.05),
+    'Tank': (180, 20, 0.1, 0.1),
+}
+
+# player heal and damage rolls, (class, action): (lo, hi); Triple Shot rolls
+# once and hits three times
+PLAYER_HEAL = (20, 30)
+SKILL_DAMAGE = {
+    ('warrior', 'skill1'): (80, 105),
+    ('mage', 'skill1'): (48, 72),
+    ('mage', 'skill2'): (60, 85),
+    ('archer', 'skill1'): (18, 30),
+    ('archer', 'skill2'): (24, 36),
+    ('warrior', 'ultimate'): (200, 250),
+    ('mage', 'ultimate'): (120, 150),
+    ('archer', 'ultimate'): (150, 200),
+}
+
+# floor-clear rewards, in reward screen order
+REWARD_MAX_HP = 15
+REWARD_MAX_MP = 10
+REWARD_CRIT = 0.05
+MAX_CRIT = 0.5
+
+def reward_labels():
+    return (f'Max HP +{REWARD_MAX_HP}', f'Max MP +{REWARD_MAX_MP}', f'+{REWARD_CRIT * 100:g}% Crit Chance')
+
+# -------------------------
+# Enemy specials
+# -------------------------
+# prefix: (mp cost, use chance, damage range, status, status chance, message)
+ENEMY_SPECIALS = {
+    'dragon': (30, 0.5, (28,42), 'poison', None, "Dragon breathes POISON fire!"),
+    'golem': (14, 0.4, (17,24), 'stun', 0.4, "Golem uses Rock Smash!"),
+    'orc': (10, 0.3, (10,17), 'vulnerability', None, "Orc throws a Debilitating Axe!"),
+}
+
+def roll_enemy_move(prefix, mp, rng=random):
+    spec = ENEMY_SPECIALS.get(prefix)
+    if spec and mp >= spec[0] and rng.random() < spec[1]:
+        return 'special'
+    return 'attack' if rng.random() < 0.7 else 'heal'
+
+# -------------------------
+# Headless combat model (same rules as main(), one call per turn)
+# -------------------------
+TICKED_STATUSES = ('stun','vulnerability','poison','burn','slow','atk_down','atk_up','def_up','iron_skin')
+ULTIMATE_MP_COST = {'warrior': 30, 'mage': 35, 'tank': 30, 'archer': 40}
+
+class BattleSim:
+    __slots__ = ('cls', 'p_hp', 'p_max_hp', 'p_mp', 'p_max_mp', 'rage', 'crit', 'p_dodge', 'p_status',
+                 'e_prefix', 'e_hp', 'e_max_hp', 'e_mp', 'e_dodge', 'e_status', 'defending', 'winner')
+    def __init__(self):
+        self.winner = None
+        self.defending = False
+    @classmethod
+    def from_characters(cls, player, enemy, player_defending=False):
+        s = cls()
+        s.cls = (player.class_type or "").lower()
+        s.p_hp, s.p_max_hp = player.hp, player.max_hp
+        s.p_mp, s.p_max_mp = player.mp, player.max_mp
+        s.rage = player.rage
+        s.crit, s.p_dodge = player.crit_chance, player.dodge_chance
+        s.p_status = dict(player.status_effects)
+        s.e_prefix = enemy.prefix
+        s.e_hp, s.e_max_hp = enemy.hp, enemy.max_hp
+        s.e_mp = enemy.mp
+        s.e_dodge = enemy.dodge_chance
+        s.e_status = dict(enemy.status_effects)
+        s.defending = player_defending
+        return s
+    @classmethod
+    def for_floor(cls, class_type, floor):
+        s = cls()
+        hp, mp, crit, dodge = CLASS_STATS[class_type]
+        _, e_hp, e_mp, e_prefix = floor_enemy_stats(floor)
+        s.cls = class_type.lower()
+        s.p_hp = s.p_max_hp = hp
+        s.p_mp = s.p_max_mp = mp
+        s.rage = 0
+        s.crit, s.p_dodge = crit, dodge
+        s.p_status = {'poison':0,'stun':0,'vulnerability':0,'invulnerable':0}
+        s.e_prefix = e_prefix
+        s.e_hp = s.e_max_hp = e_hp
+        s.e_mp = e_mp
+        s.e_dodge = 0.05
+        s.e_status = {'poison':0,'stun':0,'vulnerability':0,'invulnerable':0}
+        return s
+    def copy(self):
+        s = BattleSim.__new__(BattleSim)
+        for k in BattleSim.__slots__:
+            setattr(s, k, getattr(self, k))
+        s.p_status = dict(self.p_status)
+        s.e_status = dict(self.e_status)
+        return s
+    def _tick(self, status, max_hp, hp):
+        for k in TICKED_STATUSES:
+            if status.get(k,0) > 0:
+                status[k] -= 1
+        if status.get('invulnerable',0) > 0:
+            status['invulnerable'] -= 1
+        if status.get('poison',0) > 0:
+            hp = max(0, hp - max(1, math.ceil(max_hp * 0.03)))
+        if hp > 0 and status.get('burn',0) > 0:
+            hp = max(0, hp - 15)
+        return hp
+    def legal_player_actions(self):
+        acts = ['attack', 'shield']
+        if self.p_mp >= 15:
+            acts.append('heal')
+        if self.cls == 'warrior':
+            if self.p_mp >= 15: acts += ['skill1', 'skill2']
+        elif self.cls == 'mage':
+            if self.p_mp >= 20: acts.append('skill1')
+            if self.p_mp >= 15: acts.append('skill2')
+        elif self.cls == 'archer':
+            if self.p_mp >= 15: acts.append('skill1')
+            if self.p_mp >= 20: acts.append('skill2')
+        else:
+            if self.p_mp >= 10: acts.append('skill1')
+            if self.p_hp > 15: acts.append('skill2')
+        if self.rage >= 100:
+            acts.append('ultimate')
+        return acts
+    def legal_enemy_moves(self):
+        spec = ENEMY_SPECIALS.get(self.e_prefix)
+        if spec and self.e_mp >= spec[0]:
+            return ['special', 'attack', 'heal']
+        return ['attack', 'heal']
+    def _player_hit(self, dmg, rng):
+        is_crit = rng.random() < self.crit
+        if rng.random() < self.e_dodge:
+            return
+        final = int(dmg * 1.5) if is_crit else dmg
+        self.e_hp = max(0, self.e_hp - final)
+        self.rage = min(100, self.rage + max(1, int(final * 0.10)))
+    def step_player(self, action, rng):
+        self.defending = False
+        self.e_hp = self._tick(self.e_status, self.e_max_hp, self.e_hp)
+        if self.e_hp <= 0:
+            self.winner = 'player'
+            return
+        if self.p_status.get('stun',0) > 0:
+            return
+        c, es = self.cls, self.e_status
+        if action == 'attack':
+            self._player_hit(rng.randint(15,28), rng)
+        elif action == 'heal':
+            self.p_mp -= 15
+            self.p_hp = min(self.p_max_hp, self.p_hp + rng.randint(*PLAYER_HEAL))
+        elif action == 'shield':
+            self.defending = True
+            self.p_mp = min(self.p_max_mp, self.p_mp + 5)
+        elif action == 'skill1':
+            if c == 'warrior':
+                self.p_mp -= 15
+                dmg = rng.randint(*SKILL_DAMAGE['warrior', 'skill1'])
+                es['vulnerability'] = max(es.get('vulnerability',0), 2)
+                self._player_hit(dmg, rng)
+            elif c == 'mage':
+                self.p_mp -= 20
+                dmg = rng.randint(*SKILL_DAMAGE['mage', 'skill1'])
+                es['slow'] = max(es.get('slow',0), 1)
+                self._player_hit(dmg, rng)
+            elif c == 'archer':
+                self.p_mp -= 15
+                self._player_hit(rng.randint(*SKILL_DAMAGE['archer', 'skill1']) * 3, rng)
+            else:
+                self.p_mp -= 10
+                self.p_status['def_up'] = self.p_status.get('def_up',0) + 2
+                es['taunted_by'] = 2
+        elif action == 'skill2':
+            if c == 'warrior':
+                self.p_mp -= 15
+                self.rage = min(100, self.rage + 40)
+            elif c == 'mage':
+                self.p_mp -= 15
+                dmg = rng.randint(*SKILL_DAMAGE['mage', 'skill2'])
+                es['atk_down'] = max(es.get('atk_down',0), 2)
+                self._player_hit(dmg, rng)
+            elif c == 'archer':
+                self.p_mp -= 20
+                dmg = rng.randint(*SKILL_DAMAGE['archer', 'skill2'])
+                es['stun'] = max(es.get('stun',0), 1)
+                self._player_hit(dmg, rng)
+            else:
+                self.p_hp -= 15
+                self.p_status['iron_skin'] = 1
+                self.p_status['atk_up'] = max(self.p_status.get('atk_up',0), 1)
+        elif action == 'ultimate':
+            cost = ULTIMATE_MP_COST.get(c, 30)
+            if self.p_mp >= cost:
+                self.p_mp -= cost
+            self.rage = 0
+            if c == 'warrior':
+                self.e_hp = max(0, self.e_hp - rng.randint(*SKILL_DAMAGE['warrior', 'ultimate']))
+                if self.e_hp == 0:
+                    self.p_hp = min(self.p_max_hp, self.p_hp + int(self.p_max_hp * 0.5))
+            elif c == 'mage':
+                self.e_hp = max(0, self.e_hp - rng.randint(*SKILL_DAMAGE['mage', 'ultimate']))
+                es['burn'] = 3
+            elif c == 'tank':
+                self.p_status['invulnerable'] = 1
+                self.p_status['reflect_pct'] = 0.5
+            elif c == 'archer':
+                self.e_hp = max(0, self.e_hp - rng.randint(*SKILL_DAMAGE['archer', 'ultimate']))
+                es['slow'] = max(es.get('slow',0), 2)
+        if self.e_hp <= 0:
+            self.winner = 'player'
+    def step_enemy(self, move, rng):
+        if self.e_hp <= 0:
+            self.winner = 'player'
+            return
+        ps = self.p_status
+        self.p_hp = self._tick(ps, self.p_max_hp, self.p_hp)
+        if self.p_hp <= 0:
+            self.winner = 'enemy'
+            return
+        if self.e_status.get('stun',0) > 0:
+            return
+        status = None
+        if move == 'special':
+            cost, _, (lo, hi), status, status_chance, _ = ENEMY_SPECIALS[self.e_prefix]
+            self.e_mp -= cost
+            dmg = rng.randint(lo, hi)
+            if status_chance is not None and rng.random() >= status_chance:
+                status = None
+        elif move == 'attack':
+            dmg = int(rng.randint(6,13) * (1.2 if ps.get('vulnerability',0) > 0 else 1.0))
+        else:
+            self.e_hp = min(self.e_max_hp, self.e_hp + rng.randint(6,10))
+            return
+        if rng.random() >= self.p_dodge:
+            final = dmg
+            if self.defending:
+                final = int(dmg * 0.3)
+            elif ps.get('invulnerable',0) > 0:
+                if ps.get('reflect_pct',0) > 0:
+                    self.e_hp = max(0, self.e_hp - int(final * ps['reflect_pct']))
+                final = 0
+            if ps.get('iron_skin',0) > 0:
+                ps['iron_skin'] -= 1
+                final = 0
+            if final > 0:
+                self.p_hp = max(0, self.p_hp - final)
+                self.p_mp = min(self.p_max_mp, self.p_mp + 5)
+                if self.p_hp <= 0:
+                    self.winner = 'enemy'
+                    return
+            if status == 'stun':
+                ps['stun'] = max(ps.get('stun',0), 1)
+            elif status:
+                ps[status] = max(ps.get(status,0), 2)
+        self.defending = False
+    def score(self):
+        # enemy's point of view, 1.0 = enemy wins
+        if self.winner is not None:
+            return 1.0 if self.winner == 'enemy' else 0.0
+        return 0.5 + 0.5 * (self.e_hp / max(1, self.e_max_hp) - self.p_hp / max(1, self.p_max_hp))
+
+# -------------------------
+# Search-based enemy AI (MCTS, runs in a worker thread)
+# -------------------------
+AI_BUDGET_MS = 50
+AI_ROLLOUT_PLIES = 24
+
+class _SearchNode:
+    __slots__ = ('children', 'visits', 'value')
+    def __init__(self):
+        self.children = {}
+        self.visits = 0
+        self.value = 0.0
+
+def _rollout(sim, enemy_to_move, rng):
+    for _ in range(AI_ROLLOUT_PLIES):
+        if sim.winner is not None:
+            break
+        if enemy_to_move:
+            sim.step_enemy(roll_enemy_move(sim.e_prefix, sim.e_mp, rng), rng)
+        else:
+            sim.step_player(rng.choice(sim.legal_player_actions()), rng)
+        enemy_to_move = not enemy_to_move
+    return sim.score()
+
+def mcts_enemy_move(root_sim, budget_ms=AI_BUDGET_MS, rng=None):
+    # Open-loop UCT: chance outcomes are re-sampled on every iteration, the tree
+    # only branches on decisions. Enemy nodes maximise the enemy score, player
+    # nodes minimise it.
+    rng = rng or random.Random()
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000.0
+    root = _SearchNode()
+    nodes, max_depth = 1, 0
+    while True:
+        now = time.perf_counter()
+        if now >= deadline and root.visits > 0:
+            break
+        sim = root_sim.copy()
+        node, path, depth, enemy_to_move = root, [root], 0, True
+        while sim.winner is None:
+            acts = sim.legal_enemy_moves() if enemy_to_move else sim.legal_player_actions()
+            untried = [a for a in acts if a not in node.children]
+            if untried:
+                a = rng.choice(untried)
+                child = node.children[a] = _SearchNode()
+                nodes += 1
+            else:
+                log_n = math.log(node.visits)
+                best, a = None, None
+                for act in acts:
+                    ch = node.children[act]
+                    mean = ch.value / ch.visits
+                    if not enemy_to_move:
+                        mean = 1.0 - mean
+                    u = mean + 1.4 * math.sqrt(log_n / ch.visits)
+                    if best is None or u > best:
+                        best, a = u, act
+                child = node.children[a]
+            if enemy_to_move:
+                sim.step_enemy(a, rng)
+            else:
+                sim.step_player(a, rng)
+            enemy_to_move = not enemy_to_move
+            node = child
+            path.append(node)
+            depth += 1
+            if untried:
+                break
+        max_depth = max(max_depth, depth)
+        value = _rollout(sim, enemy_to_move, rng)
+        for n in path:
+            n.visits += 1
+            n.value += value
+    elapsed = time.perf_counter() - start
+    move = max(root.children.items(), key=lambda kv: kv[1].visits)[0]
+    return move, {'nodes': nodes, 'iterations': root.visits, 'depth': max_depth, 'ms': elapsed * 1000.0}
+
+class EnemyAIWorker:
+    def __init__(self, budget_ms=AI_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0
+        self.busy = False
+        self.rng = random.Random()
+        self.thread = threading.Thread(target=self._run, name="enemy-ai", daemon=True)
+        self.thread.start()
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            gen, sim, name = job
+            move, stats = mcts_enemy_move(sim, self.budget_ms, self.rng)
+            nps = stats['nodes'] / max(1e-6, stats['ms'] / 1000.0)
+            print(f"[ai] {name}: {move} after {stats['iterations']} playouts, {stats['nodes']} nodes "
+                  f"in {stats['ms']:.1f} ms ({nps:.0f} nodes/s), depth {stats['depth']}")
+            self.results.put((gen, move))
+    def submit(self, sim, name="enemy"):
+        self.busy = True
+        self.jobs.put((self.generation, sim, name))
+    def poll(self):
+        while True:
+            try:
+                gen, move = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if gen == self.generation:
+                self.busy = False
+                return move
+    def cancel(self):
+        self.generation += 1
+        self.busy = False
+    def close(self):
+        self.cancel()
+        self.jobs.put(None)
+
+# -------------------------
+# Policy hints (table built offline by policy_solver.py)
+# -------------------------
+POLICY_FILE = "policy.bin"
+POLICY_MAGIC = b'TRPT'
+POLICY_VERSION = 1
+POLICY_CLASSES = ('Warrior', 'Mage', 'Tank', 'Archer')
+POLICY_ACTIONS = ('attack', 'heal', 'shield', 'skill1', 'skill2', 'ultimate')
+# player HP tenth, MP/5 (capped at 40), rage quarter, enemy HP tenth, enemy specials left,
+# player poison, vulnerability, stun, iron skin, invulnerable, enemy burn
+POLICY_RADICES = (10, 9, 5, 10, 4, 3, 3, 2, 2, 2, 4)
+
+def policy_key(sim):
+    ps, es = sim.p_status, sim.e_status
+    spec = ENEMY_SPECIALS.get(sim.e_prefix)
+    digits = (
+        min(9, sim.p_hp * 10 // max(1, sim.p_max_hp)),
+        min(8, sim.p_mp // 5),
+        min(4, sim.rage // 25),
+        min(9, sim.e_hp * 10 // max(1, sim.e_max_hp)),
+        min(3, sim.e_mp // spec[0]) if spec else 0,
+        min(2, ps.get('poison',0)),
+        min(2, ps.get('vulnerability',0)),
+        min(1, ps.get('stun',0)),
+        min(1, ps.get('iron_skin',0)),
+        min(1, ps.get('invulnerable',0)),
+        min(3, es.get('burn',0)),
+    )
+    key = 0
+    for d, r in zip(digits, POLICY_RADICES):
+        key = key * r + d
+    return key
+
+def policy_digits(key):
+    digits = []
+    for r in reversed(POLICY_RADICES):
+        digits.append(key % r)
+        key //= r
+    return digits[::-1]
+
+class PolicyTable:
+    # file: magic, version, section count, then per section (class index, floor,
+    # record count) followed by uint32 keys, uint8 actions and uint8 win chances
+    def __init__(self, sections=None):
+        self.sections = sections or {}
+    def lookup(self, player, enemy, floor, player_defending=False):
+        sec = self.sections.get((player.class_type, (floor - 1) % TOWER_FLOORS + 1))
+        if not sec:
+            return None
+        packed = sec.get(policy_key(BattleSim.from_characters(player, enemy, player_defending)))
+        if packed is None:
+            return None
+        return POLICY_ACTIONS[packed >> 8], (packed & 255) / 255.0
+    def save(self, path=POLICY_FILE):
+        parts = [struct.pack('<4sBH', POLICY_MAGIC, POLICY_VERSION, len(self.sections))]
+        for (cls, floor), sec in sorted(self.sections.items()):
+            keys = sorted(sec)
+            k_arr = array.array('I', keys)
+            if sys.byteorder == 'big':
+                k_arr.byteswap()
+            parts.append(struct.pack('<BBI', POLICY_CLASSES.index(cls), floor, len(keys)))
+            parts.append(k_arr.tobytes())
+            parts.append(bytes(sec[k] >> 8 for k in keys))
+            parts.append(bytes(sec[k] & 255 for k in keys))
+        data = b''.join(parts)
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return len(data)
+    @classmethod
+    def load(cls, path=POLICY_FILE):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, count = struct.unpack_from('<4sBH', data, 0)
+        if magic != POLICY_MAGIC or version != POLICY_VERSION:
+            raise ValueError(f"{path}: not a policy table (version {version})")
+        off = struct.calcsize('<4sBH')
+        sections = {}
+        for _ in range(count):
+            ci, floor, n = struct.unpack_from('<BBI', data, off)
+            off += struct.calcsize('<BBI')
+            k_arr = array.array('I')
+            k_arr.frombytes(data[off:off + 4*n])
+            if sys.byteorder == 'big':
+                k_arr.byteswap()
+            off += 4*n
+            acts = data[off:off + n]
+            probs = data[off + n:off + 2*n]
+            off += 2*n
+            sections[(POLICY_CLASSES[ci], floor)] = {k: (a << 8) | p for k, a, p in zip(k_arr, acts, probs)}
+        return cls(sections)
+
+def load_policy_table(path=POLICY_FILE):
+    base_dir = os.path.dirname(os.path.abspath(__file__)) if "__file__" in globals() else os.getcwd()
+    p = path if os.path.isabs(path) else os.path.join(base_dir, path)
+    if not os.path.isfile(p):
+        return None
+    try:
+        t0 = time.perf_counter()
+        table = PolicyTable.load(p)
+        print(f"[policy] Loaded {len(table.sections)} sections from {os.path.basename(p)} in {(time.perf_counter()-t0)*1000:.1f} ms")
+        return table
+    except Exception as e:
+        print(f"[policy] Failed to load {p}: {e}")
+        return None
+
+def action_button_label(action, class_type):
+    skill1, skill2 = skill_labels(class_type)
+    return {'attack': "Attack", 'heal': "Heal", 'shield': "Shield", 'skill1': skill1.split('(')[0].strip(),
+            'skill2': skill2.split('(')[0].strip(), 'ultimate': "ULTIMATE"}[action]
+
+# -------------------------
+# Win chance (background rollouts, cached per state key)
+# -------------------------
+WIN_SAMPLES_TARGET = 2000
+WIN_CACHE_KEYS = 4096
+WIN_ROLLOUT_PLIES = 400
+
+def heuristic_player_action(sim, rng):
+    acts = sim.legal_player_actions()
+    if 'ultimate' in acts:
+        return 'ultimate'
+    if 'heal' in acts and sim.p_hp < sim.p_max_hp * 0.35:
+        return 'heal'
+    if 'skill1' in acts and rng.random() < 0.5:
+        return 'skill1'
+    return 'attack'
+
+def rollout_fight(sims, rng):
+    # enemies are fought one after another, the player's HP, MP, rage and
+    # statuses carry over; a fight that does not end counts as a loss
+    carry = None
+    for base in sims:
+        s = base.copy()
+        if carry:
+            s.p_hp, s.p_mp, s.rage, s.p_status = carry
+            s.defending = False
+        for _ in range(WIN_ROLLOUT_PLIES):
+            s.step_player(heuristic_player_action(s, rng), rng)
+            if s.winner is None:
+                s.step_enemy(roll_enemy_move(s.e_prefix, s.e_mp, rng), rng)
+            if s.winner is not None:
+                break
+        if s.winner != 'player':
+            return 0
+        carry = (s.p_hp, s.p_mp, s.rage, s.p_status)
+    return 1
+
+class WinEstimator:
+    # The main thread only builds the state key and reads the cache; a worker
+    # keeps adding rollouts for the latest key until it has enough samples.
+    # Counts are stored per key, so returning to a state seen before resumes
+    # from its earlier samples instead of starting over.
+    def __init__(self, target=WIN_SAMPLES_TARGET):
+        self.target = target
+        self.cache = OrderedDict()
+        self.rollouts = 0
+        self.observe_ns = 0
+        self.observe_worst_ns = 0
+        self.observes = 0
+        self._key = None
+        self._job = None
+        self._wake = threading.Event()
+        self._stop = False
+        self.rng = random.Random()
+        self.thread = threading.Thread(target=self._run, name="win-estimator", daemon=True)
+        self.thread.start()
+    def observe(self, player, enemies, player_defending):
+        # returns (win chance, samples) for the fight as it stands; the
+        # chance is None until the first batch is in
+        t = time.perf_counter_ns()
+        alive = [e for e in enemies if e.is_alive()]
+        sims = [BattleSim.from_characters(player, e, player_defending and i == 0) for i, e in enumerate(alive)]
+        key = tuple(policy_key(sim) for sim in sims)
+        if key != self._key:
+            self._key = key
+            self._job = (key, sims)
+            self._wake.set()
+        entry = self.cache.get(key)
+        ns = time.perf_counter_ns() - t
+        self.observe_ns += ns
+        self.observes += 1
+        self.observe_worst_ns = max(self.observe_worst_ns, ns)
+        if not entry:
+            return None, 0
+        return entry[0] / entry[1], entry[1]
+    def _run(self):
+        while True:
+            self._wake.wait()
+            # clear before reading the job: an observe() landing after this
+            # point sets the flag again instead of being wiped out
+            self._wake.clear()
+            if self._stop:
+                return
+            job = self._job
+            if job is None:
+                continue
+            key, sims = job
+            entry = self.cache.get(key, (0, 0))
+            if entry[1] >= self.target or not sims:
+                continue
+            wins, n = entry
+            for _ in range(16):
+                wins += rollout_fight(sims, self.rng)
+                n += 1
+                # hand the GIL back after every rollout so a frame never
+                # waits on a whole batch
+                time.sleep(0)
+            self.rollouts += 16
+            self.cache[key] = (wins, n)
+            self.cache.move_to_end(key)
+            while len(self.cache) > WIN_CACHE_KEYS:
+                self.cache.popitem(last=False)
+            # come straight back for the next batch (or a newer job)
+            self._wake.set()
+    def close(self):
+        self._stop = True
+        self._wake.set()
+    def summary(self):
+        avg = self.observe_ns / 1000 / self.observes if self.observes else 0.0
+        return (f"{self.rollouts} rollouts over {len(self.cache)} states, main thread {avg:.0f} us/frame "
+                f"(worst {self.observe_worst_ns / 1000:.0f} us)")
+
+def draw_win_chance(surface, estimate, y):
+    p, n = estimate
+    if p is None:
+        text, color = "Win chance ...", (150,150,160)
+    else:
+        color = (int(230 - 170 * p), int(80 + 140 * p), 90)
+        text = f"Win chance {p*100:.0f}%" + ("" if n >= WIN_SAMPLES_TARGET else " ...")
+    t = render_text(get_font(15), text, color)
+    surface.blit(t, (WIDTH//2 - t.get_width()//2, y))
+
+# -------------------------
+# Battle event log (ring buffer + background JSONL writer)
+# -------------------------
+EVENT_RING_SIZE = 65536
+EVENT_FLUSH_MS = 250
+EVENT_ROTATE_BYTES = 4 * 1024 * 1024
+EVENT_KEEP_FILES = 8
+TRACKED_STATUSES = TICKED_STATUSES + ('invulnerable',)
+
+class BattleEventLog:
+    # emit() only appends a tuple to a bounded deque; a writer thread drains
+    # it every EVENT_FLUSH_MS, serializes the batch and appends it to
+    # rotating JSONL files. If the writer falls behind, the oldest records
+    # are overwritten and counted as dropped. Disabled logs ignore emit().
+    def __init__(self, rotate_bytes=EVENT_ROTATE_BYTES, keep=EVENT_KEEP_FILES):
+        self.directory = None
+        self.enabled = False
+        self.rotate_bytes = rotate_bytes
+        self.keep = keep
+        self.ring = deque(maxlen=EVENT_RING_SIZE)
+        self.frame = 0
+        self.emitted = 0
+        self.written = 0
+        self.emit_ns = 0
+        self.files = 0
+        self.bytes_written = 0
+        self._t0 = time.perf_counter_ns()
+        self._file = None
+        self._file_bytes = 0
+        self._stamp = time.strftime("%Y%m%d-%H%M%S")
+        # per-Character counters; weak keys so finished encounters drop out
+        self._statuses = weakref.WeakKeyDictionary()
+        self._stop = threading.Event()
+        self._thread = None
+    def start(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.enabled = True
+        self._t0 = time.perf_counter_ns()
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+    def emit(self, kind, **fields):
+        if not self.enabled:
+            return
+        t = time.perf_counter_ns()
+        self.ring.append((t, self.frame, kind, fields))
+        self.emitted += 1
+        self.emit_ns += time.perf_counter_ns() - t
+    def track_statuses(self, chars):
+        # one 'status' record whenever a status counter goes up, whichever
+        # code path applied it
+        if not self.enabled:
+            return
+        for c in chars:
+            seen = self._statuses.setdefault(c, {})
+            for k in TRACKED_STATUSES:
+                v = c.status_effects.get(k, 0)
+                if v > seen.get(k, 0):
+                    self.emit('status', target=c.name, status=k, turns=v)
+                seen[k] = v
+    def _open_next(self):
+        if self._file:
+            self._file.close()
+        self.files += 1
+        path = os.path.join(self.directory, f"events-{self._stamp}-{self.files:03d}.jsonl")
+        self._file = open(path, "w", encoding="utf-8")
+        self._file_bytes = 0
+        old = sorted(f for f in os.listdir(self.directory) if f.startswith("events-") and f.endswith(".jsonl"))
+        for f in old[:max(0, len(old) - self.keep)]:
+            try:
+                os.remove(os.path.join(self.directory, f))
+            except OSError:
+                pass
+    def _drain(self):
+        batch = []
+        ring = self.ring
+        while ring:
+            t, frame, kind, fields = ring.popleft()
+            rec = {'t_ms': round((t - self._t0) / 1e6, 1), 'frame': frame, 'event': kind}
+            rec.update(fields)
+            batch.append(json.dumps(rec, separators=(',', ':')))
+        if not batch:
+            return
+        data = "\n".join(batch) + "\n"
+        if self._file is None or self._file_bytes >= self.rotate_bytes:
+            self._open_next()
+        self._file.write(data)
+        self._file.flush()
+        self._file_bytes += len(data)
+        self.bytes_written += len(data)
+        self.written += len(batch)
+    def _run(self):
+        while not self._stop.wait(EVENT_FLUSH_MS / 1000):
+            try:
+                self._drain()
+            except OSError as e:
+                print(f"[events] Write failed: {e}")
+                self.enabled = False
+                return
+    def close(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self._drain()
+        except OSError as e:
+            print(f"[events] Write failed: {e}")
+        if self._file:
+            self._file.close()
+            self._file = None
+    def summary(self, frame_ms_total):
+        dropped = self.emitted - self.written - len(self.ring)
+        cost_ms = self.emit_ns / 1e6
+        share = cost_ms * 100 / frame_ms_total if frame_ms_total else 0.0
+        per = self.emit_ns / 1000 / self.emitted if self.emitted else 0.0
+        return (f"{self.emitted} records, {self.written} written to {self.files} files "
+                f"({self.bytes_written/1024:.0f} KB), {dropped} dropped, "
+                f"main thread {cost_ms:.1f} ms ({per:.1f} us/record, {share:.3f}% of frame time)")
+
+EVENTS = BattleEventLog()
 
 # -------------------------
 # Action button panel
 # -------------------------
+def skill_labels(class_type):
+    if not class_type:
+        return "Skill1", "Skill2"
+    cname = class_type.lower()
+    if 'warrior' in cname:
+        return "Armor Break (-15 MP)", "Rage (-15 MP)"
+    elif 'mage' in cname:
+        return "Ice Shards (-20 MP)", "Vacuum (-15 MP)"
+    elif 'archer' in cname:
+        return "Triple Shot (-15 MP)", "Stun Shot (-20 MP)"
+    return "Taunt (-10 MP)", "Iron Skin (15 HP)"
+
+_ultimate_glows = {}
+
+def ultimate_glow(size):
+    # the ULTIMATE button's stacked glow, composed once per size
+    surf = _ultimate_glows.get(size)
+    if surf is None:
+        w, h = size
+        surf = _ultimate_glows[size] = pygame.Surface((w, h), pygame.SRCALPHA)
+        for i in range(6,0,-1):
+            a = int(40 * (i/6))
+            pygame.draw.rect(surf, (255,120,200,a), (0,0,w,h), border_radius=14)
+        draw_rounded_rect(surf, (0,0,w,h), (120,30,160), radius=14)
+    return surf
+
 def draw_action_panel_modern(surface, font, player):
     panel_h = 150
     panel_y = HEIGHT - panel_h
@@ -469,22 +2546,7 @@ def draw_action_panel_modern(surface, font, player):
     start_x = WIDTH//2 - total_w//2
     top_y = panel_y + 18
     bottom_y = panel_y + 18 + top_btn_h + 12
-    skill1 = "Skill1"
-    skill2 = "Skill2"
-    if player and player.class_type:
-        cname = player.class_type.lower()
-        if 'warrior' in cname:
-            skill1 = "Armor Break (-15 MP)"
-            skill2 = "Rage (-15 MP)"
-        elif 'mage' in cname:
-            skill1 = "Ice Shards (-20 MP)"
-            skill2 = "Vacuum (-15 MP)"
-        elif 'archer' in cname:
-            skill1 = "Triple Shot (-15 MP)"
-            skill2 = "Stun Shot (-20 MP)"
-        else:
-            skill1 = "Taunt (-10 MP)"
-            skill2 = "Iron Skin (15 HP)"
+    skill1, skill2 = skill_labels(player.class_type if player else None)
     actions_top = [
         ("Attack", (42,120,255)),
         (f"Heal (-15 MP)", (40,200,120)),
@@ -500,46 +2562,40 @@ def draw_action_panel_modern(surface, font, player):
     for i,(lbl,col) in enumerate(actions_top):
         r = pygame.Rect(start_x + i*(top_btn_w+spacing), top_y, top_btn_w, top_btn_h)
         draw_rounded_rect(surface, (r.x,r.y,r.w,r.h), col, radius=10)
-        overlay = pygame.Surface((r.w, r.h), pygame.SRCALPHA); overlay.fill((6,8,10,140)); surface.blit(overlay, (r.x, r.y))
+        surface.blit(dim_overlay(r.size), (r.x, r.y))
         pygame.draw.line(surface, (255,255,255,30), (r.x+8, r.y+6), (r.right-8, r.y+6), 2)
-        txt = font.render(lbl.split('(')[0].strip(), True, WHITE)
+        txt = render_text(font, lbl.split('(')[0].strip(), WHITE)
         surface.blit(txt, (r.x + (r.w - txt.get_width())//2, r.y + (r.h - txt.get_height())//2))
         if '(' in lbl:
             cost = lbl.split('(')[1].replace(')','')
-            cfont = get_font(14)
-            cs = cfont.render(cost, True, (220,220,220))
+            cs = render_text(get_font(14), cost, (220,220,220))
             surface.blit(cs, (r.right - cs.get_width() - 8, r.bottom - cs.get_height() - 6))
         rects.append((lbl, r))
     left_w = 180; center_w = 220; right_w = 180
     left_x = WIDTH//2 - (left_w + spacing + center_w + spacing + right_w)//2
     r1 = pygame.Rect(left_x, bottom_y, left_w, bottom_btn_h)
     draw_rounded_rect(surface, (r1.x,r1.y,r1.w,r1.h), actions_bottom[0][1], radius=12)
-    overlay = pygame.Surface((r1.w,r1.h), pygame.SRCALPHA); overlay.fill((6,8,10,140)); surface.blit(overlay, (r1.x,r1.y))
-    t1 = font.render(actions_bottom[0][0].split('(')[0].strip(), True, WHITE)
+    surface.blit(dim_overlay(r1.size), (r1.x,r1.y))
+    t1 = render_text(font, actions_bottom[0][0].split('(')[0].strip(), WHITE)
     surface.blit(t1, (r1.x + (r1.w - t1.get_width())//2, r1.y + (r1.h - t1.get_height())//2))
     if '(' in actions_bottom[0][0]:
         cost = actions_bottom[0][0].split('(')[1].replace(')','')
-        cs = get_font(14).render(cost, True, (220,220,220))
+        cs = render_text(get_font(14), cost, (220,220,220))
         surface.blit(cs, (r1.right - cs.get_width() - 8, r1.bottom - cs.get_height() - 6))
     rects.append((actions_bottom[0][0], r1))
     rcenter = pygame.Rect(r1.right + spacing, bottom_y - 8, center_w, bottom_btn_h + 16)
-    center_surf = pygame.Surface((rcenter.w, rcenter.h), pygame.SRCALPHA)
-    for i in range(6,0,-1):
-        a = int(40 * (i/6))
-        pygame.draw.rect(center_surf, (255,120,200,a), (0,0,rcenter.w,rcenter.h), border_radius=14)
-    draw_rounded_rect(center_surf, (0,0,rcenter.w,rcenter.h), (120,30,160), radius=14)
-    surface.blit(center_surf, (rcenter.x, rcenter.y))
-    txt = get_font(20).render("ULTIMATE", True, WHITE)
+    surface.blit(ultimate_glow(rcenter.size), (rcenter.x, rcenter.y))
+    txt = render_text(get_font(20), "ULTIMATE", WHITE)
     surface.blit(txt, (rcenter.x + (rcenter.w - txt.get_width())//2, rcenter.y + (rcenter.h - txt.get_height())//2))
     rects.append((ultimate_label, rcenter))
     r2 = pygame.Rect(rcenter.right + spacing, bottom_y, right_w, bottom_btn_h)
     draw_rounded_rect(surface, (r2.x,r2.y,r2.w,r2.h), actions_bottom[2][1], radius=12)
-    overlay = pygame.Surface((r2.w,r2.h), pygame.SRCALPHA); overlay.fill((6,8,10,140)); surface.blit(overlay, (r2.x,r2.y))
-    t2 = font.render(actions_bottom[2][0].split('(')[0].strip(), True, WHITE)
+    surface.blit(dim_overlay(r2.size), (r2.x,r2.y))
+    t2 = render_text(font, actions_bottom[2][0].split('(')[0].strip(), WHITE)
     surface.blit(t2, (r2.x + (r2.w - t2.get_width())//2, r2.y + (r2.h - t2.get_height())//2))
     if '(' in actions_bottom[2][0]:
         cost = actions_bottom[2][0].split('(')[1].replace(')','')
-        cs = get_font(14).render(cost, True, (220,220,220))
+        cs = render_text(get_font(14), cost, (220,220,220))
         surface.blit(cs, (r2.right - cs.get_width() - 8, r2.bottom - cs.get_height() - 6))
     rects.append((actions_bottom[2][0], r2))
     charge_w = int((rcenter.w - 12) * (player.rage / max(1, player.max_rage)))
@@ -548,26 +2604,1071 @@ def draw_action_panel_modern(surface, font, player):
         pygame.draw.rect(surface, (255,140,30), (rcenter.x+6, rcenter.bottom - 12, charge_w, 8), border_radius=8)
     return rects
 
+# -------------------------
+# Window scaling
+# -------------------------
+class Viewport:
+    # Everything draws onto a fixed WIDTH x HEIGHT canvas; the window can be
+    # any size and gets one scaled blit per frame, letterboxed to keep the
+    # aspect ratio. The scale target is a subsurface of the window built once
+    # per window size, so resizing never rescales assets and the old target is
+    # dropped with the old window surface.
+    def __init__(self, size=(WIDTH, HEIGHT), smooth=True):
+        self.smooth = smooth
+        self.window = None
+        self.target = None
+        self.dest = pygame.Rect(0, 0, WIDTH, HEIGHT)
+        self.resize(size)
+        self.canvas = pygame.Surface((WIDTH, HEIGHT)).convert()
+    def resize(self, size):
+        w, h = max(1, size[0]), max(1, size[1])
+        self.window = pygame.display.set_mode((w, h), pygame.RESIZABLE)
+        scale = min(w / WIDTH, h / HEIGHT)
+        dw, dh = max(1, round(WIDTH * scale)), max(1, round(HEIGHT * scale))
+        self.dest = pygame.Rect((w - dw) // 2, (h - dh) // 2, dw, dh)
+        self.window.fill((0, 0, 0))
+        self.target = None if self.dest.size == (WIDTH, HEIGHT) else self.window.subsurface(self.dest)
+    def to_canvas(self, pos):
+        x = (pos[0] - self.dest.x) * WIDTH // self.dest.w
+        y = (pos[1] - self.dest.y) * HEIGHT // self.dest.h
+        return min(max(x, 0), WIDTH - 1), min(max(y, 0), HEIGHT - 1)
+    def present(self):
+        if self.target is None:
+            self.window.blit(self.canvas, self.dest)
+        elif self.smooth:
+            pygame.transform.smoothscale(self.canvas, self.dest.size, self.target)
+        else:
+            pygame.transform.scale(self.canvas, self.dest.size, self.target)
+        pygame.display.flip()
+
+def parse_window_size(text):
+    try:
+        w, h = (int(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+    if w < 1 or h < 1:
+        raise argparse.ArgumentTypeError(f"window size must be positive, got {text!r}")
+    return w, h
+
+# -------------------------
+# Frame capture (shared-memory ring, encoder process)
+# -------------------------
+CAPTURE_SLOTS = 6
+CAPTURE_ENCODERS = ("auto", "png", "ffmpeg")
+
+def _capture_worker(shm_name, slots, size, masks, out_dir, encoder, jobs, free, results):
+    # Runs in a spawned process: encodes each filled slot, then hands the slot
+    # back. PNGs go through a surface with the canvas' pixel layout; ffmpeg
+    # reads the raw slot memory straight from its stdin.
+    from multiprocessing import shared_memory
+    import subprocess
+    shm = shared_memory.SharedMemory(name=shm_name)
+    w, h = size
+    frame_bytes = w * h * 4
+    proc = frame = None
+    if encoder == 'png':
+        frame = pygame.Surface(size, 0, 32, masks)
+    else:
+        pix = 'rgb0' if masks[0] == 0xff else 'bgr0'
+        proc = subprocess.Popen([encoder, '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', pix, '-s', f'{w}x{h}',
+                                 '-r', str(FPS), '-i', '-', '-pix_fmt', 'yuv420p', os.path.join(out_dir, 'capture.mp4')],
+                                stdin=subprocess.PIPE)
+    written = 0
+    encode_s = 0.0
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        slot, index = job
+        t0 = time.perf_counter()
+        view = shm.buf[slot * frame_bytes:(slot + 1) * frame_bytes]
+        try:
+            if proc:
+                proc.stdin.write(view)
+            else:
+                frame.get_buffer().write(bytes(view))
+                pygame.image.save(frame, os.path.join(out_dir, f"frame_{index:06d}.png"))
+            written += 1
+        except (OSError, ValueError, pygame.error) as e:
+            print(f"[capture] encoder failed: {e}")
+            view.release()
+            break
+        view.release()
+        free.put(slot)
+        encode_s += time.perf_counter() - t0
+    if proc:
+        proc.stdin.close()
+        proc.wait()
+    shm.close()
+    results.put((written, encode_s))
+
+class FrameCapture:
+    # The main thread copies the canvas' pixel buffer into a free slot of a
+    # shared-memory ring (the only copy it makes) and queues the slot index;
+    # a worker process encodes it. With no free slot the frame is dropped and
+    # counted instead of waiting for the writer.
+    def __init__(self, out_dir, surface, encoder="auto", slots=CAPTURE_SLOTS):
+        import multiprocessing
+        import shutil
+        from multiprocessing import shared_memory
+        os.makedirs(out_dir, exist_ok=True)
+        if encoder == "auto":
+            encoder = "ffmpeg" if shutil.which("ffmpeg") else "png"
+        if encoder == "ffmpeg":
+            encoder = shutil.which("ffmpeg")
+            if encoder is None:
+                raise ValueError("ffmpeg not found on PATH")
+        w, h = surface.get_size()
+        if surface.get_bitsize() != 32 or surface.get_pitch() != w * 4:
+            raise ValueError("capture needs a packed 32-bit surface")
+        self.out_dir = out_dir
+        self.encoder = "png" if encoder == "png" else os.path.basename(encoder)
+        self.frame_bytes = w * h * 4
+        self.shm = shared_memory.SharedMemory(create=True, size=self.frame_bytes * slots)
+        ctx = multiprocessing.get_context("spawn")
+        self.jobs = ctx.Queue()
+        self.free = ctx.Queue()
+        self.results = ctx.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.worker = ctx.Process(target=_capture_worker, name="frame-capture", daemon=True,
+                                  args=(self.shm.name, slots, (w, h), surface.get_masks(), out_dir, encoder,
+                                        self.jobs, self.free, self.results))
+        self.worker.start()
+        self.offered = 0
+        self.dropped = 0
+        self.written = 0
+        self.encode_s = 0.0
+        self.main_ns = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+    def capture(self, surface):
+        t0 = time.perf_counter_ns()
+        self.offered += 1
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+        else:
+            off = slot * self.frame_bytes
+            self.shm.buf[off:off + self.frame_bytes] = surface.get_buffer()
+            self.jobs.put((slot, self.offered))
+        self.main_ns += time.perf_counter_ns() - t0
+    def close(self):
+        self.elapsed = time.perf_counter() - self.started
+        self.jobs.put(None)
+        while True:
+            try:
+                self.written, self.encode_s = self.results.get(timeout=0.5)
+                break
+            except queue.Empty:
+                if not self.worker.is_alive():
+                    print(f"[capture] writer exited with code {self.worker.exitcode}")
+                    break
+        self.worker.join(timeout=5)
+        if self.worker.is_alive():
+            self.worker.terminate()
+        self.shm.close()
+        self.shm.unlink()
+    def summary(self):
+        main_ms = self.main_ns / 1e6
+        pct = main_ms / (self.elapsed * 1000) * 100 if self.elapsed else 0.0
+        enc = self.encode_s * 1000 / self.written if self.written else 0.0
+        return (f"{self.offered} frames, {self.written} written ({self.encoder}) to {self.out_dir}, "
+                f"{self.dropped} dropped (writer behind); main thread {main_ms / max(1, self.offered):.2f} ms/frame "
+                f"= {pct:.1f}% of frame time, encoder {enc:.1f} ms/frame")
+
+# -------------------------
+# Frame watchdog (stall detection with stack sampling)
+# -------------------------
+STALL_MS = 25
+STALL_SAMPLE_MS = 5
+JANK_BUCKETS = (17, 20, 25, 33, 50, 100, 250)
+
+class FrameWatchdog:
+    # The main thread reports each frame's duration (clock.tick) together
+    # with the screen it ran on. A side thread polls how long the current
+    # frame has been running and, once it is over budget, samples the main
+    # thread's Python stack, so a stall is recorded with where it was spent.
+    # Optionally cyclic GC is paused during battle and run on screen
+    # transitions instead.
+    def __init__(self, stall_ms=STALL_MS, sample=True, gc_pause=False):
+        self.stall_ms = stall_ms
+        self.gc_pause = gc_pause
+        self.hist = [0] * (len(JANK_BUCKETS) + 1)
+        self.frames = 0
+        self.worst = 0
+        self.stalls = []
+        self.stalls_by_screen = {}
+        self.gc_ms = 0.0
+        self.gc_count = 0
+        self.gc_worst = 0.0
+        self.transition_gc_ms = 0.0
+        self.transition_gcs = 0
+        self._frame_gc_ms = 0.0
+        self._gc_start = None
+        self._beat = None
+        self._screen = None
+        self._samples = (None, [])
+        self._main = threading.main_thread().ident
+        self._stop = threading.Event()
+        gc.callbacks.append(self._on_gc)
+        self._thread = None
+        if sample:
+            self._thread = threading.Thread(target=self._run, name="frame-watchdog", daemon=True)
+            self._thread.start()
+    def _on_gc(self, phase, info):
+        if phase == 'start':
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            ms = (time.perf_counter() - self._gc_start) * 1000
+            self._gc_start = None
+            self.gc_ms += ms
+            self.gc_count += 1
+            self.gc_worst = max(self.gc_worst, ms)
+            self._frame_gc_ms += ms
+    def _run(self):
+        while not self._stop.wait(STALL_SAMPLE_MS / 1000):
+            beat = self._beat
+            if beat is None or (time.perf_counter() - beat) * 1000 < self.stall_ms:
+                continue
+            frame = sys._current_frames().get(self._main)
+            if frame is None:
+                continue
+            owner, samples = self._samples
+            if owner != beat:
+                samples = []
+                self._samples = (beat, samples)
+            if len(samples) < 8:
+                samples.append(traceback.extract_stack(frame))
+            del frame
+    def frame(self, ms, menu_state, state):
+        # ms is the length of the frame that just ended, which ran on the
+        # screen recorded at its start
+        if self._beat is not None:
+            self.frames += 1
+            i = 0
+            while i < len(JANK_BUCKETS) and ms >= JANK_BUCKETS[i]:
+                i += 1
+            self.hist[i] += 1
+            self.worst = max(self.worst, ms)
+            if ms >= self.stall_ms:
+                owner, samples = self._samples
+                stack = samples[-1] if owner == self._beat and samples else None
+                self.stalls.append((ms, self._screen, self._frame_gc_ms, stack))
+                self.stalls_by_screen[self._screen] = self.stalls_by_screen.get(self._screen, 0) + 1
+        self._screen = f"{menu_state}/{state}" if menu_state == 'playing' else menu_state
+        self._frame_gc_ms = 0.0
+        self._beat = time.perf_counter()
+    def screen_changed(self, menu_state):
+        if not self.gc_pause:
+            return
+        t = time.perf_counter()
+        gc.collect()
+        self.transition_gc_ms += (time.perf_counter() - t) * 1000
+        self.transition_gcs += 1
+        if menu_state == 'playing':
+            gc.disable()
+        else:
+            gc.enable()
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        gc.enable()
+    def summary(self):
+        lines = [f"{self.frames} frames, worst {self.worst} ms, {len(self.stalls)} stalls >= {self.stall_ms} ms"]
+        edges = (0,) + JANK_BUCKETS
+        hist = []
+        for i, n in enumerate(self.hist):
+            label = f"{edges[i]}-{edges[i+1]}" if i < len(JANK_BUCKETS) else f"{edges[i]}+"
+            hist.append(f"{label}: {n}")
+        lines.append("jank ms  " + "  ".join(hist))
+        if self.stalls_by_screen:
+            lines.append("stalls by screen  " + ", ".join(f"{k} {v}" for k, v in
+                                                       sorted(self.stalls_by_screen.items(), key=lambda kv: -kv[1])))
+        lines.append(f"gc {self.gc_count} collections, {self.gc_ms:.1f} ms total, worst {self.gc_worst:.1f} ms"
+                     + (f"; paused in battle, {self.transition_gcs} transition collections ({self.transition_gc_ms:.1f} ms)"
+                        if self.gc_pause else ""))
+        for ms, screen, gc_ms, stack in sorted(self.stalls, key=lambda st: -st[0])[:5]:
+            where = "no sample"
+            if stack:
+                where = " <- ".join(f"{os.path.basename(f.filename)}:{f.lineno} {f.name}" for f in reversed(stack[-3:]))
+            lines.append(f"  {ms:4d} ms in {screen}" + (f" (gc {gc_ms:.1f} ms)" if gc_ms >= 1 else "") + f": {where}")
+        return "\n".join("[watchdog] " + line for line in lines)
+
+# -------------------------
+# Spectator server (asyncio on a side thread, JSON-lines deltas)
+# -------------------------
+SPECTATE_HOST = "127.0.0.1"
+SPECTATOR_BACKLOG_BYTES = 64 * 1024
+
+def status_bits(status):
+    bits = 0
+    for i, k in enumerate(TRACKED_STATUSES):
+        if status.get(k, 0) > 0:
+            bits |= 1 << i
+    return bits
+
+def battle_snapshot(menu_state, floor, message, player, enemies):
+    snap = {'menu': menu_state, 'floor': floor, 'msg': message, 'n': len(enemies)}
+    if player:
+        snap.update({'p.name': player.name, 'p.cls': player.class_type, 'p.hp': player.hp, 'p.max_hp': player.max_hp,
+                     'p.mp': player.mp, 'p.max_mp': player.max_mp, 'p.rage': player.rage,
+                     'p.st': status_bits(player.status_effects)})
+    for i, e in enumerate(enemies):
+        snap.update({f'e{i}.name': e.name, f'e{i}.hp': e.hp, f'e{i}.max_hp': e.max_hp, f'e{i}.mp': e.mp,
+                     f'e{i}.st': status_bits(e.status_effects)})
+    return snap
+
+class SpectatorServer:
+    # The game thread hands over a snapshot only when it differs from the
+    # last one. The event loop diffs it against the previous snapshot,
+    # encodes the delta once and writes the same bytes to every client.
+    # A client whose send buffer backs up skips deltas and gets a full
+    # snapshot once it has drained.
+    def __init__(self, port, host=SPECTATE_HOST):
+        self.host = host
+        self.port = port
+        self.clients = {}
+        self.state = {}
+        self.sent = 0
+        self.bytes_sent = 0
+        self.resyncs = 0
+        self.peak_clients = 0
+        self._last = None
+        self._ready = threading.Event()
+        self._error = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="spectator", daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._client, self.host, self.port))
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self.loop.run_forever()
+        self.server.close()
+        for writer in list(self.clients):
+            writer.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+    def _encode(self, kind, values):
+        return (json.dumps({'t': kind, 'v': values}, separators=(',', ':')) + "\n").encode()
+    async def _client(self, reader, writer):
+        self.clients[writer] = False
+        self.peak_clients = max(self.peak_clients, len(self.clients))
+        self._send(writer, self._encode('full', self.state))
+        try:
+            while await reader.read(1024):
+                pass
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.clients.pop(writer, None)
+            writer.close()
+    def _send(self, writer, data):
+        self.sent += 1
+        self.bytes_sent += len(data)
+        writer.write(data)
+    def _broadcast(self, snap):
+        delta = {k: v for k, v in snap.items() if self.state.get(k) != v}
+        for k in self.state:
+            if k not in snap:
+                delta[k] = None
+        self.state = snap
+        if not delta or not self.clients:
+            return
+        data = self._encode('delta', delta)
+        full = None
+        for writer, behind in list(self.clients.items()):
+            if writer.transport.is_closing():
+                continue
+            backlog = writer.transport.get_write_buffer_size()
+            if backlog > SPECTATOR_BACKLOG_BYTES:
+                self.clients[writer] = True
+                continue
+            if behind:
+                if full is None:
+                    full = self._encode('full', snap)
+                self._send(writer, full)
+                self.clients[writer] = False
+                self.resyncs += 1
+            else:
+                self._send(writer, data)
+    def publish(self, snap):
+        if snap != self._last:
+            self._last = snap
+            self.loop.call_soon_threadsafe(self._broadcast, snap)
+    def close(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2)
+    def summary(self):
+        return (f"{self.sent} messages ({self.bytes_sent/1024:.0f} KB) to {self.peak_clients} peak clients, "
+                f"{self.resyncs} resyncs after backlog")
+
+# -------------------------
+# Run history (SQLite, WAL, writes batched on a background thread)
+# -------------------------
+HISTORY_FILE = "runs.db"
+LEADERBOARD_PAGE = 10
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    class TEXT NOT NULL,
+    endless INTEGER NOT NULL,
+    started REAL NOT NULL,
+    ended REAL,
+    floors_cleared INTEGER NOT NULL DEFAULT 0,
+    turns INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT NOT NULL DEFAULT 'in_progress',
+    score INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS floors (
+    run_id INTEGER NOT NULL,
+    floor INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    hp_left INTEGER NOT NULL,
+    reward TEXT,
+    PRIMARY KEY (run_id, floor)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_board ON runs (class, score DESC, id DESC) WHERE outcome != 'in_progress';
+CREATE TABLE IF NOT EXISTS floor_stats (
+    floor INTEGER NOT NULL,
+    reward TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    turns_sum INTEGER NOT NULL,
+    PRIMARY KEY (floor, reward)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS floors_stats_insert AFTER INSERT ON floors BEGIN
+    INSERT INTO floor_stats VALUES (NEW.floor, COALESCE(NEW.reward, ''), 1, NEW.turns)
+    ON CONFLICT (floor, reward) DO UPDATE SET runs = runs + 1, turns_sum = turns_sum + excluded.turns_sum;
+END;
+CREATE TRIGGER IF NOT EXISTS floors_stats_reward AFTER UPDATE OF reward ON floors BEGIN
+    UPDATE floor_stats SET runs = runs - 1, turns_sum = turns_sum - OLD.turns
+    WHERE floor = OLD.floor AND reward = COALESCE(OLD.reward, '');
+    INSERT INTO floor_stats VALUES (NEW.floor, COALESCE(NEW.reward, ''), 1, NEW.turns)
+    ON CONFLICT (floor, reward) DO UPDATE SET runs = runs + 1, turns_sum = turns_sum + excluded.turns_sum;
+END;
+"""
+
+def run_score(floors_cleared, turns):
+    # more floors first, then fewer turns
+    return floors_cleared * 100000 - min(turns, 99999)
+
+class RunHistory:
+    # The game thread queues (sql, params) at run and floor boundaries; the
+    # writer applies everything queued so far in one transaction, and if that
+    # fails, one op per transaction so only the failing op is dropped. A new
+    # run's row is the one write made in place: SQLite assigns its id, so
+    # two games sharing the file never hand out the same one.
+    # Leaderboard pages are read on a separate connection (WAL readers do
+    # not wait for the writer) with keyset paging on the runs_board index;
+    # per-floor reward stats come from a trigger-maintained summary table.
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.reader = self._connect()
+        self.reader.executescript(HISTORY_SCHEMA)
+        self.ops = queue.Queue()
+        self.batches = 0
+        self.writes = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="run-history", daemon=True)
+        self.thread.start()
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    def _run(self):
+        conn = self._connect()
+        while True:
+            op = self.ops.get()
+            batch = []
+            while op is not None:
+                batch.append(op)
+                try:
+                    op = self.ops.get(timeout=0.05)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with conn:
+                        for sql, params in batch:
+                            conn.execute(sql, params)
+                    self.writes += len(batch)
+                except sqlite3.Error:
+                    for sql, params in batch:
+                        try:
+                            with conn:
+                                conn.execute(sql, params)
+                            self.writes += 1
+                        except sqlite3.Error as e:
+                            self.dropped += 1
+                            print(f"[history] Write dropped: {e} {params}")
+                self.batches += 1
+            if op is None:
+                conn.close()
+                return
+    def start_run(self, name, class_type, endless):
+        # None if the row could not be written; the run then goes unrecorded
+        try:
+            with self.reader:
+                return self.reader.execute("INSERT INTO runs (name, class, endless, started) VALUES (?, ?, ?, ?)",
+                                           (name, class_type, int(endless), time.time())).lastrowid
+        except sqlite3.Error as e:
+            print(f"[history] Could not start run: {e}")
+            return None
+    def floor_cleared(self, run_id, floor, turns, hp_left):
+        self.ops.put(("INSERT OR IGNORE INTO floors (run_id, floor, turns, hp_left) VALUES (?, ?, ?, ?)",
+                      (run_id, floor, turns, hp_left)))
+    def reward(self, run_id, floor, reward):
+        self.ops.put(("UPDATE floors SET reward = ? WHERE run_id = ? AND floor = ?", (reward, run_id, floor)))
+    def end_run(self, run_id, outcome, floors_cleared, turns):
+        self.ops.put(("UPDATE runs SET ended = ?, outcome = ?, floors_cleared = ?, turns = ?, score = ? WHERE id = ?",
+                      (time.time(), outcome, floors_cleared, turns, run_score(floors_cleared, turns), run_id)))
+    def resume_run(self, run_id):
+        # a resumed autosave reopens the run that quitting marked abandoned
+        self.ops.put(("UPDATE runs SET ended = NULL, outcome = 'in_progress', score = 0 WHERE id = ?", (run_id,)))
+    def leaderboard_page(self, class_type, after=None, limit=LEADERBOARD_PAGE):
+        # after is the (score, id) of the last row on the previous page
+        if after is None:
+            rows = self.reader.execute(
+                "SELECT id, name, floors_cleared, turns, outcome, score FROM runs "
+                "WHERE class = ? AND outcome != 'in_progress' ORDER BY score DESC, id DESC LIMIT ?",
+                (class_type, limit)).fetchall()
+        else:
+            rows = self.reader.execute(
+                "SELECT id, name, floors_cleared, turns, outcome, score FROM runs "
+                "WHERE class = ? AND outcome != 'in_progress' AND (score, id) < (?, ?) "
+                "ORDER BY score DESC, id DESC LIMIT ?",
+                (class_type, after[0], after[1], limit)).fetchall()
+        return rows
+    def floor_stats(self, floor):
+        # (reward, runs, average turns); floor_stats is kept current by triggers
+        return self.reader.execute(
+            "SELECT reward, runs, turns_sum * 1.0 / runs FROM floor_stats WHERE floor = ? AND runs > 0",
+            (floor,)).fetchall()
+    def close(self):
+        self.ops.put(None)
+        self.thread.join()
+        self.reader.close()
+    def summary(self):
+        dropped = f", {self.dropped} dropped" if self.dropped else ""
+        return f"{self.writes} writes in {self.batches} batches{dropped} to {self.path}"
+
+def draw_leaderboard(surface, font, bigfont, class_type, rows, page, tabs, nav):
+    title = bigfont.render("LEADERBOARD", True, WHITE)
+    surface.blit(title, (WIDTH//2 - title.get_width()//2, 40))
+    for c, r in tabs:
+        draw_rounded_rect(surface, (r.x, r.y, r.w, r.h), (60,70,110) if c == class_type else (26,28,32), radius=8,
+                          border=2, border_color=(6,6,8))
+        draw_text_center(surface, c, font, r.center, color=WHITE)
+    small = get_font(18)
+    y = 170
+    for col, x in (("#", 110), ("Name", 160), ("Floors", 470), ("Turns", 580), ("Result", 680)):
+        surface.blit(small.render(col, True, (150,150,160)), (x, y))
+    for i, (_, name, floors, turns, outcome, _) in enumerate(rows):
+        y = 200 + i * 34
+        for text, x in ((str(page * LEADERBOARD_PAGE + i + 1), 110), (name, 160), (str(floors), 470),
+                        (str(turns), 580), (outcome, 680)):
+            surface.blit(small.render(text, True, WHITE), (x, y))
+    if not rows:
+        draw_text_center(surface, "No runs yet.", font, (WIDTH//2, 260), color=(150,150,160))
+    for label, r in nav:
+        draw_rounded_rect(surface, (r.x, r.y, r.w, r.h), (26,28,32), radius=8, border=2, border_color=(6,6,8))
+        draw_text_center(surface, label, font, r.center, color=WHITE)
+    draw_text_center(surface, f"Page {page + 1}   (ESC to return)", small, (WIDTH//2, HEIGHT - 40), color=(150,150,160))
+
+# -------------------------
+# Autosave / resume
+# -------------------------
+SAVE_FILE = "autosave.bin"
+SAVE_MAGIC = b'TRSV'
+SAVE_VERSION = 1
+# magic, version, class index, endless, floor, run id (0 = none), run turns,
+# reward count, name length; then name, reward indices, player, RNG state,
+# and the enemies of a paused battle (count 0 = at the floor entrance)
+SAVE_HEADER = '<4sBBBIIIHB'
+# hp, max hp, mp, max mp, rage, crit chance, dodge chance, status count
+SAVE_CHARACTER = '<iiiiiddB'
+SAVE_STATUSES = TRACKED_STATUSES + ('reflect_pct',)
+SAVE_RNG_WORDS = 625
+
+def _pack_character(c):
+    status = [(i, c.status_effects[k]) for i, k in enumerate(SAVE_STATUSES) if c.status_effects.get(k)]
+    parts = [struct.pack(SAVE_CHARACTER, c.hp, c.max_hp, c.mp, c.max_mp, c.rage, c.crit_chance, c.dodge_chance, len(status))]
+    parts += [struct.pack('<Bd', i, v) for i, v in status]
+    return b''.join(parts)
+
+def _unpack_character(data, off):
+    hp, max_hp, mp, max_mp, rage, crit, dodge, n = struct.unpack_from(SAVE_CHARACTER, data, off)
+    off += struct.calcsize(SAVE_CHARACTER)
+    status = {'poison':0,'stun':0,'vulnerability':0,'invulnerable':0}
+    for _ in range(n):
+        i, v = struct.unpack_from('<Bd', data, off)
+        off += struct.calcsize('<Bd')
+        status[SAVE_STATUSES[i]] = v if SAVE_STATUSES[i] == 'reflect_pct' else int(v)
+    return {'hp': hp, 'max_hp': max_hp, 'mp': mp, 'max_mp': max_mp, 'rage': rage,
+            'crit_chance': crit, 'dodge_chance': dodge, 'status_effects': status}, off
+
+def restore_character(c, saved):
+    for k, v in saved.items():
+        setattr(c, k, dict(v) if k == 'status_effects' else v)
+
+def encode_save(save):
+    name = save['name'].encode('utf-8')[:255]
+    rng_version, words, gauss = save['rng']
+    w_arr = array.array('I', words)
+    if sys.byteorder == 'big':
+        w_arr.byteswap()
+    parts = [struct.pack(SAVE_HEADER, SAVE_MAGIC, SAVE_VERSION, POLICY_CLASSES.index(save['class_type']),
+                         int(save['endless']), save['floor'], save['run_id'] or 0, save['run_turns'],
+                         len(save['rewards']), len(name)),
+             name, bytes(save['rewards']), save['player'],
+             struct.pack('<B?d', rng_version, gauss is not None, gauss or 0.0), w_arr.tobytes(),
+             struct.pack('<BB', len(save['enemies']), save['target'])]
+    parts += save['enemies']
+    return b''.join(parts)
+
+def decode_save(data):
+    magic, version, ci, endless, floor, run_id, run_turns, n_rewards, n_name = struct.unpack_from(SAVE_HEADER, data, 0)
+    if magic != SAVE_MAGIC or version != SAVE_VERSION:
+        raise ValueError(f"not a save file (version {version})")
+    off = struct.calcsize(SAVE_HEADER)
+    name = data[off:off + n_name].decode('utf-8', 'replace')
+    off += n_name
+    rewards = list(data[off:off + n_rewards])
+    off += n_rewards
+    player, off = _unpack_character(data, off)
+    rng_version, has_gauss, gauss = struct.unpack_from('<B?d', data, off)
+    off += struct.calcsize('<B?d')
+    w_arr = array.array('I')
+    w_arr.frombytes(data[off:off + 4 * SAVE_RNG_WORDS])
+    if sys.byteorder == 'big':
+        w_arr.byteswap()
+    off += 4 * SAVE_RNG_WORDS
+    n_enemies, target = struct.unpack_from('<BB', data, off)
+    off += 2
+    enemies = []
+    for _ in range(n_enemies):
+        e, off = _unpack_character(data, off)
+        enemies.append(e)
+    return {'name': name, 'class_type': POLICY_CLASSES[ci], 'endless': bool(endless), 'floor': floor,
+            'run_id': run_id or None, 'run_turns': run_turns, 'rewards': rewards, 'player': player,
+            'rng': (rng_version, tuple(w_arr), gauss if has_gauss else None), 'enemies': enemies, 'target': target}
+
+def prefetch_save(save, max_enemies):
+    # decode the saved floor's images while the menu is up so Resume only
+    # has to convert them
+    p_prefix = 'tanker' if save['class_type'] == 'Tank' else save['class_type'].lower()
+    images = floor_images(save['floor'], len(save['enemies']) or max_enemies)
+    avatars = [(p_prefix, (AVATAR_SIZE, AVATAR_SIZE)), (images[1][0], (AVATAR_SIZE, AVATAR_SIZE))]
+    return prefetch_images(images + [(p_prefix, (SPRITE_W, SPRITE_H))], avatars)
+
+def make_save(name, player, floor, endless, run_id, run_turns, rewards, enemies=(), target=None):
+    # characters are packed right away so later changes to them don't leak
+    # into a save that is still waiting for the writer
+    return {'name': name, 'class_type': player.class_type, 'endless': endless, 'floor': floor,
+            'run_id': run_id, 'run_turns': run_turns, 'rewards': list(rewards),
+            'player': _pack_character(player), 'rng': random.getstate(),
+            'enemies': [_pack_character(e) for e in enemies],
+            'target': enemies.index(target) if enemies and target in enemies else 0}
+
+class Autosaver:
+    # The game thread only encodes (a few KB) and hands the bytes over. The
+    # writer keeps just the newest pending save, writes it to a temp file and
+    # renames it over the old one, so a crash mid-write keeps the last save.
+    def __init__(self, path=SAVE_FILE):
+        self.path = path
+        self.cond = threading.Condition()
+        self.pending = None
+        self.closed = False
+        self.current = None
+        self.saves = 0
+        self.writes = 0
+        self.superseded = 0
+        self.encode_ms = 0.0
+        self.write_ms = 0.0
+        self.thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self.thread.start()
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                self.current = decode_save(f.read())
+            return self.current
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error, IndexError) as e:
+            print(f"[save] Ignoring {self.path}: {e}")
+            return None
+    def _submit(self, data):
+        with self.cond:
+            if self.pending is not None:
+                self.superseded += 1
+            self.pending = data
+            self.cond.notify()
+    def save(self, save):
+        t0 = time.perf_counter()
+        data = encode_save(save)
+        self.encode_ms += (time.perf_counter() - t0) * 1000
+        self.saves += 1
+        self.current = decode_save(data)
+        self._submit(data)
+    def discard(self):
+        self.current = None
+        self._submit(b'')
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.pending is None and not self.closed:
+                    self.cond.wait()
+                data, self.pending = self.pending, None
+            if data is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                if data:
+                    tmp = self.path + ".tmp"
+                    with open(tmp, 'wb') as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp, self.path)
+                elif os.path.exists(self.path):
+                    os.remove(self.path)
+                self.writes += 1
+            except OSError as e:
+                print(f"[save] Write failed: {e}")
+            self.write_ms += (time.perf_counter() - t0) * 1000
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+    def summary(self):
+        return (f"{self.saves} saves ({self.encode_ms / max(1, self.saves):.3f} ms to encode on the game thread), "
+                f"{self.writes} writes ({self.write_ms / max(1, self.writes):.1f} ms each in the background), "
+                f"{self.superseded} superseded")
+
+# -------------------------
+# Input recording / replay
+# -------------------------
+RECORDING_VERSION = 1
+# options that change what a replay does; everything else is taken from the
+# replay's own command line
+RECORDED_OPTIONS = ('enemy_ai', 'ai_budget_ms', 'endless', 'max_enemies', 'policy', 'window_size', 'battle_speed')
+
+def event_to_record(event):
+    if event.type == pygame.KEYDOWN:
+        return {'type': 'KEYDOWN', 'key': event.key, 'unicode': event.unicode, 'mod': event.mod}
+    if event.type == pygame.MOUSEBUTTONDOWN:
+        return {'type': 'MOUSEBUTTONDOWN', 'pos': list(event.pos), 'button': event.button}
+    if event.type == pygame.VIDEORESIZE:
+        return {'type': 'VIDEORESIZE', 'size': list(event.size)}
+    if event.type == pygame.QUIT:
+        return {'type': 'QUIT'}
+    return None
+
+def record_to_event(rec):
+    kind = rec['type']
+    if kind == 'KEYDOWN':
+        return pygame.event.Event(pygame.KEYDOWN, key=rec['key'], unicode=rec['unicode'], mod=rec['mod'], scancode=0)
+    if kind == 'MOUSEBUTTONDOWN':
+        return pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=tuple(rec['pos']), button=rec['button'])
+    if kind == 'VIDEORESIZE':
+        w, h = rec['size']
+        return pygame.event.Event(pygame.VIDEORESIZE, size=(w, h), w=w, h=h)
+    return pygame.event.Event(pygame.QUIT)
+
+class InputRecorder:
+    # One JSON line per frame: the frame's dt and the input events main()
+    # handles. Header holds the RNG seed and the options, the last line the
+    # final state a replay has to reach.
+    def __init__(self, path, seed, opts):
+        self.path = path
+        self.frames = 0
+        self._file = open(path, "w", encoding="utf-8")
+        options = {k: getattr(opts, k) for k in RECORDED_OPTIONS}
+        self._write({'version': RECORDING_VERSION, 'seed': seed, 'options': options})
+    def _write(self, rec):
+        self._file.write(json.dumps(rec, separators=(',', ':')) + "\n")
+    def frame(self, dt, events):
+        self.frames += 1
+        rec = {'dt': dt}
+        evs = [r for r in map(event_to_record, events) if r is not None]
+        if evs:
+            rec['ev'] = evs
+        self._write(rec)
+    def close(self, final):
+        self._write({'final': final})
+        self._file.close()
+        print(f"[record] Wrote {self.frames} frames to {self.path}")
+
+class InputReplay:
+    def __init__(self, path):
+        self.path = path
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get('version') != RECORDING_VERSION:
+                raise ValueError(f"{path}: unsupported recording version {header.get('version')}")
+            self.seed = header['seed']
+            self.options = header['options']
+            self.frames = []
+            self.final = None
+            for line in f:
+                rec = json.loads(line)
+                if 'final' in rec:
+                    self.final = rec['final']
+                else:
+                    self.frames.append((rec['dt'], rec.get('ev', ())))
+        self.pos = 0
+        self.t0 = time.perf_counter()
+    def apply_options(self, opts):
+        for k, v in self.options.items():
+            setattr(opts, k, tuple(v) if k == 'window_size' else v)
+        if opts.enemy_ai != 'classic':
+            print("[replay] Warning: search AI depends on thread timing, replay may diverge")
+    def next_frame(self):
+        # (dt, events), or None once the recording is used up
+        if self.pos >= len(self.frames):
+            return None
+        dt, recs = self.frames[self.pos]
+        self.pos += 1
+        return dt, [record_to_event(r) for r in recs]
+    def check(self, final):
+        elapsed = time.perf_counter() - self.t0
+        ok = self.final is None or self.final == final
+        print(f"[replay] {os.path.basename(self.path)}: {self.pos} frames in {elapsed:.2f} s "
+              f"({self.pos / max(elapsed, 1e-9):.0f} fps, {self.pos / FPS / max(elapsed, 1e-9):.1f}x real time), "
+              f"final state {'OK' if ok else 'MISMATCH'}")
+        if not ok:
+            for k in sorted(set(self.final) | set(final)):
+                if self.final.get(k) != final.get(k):
+                    print(f"[replay]   {k}: recorded {self.final.get(k)!r}, replayed {final.get(k)!r}")
+        return ok
+
+# -------------------------
+# Startup pipeline (deferred loading between frames)
+# -------------------------
+STARTUP_BUDGET_MS = 6
+# screens that only need fonts; anything else drains the pipeline first
+STARTUP_SCREENS = ('menu', 'enter_name', 'choose_class', 'leaderboard', 'guide')
+
+class StartupPipeline:
+    # Startup work the first menu frame does not need. Each step is a
+    # generator resumed on the main thread after a frame is presented, until
+    # that frame's budget is spent. A step that yields a thread (image
+    # decoding runs on the prefetch thread) pauses the pipeline until the
+    # thread is done. finish() drains everything when a screen needs it. Times are
+    # seconds since STARTUP_T0; ready_at is the time-to-interactive.
+    def __init__(self, budget_ms=STARTUP_BUDGET_MS, report=False):
+        self.budget_ns = int(budget_ms * 1e6)
+        self.report = report
+        self.steps = deque()
+        self.waiting = {}
+        self.step_ms = {}
+        self.done_at = {}
+        self.marks = {}
+        self.first_frame_at = None
+        self.ready_at = None
+        self.frames = 0
+        self.worst_frame_ms = 0
+        self.forced_by = None
+    @property
+    def pending(self):
+        return bool(self.steps)
+    def mark(self, name):
+        self.marks[name] = time.perf_counter() - STARTUP_T0
+    def add(self, name, steps):
+        self.steps.append((name, steps))
+        self.step_ms[name] = 0.0
+    def run(self, limit=True):
+        start = time.perf_counter_ns()
+        if limit and any(t is not None and t.is_alive() for t in self.waiting.values()):
+            # a step on the main thread would contend with the decode thread
+            # for the GIL and stretch this frame well past the budget
+            return
+        while self.steps:
+            name, gen = self.steps[0]
+            wait = self.waiting.get(name)
+            if wait is not None and wait.is_alive():
+                if limit:
+                    break
+                wait.join()
+            # main-thread CPU time: on a busy machine wall time would also
+            # count the decode thread's share
+            t0 = time.thread_time_ns()
+            try:
+                token = next(gen)
+            except StopIteration:
+                self.steps.popleft()
+                self.done_at[name] = time.perf_counter() - STARTUP_T0
+            else:
+                self.waiting[name] = token if isinstance(token, threading.Thread) else None
+            self.step_ms[name] += (time.thread_time_ns() - t0) / 1e6
+            if limit and time.perf_counter_ns() - start >= self.budget_ns:
+                break
+        if not self.steps and self.ready_at is None:
+            self.ready_at = time.perf_counter() - STARTUP_T0
+            if self.report:
+                self.print_report()
+    def finish(self, screen):
+        if self.steps:
+            self.forced_by = screen
+            self.run(limit=False)
+    def frame(self, frame_ms):
+        # after each presented frame until the pipeline has drained
+        if self.first_frame_at is None:
+            self.first_frame_at = time.perf_counter() - STARTUP_T0
+        else:
+            self.worst_frame_ms = max(self.worst_frame_ms, frame_ms)
+        self.frames += 1
+        self.run()
+    def print_report(self):
+        marks = ", ".join(f"{k} at {v * 1000:.0f} ms" for k, v in self.marks.items())
+        print(f"[startup] {marks}; first frame at {self.first_frame_at * 1000:.0f} ms")
+        if self.ready_at is None:
+            print(f"[startup] not interactive yet: {', '.join(name for name, _ in self.steps)} still pending")
+            return
+        forced = f", drained early for {self.forced_by}" if self.forced_by else ""
+        print(f"[startup] interactive at {self.ready_at * 1000:.0f} ms: deferred loading ran over {self.frames} frames, "
+              f"worst frame {self.worst_frame_ms} ms{forced}")
+        for name, ms in self.step_ms.items():
+            print(f"[startup]   {name:8} {ms:6.1f} ms main-thread CPU, done at {self.done_at[name] * 1000:.0f} ms")
+
+# -------------------------
+# Command line
+# -------------------------
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Tower Run")
+    ap.add_argument("--enemy-ai", choices=("classic", "mcts"), default="classic",
+                    help="enemy decision mode: the built-in random rules or a time-budgeted MCTS search")
+    ap.add_argument("--ai-budget-ms", type=int, default=AI_BUDGET_MS,
+                    help="per-turn search budget for --enemy-ai mcts")
+    ap.add_argument("--battle-speed", choices=BATTLE_SPEEDS, default='1x',
+                    help="battle animation speed (T or the speed button cycles it); instant resolves a whole turn "
+                         "in one frame. Combat outcomes for a seed do not depend on it")
+    ap.add_argument("--endless", action="store_true",
+                    help="keep climbing past floor 8 with scaled enemies instead of ending the run")
+    ap.add_argument("--surface-cap-mb", type=int, default=SURFACE_CAP_MB,
+                    help="memory cap for cached image surfaces (least recently used ones are evicted)")
+    ap.add_argument("--max-enemies", type=int, default=1, choices=range(1, MAX_ENEMIES + 1),
+                    help="largest encounter size; groups grow by one enemy every two floors up to this")
+    ap.add_argument("--policy", default=POLICY_FILE,
+                    help="policy table written by policy_solver.py, used by the Hint button")
+    ap.add_argument("--window-size", type=parse_window_size, default=(WIDTH, HEIGHT), metavar="WxH",
+                    help=f"initial window size; the game renders at {WIDTH}x{HEIGHT} and scales to the window")
+    ap.add_argument("--scale-filter", choices=("smooth", "fast"), default="smooth",
+                    help="filter for the window scale blit")
+    ap.add_argument("--event-log", metavar="DIR",
+                    help="write structured battle events as rotating JSONL files into DIR")
+    ap.add_argument("--history", default=HISTORY_FILE, metavar="FILE",
+                    help="SQLite file for run history and the leaderboard ('' disables it; replays never write)")
+    ap.add_argument("--save", default=SAVE_FILE, metavar="FILE",
+                    help="autosave file written at floor boundaries and on pause ('' disables it; recordings and replays never save)")
+    ap.add_argument("--no-audio", action="store_true",
+                    help="skip mixer setup and sound loading")
+    ap.add_argument("--spectate", type=int, metavar="PORT",
+                    help=f"serve live battle state to spectator_client.py on {SPECTATE_HOST}:PORT (0 picks a free port)")
+    ap.add_argument("--no-win-hud", action="store_true",
+                    help="hide the win chance estimate in the battle panel and skip its background rollouts")
+    ap.add_argument("--no-post-effects", action="store_true",
+                    help="skip the damage flash, low HP vignette, status tints and the desaturated defeat screen")
+    ap.add_argument("--watchdog", action="store_true",
+                    help="detect frames over --stall-ms, sample the main thread's stack and print a jank summary on exit")
+    ap.add_argument("--stall-ms", type=int, default=STALL_MS,
+                    help="frame duration that counts as a stall")
+    ap.add_argument("--gc-pause-in-battle", action="store_true",
+                    help="disable cyclic GC during battle and collect on screen transitions instead")
+    ap.add_argument("--alloc-probe", action="store_true",
+                    help="count new surfaces per frame by calling function, show the top allocators on screen "
+                         "and diff tracemalloc snapshots between screens")
+    ap.add_argument("--capture", metavar="DIR",
+                    help="record every rendered frame into DIR from a background process; frames are dropped, "
+                         "not waited for, when the writer falls behind")
+    ap.add_argument("--capture-encoder", choices=CAPTURE_ENCODERS, default="auto",
+                    help="png writes a frame sequence, ffmpeg pipes raw frames into DIR/capture.mp4; "
+                         "auto uses ffmpeg when it is on PATH")
+    ap.add_argument("--startup-report", action="store_true",
+                    help="print time to first frame and time to interactive (deferred loading finished), "
+                         "with the main-thread cost of each loading step")
+    ap.add_argument("--seed", type=int,
+                    help="seed for the game RNG (random when omitted; always stored in recordings)")
+    ap.add_argument("--record", metavar="FILE",
+                    help="record input events, frame times and the RNG seed to FILE")
+    ap.add_argument("--replay", metavar="FILE",
+                    help="replay a recording as fast as possible and check the final state")
+    return ap.parse_args(argv)
+
 # -------------------------
 # Main loop
 # -------------------------
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+def main(opts=None):
+    if opts is None:
+        opts = parse_args([])
+    replay = InputReplay(opts.replay) if opts.replay else None
+    if replay:
+        replay.apply_options(opts)
+        seed = replay.seed
+    else:
+        seed = opts.seed if opts.seed is not None else random.randrange(2**32)
+    random.seed(seed)
+    recorder = InputRecorder(opts.record, seed, opts) if opts.record else None
+    if opts.alloc_probe:
+        ALLOCS.install()
+    startup = StartupPipeline(report=opts.startup_report)
+    startup.mark("main")
+    # only what the menu needs; the mixer and images come from the startup
+    # pipeline after the first frame
+    pygame.display.init()
+    pygame.font.init()
+    viewport = Viewport(opts.window_size, smooth=opts.scale_filter == "smooth")
+    screen = viewport.canvas
+    post = PostEffects(screen)
+    if opts.no_post_effects:
+        post.enabled = False
     clock = pygame.time.Clock()
     pygame.display.set_caption("Modern Combat UI - Balanced (v3)")
     font = get_font(20)
     bigfont = get_font(34)
     damage_font = get_font(28)
-    generic_player_img = try_load_image_fuzzy("player", (SPRITE_W, SPRITE_H))
-    generic_enemy_img = try_load_image_fuzzy("enemy", (SPRITE_W, SPRITE_H))
-    MAP_IMG = try_load_image_fuzzy("map", (WIDTH, HEIGHT))
+    startup.mark("display and fonts")
+    generic_player_img = generic_enemy_img = MAP_IMG = None
+    SURFACES.cap_bytes = opts.surface_cap_mb * 1024 * 1024
+    for key in (image_key("player", (SPRITE_W, SPRITE_H)), image_key("enemy", (SPRITE_W, SPRITE_H)), image_key("map", (WIDTH, HEIGHT))):
+        SURFACES.pin(key)
+    player_img_key = None
     map_entry_rect = pygame.Rect(WIDTH//2 - 80, HEIGHT//2 + 100, 160, 60)
     start_btn = pygame.Rect(WIDTH//2-80, HEIGHT//2-40, 160, 48)
     quit_btn = pygame.Rect(WIDTH//2-80, HEIGHT//2+20, 160, 48)
     guide_btn = pygame.Rect(WIDTH//2-80, HEIGHT//2+80, 160, 48)
+    board_btn = pygame.Rect(WIDTH//2-80, HEIGHT//2+140, 160, 48)
+    resume_btn = pygame.Rect(WIDTH//2+100, HEIGHT//2-40, 160, 48)
+    board_tabs = [(c, pygame.Rect(WIDTH//2 - 370 + i * 190, 100, 170, 44)) for i, c in enumerate(('Warrior','Mage','Tank','Archer'))]
+    board_nav = [("Prev", pygame.Rect(WIDTH//2 - 180, HEIGHT - 110, 160, 44)), ("Next", pygame.Rect(WIDTH//2 + 20, HEIGHT - 110, 160, 44))]
+    board_class = 'Warrior'
+    board_cursors = [None]
+    board_rows = []
     name_box = pygame.Rect(WIDTH//2-200, HEIGHT//2-20, 400, 40)
     pause_btn_rect = pygame.Rect(WIDTH - 80 - 10, 10, 80, 30)
+    hint_btn_rect = pygame.Rect(WIDTH - 2*80 - 20, 10, 80, 30)
+    speed_btn_rect = pygame.Rect(WIDTH - 3*80 - 30, 10, 80, 30)
+    battle_speed = opts.battle_speed
+    policy = load_policy_table(opts.policy)
     modal_pause_continue = pygame.Rect(WIDTH//2 - 180, HEIGHT//2 + 40, 160, 48)
     modal_pause_quit = pygame.Rect(WIDTH//2 + 20, HEIGHT//2 + 40, 160, 48)
     menu_state = 'menu'
@@ -587,11 +3688,7 @@ def main():
     player = None
     enemy = None
     selected_class = None
-    reward_options = [
-        ('Max HP +15', (28,200,40)),
-        ('Max MP +10', (64,150,255)),
-        ('+5% Crit Chance', (243,156,18))
-    ]
+    reward_options = list(zip(reward_labels(), ((28,200,40), (64,150,255), (243,156,18))))
     reward_rects = []
     for i, (text, color) in enumerate(reward_options):
         r = pygame.Rect(WIDTH//2 - 240 + i*180, HEIGHT//2 + 40, 160, 48)
@@ -600,6 +3697,7 @@ def main():
     player_defending = False
     anim_duration = 600
     floor = 1
+    last_floor = None if opts.endless else TOWER_FLOORS
     message = "Use mouse or keys to play."
     modal_continue = pygame.Rect(WIDTH//2 - 180, HEIGHT//2 + 40, 160, 48)
     modal_exit = pygame.Rect(WIDTH//2 + 20, HEIGHT//2 + 40, 160, 48)
@@ -608,6 +3706,102 @@ def main():
     # BIẾN TOÀN CỤC CHO PENDING ACTIONS
     pending_action = None
     pending_enemy_action = None
+    enemy_ai = EnemyAIWorker(opts.ai_budget_ms) if opts.enemy_ai == 'mcts' else None
+    win_estimator = None if opts.no_win_hud else WinEstimator()
+    spectator = None
+    if opts.spectate is not None:
+        spectator = SpectatorServer(opts.spectate)
+        print(f"[spectate] Listening on {spectator.host}:{spectator.port}")
+
+    enemies = []
+    enemy_queue = None
+    history = None
+    if opts.history and not opts.replay:
+        history = RunHistory(opts.history)
+    run_id = None
+    run_turns = 0
+    floor_start_turns = 0
+    run_rewards = []
+    autosaver = None
+    prefetch = None
+    if opts.save and not (opts.replay or opts.record):
+        autosaver = Autosaver(opts.save)
+        if autosaver.load():
+            prefetch = prefetch_save(autosaver.current, opts.max_enemies)
+    actor = None
+    stage = None
+
+    def load_images():
+        nonlocal generic_player_img, generic_enemy_img, MAP_IMG
+        sprite = (SPRITE_W, SPRITE_H)
+        classes = [('tanker' if c == 'Tank' else c.lower()) for c in CLASS_STATS]
+        yield prefetch_images([("player", sprite), ("enemy", sprite), ("map", (WIDTH, HEIGHT))]
+                              + [(c, sprite) for c in classes] + floor_images(1, opts.max_enemies),
+                              [(c, (AVATAR_SIZE, AVATAR_SIZE)) for c in classes])
+        generic_player_img = try_load_image_fuzzy("player", sprite)
+        generic_enemy_img = try_load_image_fuzzy("enemy", sprite)
+        yield
+        MAP_IMG = try_load_image_fuzzy("map", (WIDTH, HEIGHT))
+        for c in classes:
+            yield
+            try_load_image_fuzzy(c, sprite)
+            try_load_avatar_by_prefix(c, (AVATAR_SIZE, AVATAR_SIZE))
+
+    def load_audio():
+        try:
+            pygame.mixer.init(AUDIO_RATE, -16, 2, AUDIO_BUFFER)
+        except pygame.error as e:
+            print(f"[audio] Mixer unavailable ({e}), sound disabled")
+            return
+        yield
+        yield from AUDIO.load_steps()
+
+    startup.add("images", load_images())
+    if not opts.no_audio:
+        startup.add("audio", load_audio())
+
+    def make_player(class_type, name):
+        nonlocal player_img_key
+        p_hp, p_mp, p_crit, p_dodge = CLASS_STATS.get(class_type, CLASS_STATS['Tank'])
+        p_prefix = class_type.lower()
+        if p_prefix == 'tank':
+            p_prefix = 'tanker'
+        if player_img_key is not None:
+            SURFACES.unpin(player_img_key)
+        player_img_key = image_key(p_prefix, (SPRITE_W, SPRITE_H))
+        SURFACES.pin(player_img_key)
+        player_img = try_load_image_fuzzy(p_prefix, (SPRITE_W, SPRITE_H)) or generic_player_img
+        p = Character(name, GREEN, (0,0), image_surface=player_img, prefix=p_prefix)
+        p.max_hp = p.hp = p_hp
+        p.max_mp = p.mp = p_mp
+        p.class_type = class_type
+        p.crit_chance = p_crit
+        p.dodge_chance = p_dodge
+        return p
+
+    def autosave(battle=False):
+        # battle state is only saved between turns; mid-animation the saved
+        # floor entrance stays the resume point. A reflect kill can end the
+        # fight on the enemy's turn before battle_step marks the floor
+        # cleared; that all-dead encounter is not worth saving either.
+        if battle and not any(e.is_alive() for e in enemies):
+            return
+        autosaver.save(make_save(input_name or player.name, player, floor, last_floor is None, run_id, run_turns,
+                                 run_rewards, enemies if battle else (), enemy))
+
+    def end_enemy_action():
+        # next enemy in the queue acts, or the round goes back to the player
+        # and every living enemy's statuses tick once
+        nonlocal enemy_queue, player_defending, run_turns
+        if enemy_queue:
+            return 'enemy_turn'
+        enemy_queue = None
+        player_defending = False
+        run_turns += 1
+        for e in enemies:
+            if e.is_alive():
+                e.apply_turn_start_effects(player, e, add_floating_text)
+        return 'player_turn'
 
     def add_floating_text(target_char, value, color, is_damage, size=22):
         if target_char.pos[0] <= WIDTH//2:
@@ -617,20 +3811,329 @@ def main():
         text_value = str(value) if is_damage else "+" + str(value)
         floating_texts.append(FloatingText(x, y, text_value, color, size=size))
 
+    def resolve_player_action():
+        # completion callback of the player's attack animation
+        nonlocal state, pending_action, enemy, menu_state, message
+        if pending_action is None:
+            state = 'enemy_turn'
+            return
+        action, dmg = pending_action
+        pending_action = None
+        if action == 'attack':
+            is_crit = random.random() < player.crit_chance
+            is_miss = random.random() < enemy.dodge_chance
+            gain = 0
+            if is_miss:
+                final_dmg = 0
+                add_floating_text(enemy, "DODGED", (255,255,255), True, size=30)
+                AUDIO.play('dodge')
+                message = f"You missed! Enemy turn."
+            else:
+                final_dmg = dmg
+                if is_crit:
+                    final_dmg = int(dmg * 1.5)
+                    add_floating_text(enemy, "CRIT! " + str(final_dmg), (255,180,0), True, size=36)
+                else:
+                    add_floating_text(enemy, final_dmg, (255,20,20), True)
+                enemy.hp = max(0, enemy.hp - final_dmg)
+                enemy.play_hurt(duration=500)
+                PARTICLES.emit('hit', enemy.pos[0], enemy.pos[1])
+                AUDIO.play('crit' if is_crit else 'hit')
+                message = f"Dealt {final_dmg} damage. Enemy turn."
+                gain = max(1, int(final_dmg * 0.10))
+                player.rage = min(player.max_rage, player.rage + gain)
+            EVENTS.emit('attack', actor=player.name, target=enemy.name, roll=dmg, crit=is_crit and not is_miss,
+                        dodged=is_miss, damage=final_dmg, rage_gain=gain, target_hp=enemy.hp)
+            if enemy.hp <= 0 and any(e.is_alive() for e in enemies):
+                enemy = next(e for e in enemies if e.is_alive())
+            elif enemy.hp <= 0:
+                if last_floor is not None and floor >= last_floor:
+                    menu_state = 'run_complete'
+                    message = "You cleared the tower! Continue or Exit."
+                else:
+                    menu_state = 'floor_cleared'
+                    message = f"You cleared floor {floor}! Choose reward!"
+                return
+        state = 'enemy_turn'
+
+    def resolve_enemy_action():
+        # completion callback of an enemy's attack animation
+        nonlocal state, pending_enemy_action, enemy_queue, floating_texts, menu_state, message
+        if pending_enemy_action is None:
+            state = end_enemy_action()
+            return
+        action = pending_enemy_action[0]
+        dmg = pending_enemy_action[1]
+        status_effect = pending_enemy_action[2] if len(pending_enemy_action) > 2 else None
+        pending_enemy_action = None
+        if action == 'attack':
+            final = dmg
+            is_dodge = random.random() < player.dodge_chance
+            if is_dodge:
+                final = 0
+                add_floating_text(player, "DODGE", (255,255,255), True, size=30)
+                AUDIO.play('dodge')
+                EVENTS.emit('enemy_hit', actor=actor.name, roll=dmg, dodged=True, damage=0, status=None)
+                message = f"{actor.name} missed!"
+            else:
+                if player_defending == True:
+                    final = int(dmg * player.defend_damage_reduction)
+                elif player.status_effects.get('invulnerable',0) > 0:
+                    reflect = player.status_effects.get('reflect_pct', 0)
+                    if reflect > 0:
+                        refd = int(final * reflect)
+                        actor.hp = max(0, actor.hp - refd)
+                        add_floating_text(actor, refd, (255,160,80), True)
+                        EVENTS.emit('reflect', actor=player.name, target=actor.name, damage=refd, target_hp=actor.hp)
+                    final = 0
+                    message = "Your shield reflected damage!"
+                if player.status_effects.get('iron_skin',0) > 0:
+                    player.status_effects['iron_skin'] = max(0, player.status_effects.get('iron_skin',0)-1)
+                    final = 0
+                    add_floating_text(player, "BLOCKED", (180,180,255), False, size=18)
+                    AUDIO.play('shield')
+                EVENTS.emit('enemy_hit', actor=actor.name, roll=dmg, dodged=False, defended=player_defending,
+                            damage=final, status=status_effect, player_hp=max(0, player.hp - final))
+                if final > 0:
+                    player.play_hurt(duration=480)
+                    post.hit(final, player.max_hp)
+                    player.hp = max(0, player.hp - final)
+                    PARTICLES.emit('hit', player.pos[0], player.pos[1])
+                    AUDIO.play('hurt')
+                    add_floating_text(player, final, (255,80,80), True)
+                    mp_recover = 5
+                    player.mp = min(player.max_mp, player.mp + mp_recover)
+                    add_floating_text(player, mp_recover, (64,150,255), False)
+                    if player.hp <= 0:
+                        menu_state = 'defeat'
+                        message = "You were defeated! Retry or Exit?"
+                        floating_texts = []
+                        state = 'player_turn'
+                        enemy_queue = None
+                        return
+                if status_effect:
+                    if status_effect == 'poison':
+                        player.status_effects['poison'] = max(player.status_effects.get('poison',0), 2)
+                    elif status_effect == 'stun':
+                        player.status_effects['stun'] = max(player.status_effects.get('stun',0), 1)
+                    elif status_effect == 'vulnerability':
+                        player.status_effects['vulnerability'] = max(player.status_effects.get('vulnerability',0), 2)
+                message = f"{actor.name} dealt {final} damage."
+        state = end_enemy_action()
+
+    def battle_step():
+        # one pass of the battle state machine; True when the frame is not drawn
+        nonlocal player_defending, menu_state, message, enemy, enemy_queue, floating_texts, actor, state, pending_enemy_action
+        if state == 'player_turn':
+            player_defending = False
+            if not any(e.is_alive() for e in enemies):
+                # the round's status ticks finished the last of them
+                if last_floor is not None and floor >= last_floor:
+                    menu_state = 'run_complete'
+                    message = "You cleared the tower! Continue or Exit."
+                else:
+                    menu_state = 'floor_cleared'
+                    message = f"Enemy was defeated by DOT! You cleared floor {floor}!"
+                return True
+            if not enemy.is_alive():
+                enemy = next(e for e in enemies if e.is_alive())
+            if enemy.is_stunned():
+                message = f"{enemy.name} is stunned! Enemy skips turn."
+        if state in ('enemy_turn', 'enemy_think'):
+            enemy_move = None
+            if state == 'enemy_think':
+                enemy_move = enemy_ai.poll()
+            else:
+                if enemy_queue is None:
+                    if not any(e.is_alive() for e in enemies):
+                        if last_floor is not None and floor >= last_floor:
+                            menu_state = 'run_complete'
+                            message = "You cleared the tower! Continue or Exit."
+                        else:
+                            menu_state = 'floor_cleared'
+                            message = f"You cleared floor {floor}! Choose reward!"
+                        return True
+                    if not enemy.is_alive():
+                        enemy = next(e for e in enemies if e.is_alive())
+                    result = player.apply_turn_start_effects(player, enemy, add_floating_text)
+                    if result == 'dead_by_dot':
+                        menu_state = 'defeat'
+                        message = "You were defeated by DOT. Retry or Exit?"
+                        floating_texts = []
+                        return True
+                    enemy_queue = [e for e in enemies if e.is_alive()]
+                actor = enemy_queue.pop(0)
+                if actor.is_stunned():
+                    message = f"{actor.name} is stunned! Enemy skips turn."
+                    state = end_enemy_action()
+                    return True
+                if enemy_ai is not None:
+                    enemy_ai.submit(BattleSim.from_characters(player, actor, player_defending), actor.name)
+                    state = 'enemy_think'
+                    message = f"{actor.name} is thinking..."
+                    return True
+                # WEAKENED ENEMY AI
+                enemy_move = roll_enemy_move(actor.prefix, actor.mp)
+            if enemy_move is not None:
+                EVENTS.emit('enemy_move', actor=actor.name, move=enemy_move, planner=opts.enemy_ai)
+            if enemy_move == 'special':
+                cost, _, (lo, hi), status, status_chance, special_msg = ENEMY_SPECIALS[actor.prefix]
+                actor.mp -= cost
+                dmg = random.randint(lo, hi)
+                if status_chance is not None:
+                    status = status if random.random() < status_chance else None
+                actor.play_attack(duration=anim_duration, on_done=resolve_enemy_action)
+                state = 'enemy_anim'
+                pending_enemy_action = ('attack', dmg, status)
+                message = special_msg
+                return True
+            elif enemy_move is not None:
+                dmg_mult = 1.0
+                if player.status_effects.get('vulnerability',0) > 0:
+                    dmg_mult = 1.2
+                if enemy_move == 'attack':
+                    dmg = int(random.randint(6,13) * dmg_mult)
+                    actor.play_attack(duration=anim_duration, on_done=resolve_enemy_action)
+                    state = 'enemy_anim'
+                    pending_enemy_action = ('attack', dmg)
+                    message = "Enemy attacks..."
+                else:
+                    heal = random.randint(6,10)
+                    actor.hp = min(actor.max_hp, actor.hp + heal)
+                    add_floating_text(actor, heal, (46,204,113), False)
+                    EVENTS.emit('heal', target=actor.name, amount=heal, hp=actor.hp)
+                    AUDIO.play('heal')
+                    message = f"Enemy healed {heal} HP."
+                    state = end_enemy_action()
+        return False
+
+    def speed_scale():
+        return BATTLE_SPEED_SCALE.get(battle_speed, 1) if menu_state == 'playing' else 1
+
+    def resolve_turn_instantly():
+        # instant speed: attack animations end as soon as they start and the
+        # state machine keeps stepping until the player can act again. Each
+        # pass is what one frame would do at 1x, so the RNG sees the same calls
+        nonlocal message
+        fighters = [player] + enemies
+        hp = [c.hp for c in fighters]
+        skip = False
+        while True:
+            for c in fighters:
+                if c.tween:
+                    TIMELINE.complete(c.tween)
+            skip = battle_step()
+            if menu_state != 'playing' or state in ('player_turn', 'enemy_think'):
+                break
+            # what the start of the next frame would record
+            EVENTS.track_statuses(fighters)
+            if state in ('player_anim', 'enemy_anim') and not any(c.tween for c in fighters):
+                break
+        if menu_state == 'playing' and state == 'player_turn':
+            dealt = sum(max(0, before - c.hp) for before, c in zip(hp[1:], enemies))
+            taken = max(0, hp[0] - player.hp)
+            message = f"Turn over: dealt {dealt}, took {taken}. Your turn."
+        return skip
+
+    if opts.event_log:
+        EVENTS.start(opts.event_log)
+    frame_ms_total = 0
+    frame_index = 0
+    watchdog = None
+    if opts.watchdog or opts.gc_pause_in_battle:
+        watchdog = FrameWatchdog(opts.stall_ms, sample=opts.watchdog, gc_pause=opts.gc_pause_in_battle)
+    capture = None
+    if opts.capture:
+        try:
+            capture = FrameCapture(opts.capture, screen, opts.capture_encoder)
+        except (OSError, ValueError) as e:
+            print(f"[capture] disabled: {e}")
+    last_menu_state = menu_state
     running = True
     while running:
-        dt = clock.tick(FPS)
+        if replay:
+            # no frame cap: the recorded dt drives animation timers instead
+            frame_ms = clock.tick()
+            # keep the window responsive and closable; live input is dropped,
+            # only the recorded events reach the game
+            if pygame.event.get(pygame.QUIT):
+                print("[replay] Window closed, stopping replay.")
+                break
+            pygame.event.clear()
+            step = replay.next_frame()
+            if step is None:
+                break
+            dt, frame_events = step
+        else:
+            dt = frame_ms = clock.tick(FPS)
+            frame_events = pygame.event.get()
+        if recorder:
+            recorder.frame(dt, frame_events)
+        SURFACES.begin_frame()
+        ALLOCS.begin_frame()
+        frame_ms_total += dt
+        frame_index += 1
+        EVENTS.frame = frame_index
+        if watchdog:
+            watchdog.frame(frame_ms, menu_state, state)
+        if menu_state != last_menu_state:
+            if watchdog:
+                watchdog.screen_changed(menu_state)
+            ALLOCS.screen_changed(last_menu_state, menu_state)
+            if menu_state not in STARTUP_SCREENS:
+                startup.finish(menu_state)
+            if history:
+                if menu_state in ('floor_cleared', 'run_complete') and run_id is not None and player:
+                    history.floor_cleared(run_id, floor, run_turns - floor_start_turns, player.hp)
+                if menu_state in ('run_complete', 'defeat') and run_id is not None:
+                    history.end_run(run_id, 'cleared' if menu_state == 'run_complete' else 'defeat',
+                                    floor if menu_state == 'run_complete' else floor - 1, run_turns)
+                    run_id = None
+                elif menu_state == 'menu' and run_id is not None:
+                    history.end_run(run_id, 'abandoned', floor - 1, run_turns)
+                    run_id = None
+                elif menu_state == 'world_map' and floor == 1 and player:
+                    if run_id is not None:
+                        history.end_run(run_id, 'abandoned', 0, run_turns)
+                    run_id = history.start_run(input_name or player.name, player.class_type, opts.endless)
+                    run_turns = 0
+                if menu_state == 'world_map':
+                    floor_start_turns = run_turns
+            if menu_state == 'world_map' and floor == 1:
+                run_rewards = []
+            if autosaver and player:
+                if menu_state == 'world_map':
+                    autosave()
+                elif menu_state == 'paused_menu' and state == 'player_turn' and enemy_queue is None:
+                    autosave(battle=True)
+                elif menu_state in ('run_complete', 'defeat'):
+                    autosaver.discard()
+            if menu_state == 'defeat':
+                # the canvas still holds the last battle frame
+                post.capture_defeat(screen)
+            elif last_menu_state == 'defeat':
+                post.defeat_bg = None
+            if menu_state == 'paused_menu':
+                AUDIO.pause_music()
+            elif menu_state == 'playing':
+                AUDIO.resume_music()
+            else:
+                AUDIO.stop_music()
+            if menu_state in ('floor_cleared', 'run_complete', 'defeat') and player:
+                EVENTS.emit(menu_state, floor=floor, player_hp=player.hp, player_max_hp=player.max_hp)
+            last_menu_state = menu_state
+        if menu_state == 'playing' and player:
+            EVENTS.track_statuses([player] + enemies)
+        if spectator:
+            spectator.publish(battle_snapshot(menu_state, floor, message, player, enemies))
         if menu_state not in ('paused_menu','guide'):
-            newft = []
-            for ft in floating_texts:
-                ft.update(dt)
-                if not ft.is_expired():
-                    newft.append(ft)
-            floating_texts = newft
-
-        for event in pygame.event.get():
+            PARTICLES.update(dt * speed_scale())
+
+        for event in frame_events:
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.VIDEORESIZE:
+                viewport.resize(event.size)
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     if menu_state == 'menu':
@@ -641,7 +4144,7 @@ def main():
                     elif menu_state == 'paused_menu':
                         menu_state = 'playing'
                         message = "Resumed."
-                    elif menu_state == 'guide':
+                    elif menu_state in ('guide', 'leaderboard'):
                         menu_state = 'menu'
                     elif menu_state == 'world_map':
                         menu_state = 'choose_class'
@@ -658,6 +4161,14 @@ def main():
                         if ch and len(input_name) < 20:
                             input_name += ch
                 elif menu_state == 'playing' and player and enemy:
+                    if event.key == pygame.K_t:
+                        battle_speed = BATTLE_SPEEDS[(BATTLE_SPEEDS.index(battle_speed) + 1) % len(BATTLE_SPEEDS)]
+                        message = f"Battle speed: {battle_speed}"
+                    if event.key == pygame.K_TAB and state == 'player_turn' and len(enemies) > 1:
+                        alive = [e for e in enemies if e.is_alive()]
+                        if alive:
+                            enemy = alive[(alive.index(enemy) + 1) % len(alive)] if enemy in alive else alive[0]
+                            message = f"Target: {enemy.name}"
                     if state == 'player_turn' and not player.is_stunned():
                         action_label = None
                         if event.key == pygame.K_a:
@@ -668,9 +4179,11 @@ def main():
                             action_label = 'Heal (-15 MP)'
                         elif event.key == pygame.K_u:
                             action_label = 'ULTIMATE'
+                        if action_label:
+                            EVENTS.emit('action', actor=player.name, action=action_label, target=enemy.name, source='key')
                         if action_label == 'Attack':
                             dmg = random.randint(15,28)  # BUFFED
-                            player.play_attack(duration=anim_duration)
+                            player.play_attack(duration=anim_duration, on_done=resolve_player_action)
                             state = 'player_anim'
                             pending_action = ('attack', dmg)
                             message = f"You attack! Deal {dmg} damage..."
@@ -680,14 +4193,17 @@ def main():
                             player.mp = min(player.max_mp, player.mp + mp_gain)
                             add_floating_text(player, mp_gain, (64,150,255), False)
                             message = f"You brace your shield and recovered {mp_gain} MP."
+                            AUDIO.play('shield')
                             state = 'enemy_turn'
                         elif action_label == 'Heal (-15 MP)':
                             cost = 15
                             if player.mp >= cost:
                                 player.mp -= cost
-                                heal = random.randint(20,30)
+                                heal = random.randint(*PLAYER_HEAL)
                                 player.hp = min(player.max_hp, player.hp + heal)
                                 add_floating_text(player, heal, (46,204,113), False)
+                                EVENTS.emit('heal', target=player.name, amount=heal, hp=player.hp)
+                                AUDIO.play('heal')
                                 message = f"You healed {heal} HP (-{cost} MP)."
                                 state = 'enemy_turn'
                             else:
@@ -695,11 +4211,12 @@ def main():
                         elif action_label == 'ULTIMATE':
                             if player.rage >= player.max_rage:
                                 cname = (player.class_type or "").lower()
+                                target_hp = enemy.hp
                                 if 'warrior' in cname:
                                     cost = 30
                                     if player.mp >= cost:
                                         player.mp -= cost
-                                    dmg = random.randint(200,250)
+                                    dmg = random.randint(*SKILL_DAMAGE['warrior', 'ultimate'])
                                     player.rage = 0
                                     enemy.hp = max(0, enemy.hp - dmg)
                                     enemy.play_hurt(duration=500)
@@ -715,12 +4232,13 @@ def main():
                                     cost = 35
                                     if player.mp >= cost:
                                         player.mp -= cost
-                                    dmg = random.randint(120,150)
+                                    dmg = random.randint(*SKILL_DAMAGE['mage', 'ultimate'])
                                     player.rage = 0
                                     enemy.hp = max(0, enemy.hp - dmg)
                                     enemy.status_effects['burn'] = 3
                                     add_floating_text(enemy, dmg, (255,90,0), True, size=34)
                                     add_floating_text(enemy, "BURN", (255,120,60), False, size=18)
+                                    PARTICLES.emit('inferno', enemy.pos[0], enemy.pos[1])
                                     message = f"Inferno! {dmg} damage and Burn."
                                 elif 'tank' in cname:
                                     cost = 30
@@ -735,16 +4253,20 @@ def main():
                                     cost = 40
                                     if player.mp >= cost:
                                         player.mp -= cost
-                                    dmg = random.randint(150,200)
+                                    dmg = random.randint(*SKILL_DAMAGE['archer', 'ultimate'])
                                     player.rage = 0
                                     enemy.hp = max(0, enemy.hp - dmg)
                                     enemy.play_hurt(duration=500)
                                     enemy.status_effects['slow'] = max(enemy.status_effects.get('slow',0), 2)
                                     add_floating_text(enemy, dmg, (255,200,80), True, size=34)
                                     add_floating_text(enemy, "SLOW", (200,200,255), False, size=18)
+                                    PARTICLES.emit('arrows', enemy.pos[0], enemy.pos[1])
                                     message = f"Rain of Arrows! {dmg} damage and Slow for 2 turns."
                                 else:
                                     message = "Ultimate used!"
+                                EVENTS.emit('ultimate', actor=player.name, cls=player.class_type, target=enemy.name,
+                                            damage=target_hp - enemy.hp, target_hp=enemy.hp)
+                                AUDIO.play('ultimate')
                                 state = 'enemy_turn'
                             else:
                                 message = "Ultimate not ready."
@@ -761,11 +4283,22 @@ def main():
                         state = 'player_turn'
                         player_defending = False
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                mx, my = event.pos
+                mx, my = viewport.to_canvas(event.pos)
                 if menu_state == 'playing' and pause_btn_rect.collidepoint(mx,my):
                     menu_state = 'paused_menu'
                     message = "Game Paused."
                     continue
+                if menu_state == 'playing' and speed_btn_rect.collidepoint(mx,my):
+                    battle_speed = BATTLE_SPEEDS[(BATTLE_SPEEDS.index(battle_speed) + 1) % len(BATTLE_SPEEDS)]
+                    message = f"Battle speed: {battle_speed}"
+                    continue
+                if menu_state == 'playing' and policy and hint_btn_rect.collidepoint(mx,my):
+                    hint = policy.lookup(player, enemy, floor, player_defending) if state == 'player_turn' else None
+                    if hint:
+                        message = f"Hint: {action_button_label(hint[0], player.class_type)} (win {hint[1]*100:.0f}%)"
+                    else:
+                        message = "No hint for this situation."
+                    continue
                 if menu_state == 'menu':
                     if start_btn.collidepoint(mx,my):
                         menu_state = 'enter_name'
@@ -777,32 +4310,90 @@ def main():
                     elif guide_btn.collidepoint(mx,my):
                         menu_state = 'guide'
                         message = "Game Guide: ESC to return."
+                    elif autosaver and autosaver.current and resume_btn.collidepoint(mx,my):
+                        t0 = time.perf_counter()
+                        sv = autosaver.current
+                        startup.finish('resume')
+                        if prefetch:
+                            prefetch.join()
+                        input_name = sv['name']
+                        player = make_player(sv['class_type'], input_name)
+                        restore_character(player, sv['player'])
+                        try_load_avatar_by_prefix(player.prefix, (AVATAR_SIZE, AVATAR_SIZE))
+                        floor = sv['floor']
+                        last_floor = None if sv['endless'] else TOWER_FLOORS
+                        run_id, run_turns, run_rewards = sv['run_id'], sv['run_turns'], list(sv['rewards'])
+                        floor_start_turns = run_turns
+                        if history and run_id is not None:
+                            history.resume_run(run_id)
+                        random.setstate(sv['rng'])
+                        floating_texts = []
+                        state = 'player_turn'
+                        player_defending = False
+                        enemy_queue = None
+                        TIMELINE.clear()
+                        won = sv['enemies'] and not any(saved['hp'] > 0 for saved in sv['enemies'])
+                        if won:
+                            # every saved enemy is dead, so the fight was won: finish the floor
+                            if last_floor is not None and floor >= last_floor:
+                                menu_state = 'run_complete'
+                                message = "You cleared the tower! Continue or Exit."
+                            else:
+                                menu_state = 'floor_cleared'
+                                message = f"You cleared floor {floor}! Choose reward!"
+                        elif sv['enemies']:
+                            enemies = spawn_encounter(floor, len(sv['enemies']), generic_enemy_img)
+                            for e, saved in zip(enemies, sv['enemies']):
+                                restore_character(e, saved)
+                            enemy = enemies[sv['target']]
+                            if not enemy.is_alive():
+                                enemy = next(e for e in enemies if e.is_alive())
+                            if stage is not None:
+                                stage.close()
+                            stage = BattleStage(player, enemies, floor)
+                            try_load_avatar_by_prefix(enemy.prefix, (AVATAR_SIZE, AVATAR_SIZE))
+                            PARTICLES.clear()
+                            AUDIO.play_music(floor)
+                            message = f"Resumed Floor {floor}. Choose action."
+                            menu_state = 'playing'
+                        else:
+                            FLOOR_ASSETS.enter_floor(floor)
+                            for prefix, size in floor_images(floor, opts.max_enemies):
+                                FLOOR_ASSETS.get(prefix, size)
+                            try_load_avatar_by_prefix(pick_enemy_for_floor(floor)[3], (AVATAR_SIZE, AVATAR_SIZE))
+                            message = f"Resumed at Floor {floor} entrance. Click entry point."
+                            menu_state = 'world_map'
+                        # the restored state is what was saved; skip the transition hooks,
+                        # except for a won fight so the floor is recorded as cleared
+                        last_menu_state = 'playing' if won else menu_state
+                        print(f"[save] Resumed floor {floor} in {(time.perf_counter() - t0) * 1000:.1f} ms")
+                    elif history and board_btn.collidepoint(mx,my):
+                        menu_state = 'leaderboard'
+                        board_cursors = [None]
+                        board_rows = history.leaderboard_page(board_class)
+                elif menu_state == 'leaderboard':
+                    for c, r in board_tabs:
+                        if r.collidepoint(mx,my):
+                            board_class = c
+                            board_cursors = [None]
+                            board_rows = history.leaderboard_page(board_class)
+                    if board_nav[1][1].collidepoint(mx,my) and len(board_rows) == LEADERBOARD_PAGE:
+                        cursor = (board_rows[-1][5], board_rows[-1][0])
+                        rows = history.leaderboard_page(board_class, cursor)
+                        if rows:
+                            board_cursors.append(cursor)
+                            board_rows = rows
+                    elif board_nav[0][1].collidepoint(mx,my) and len(board_cursors) > 1:
+                        board_cursors.pop()
+                        board_rows = history.leaderboard_page(board_class, board_cursors[-1])
                 elif menu_state == 'enter_name':
                     name_active = name_box.collidepoint(mx,my)
                 elif menu_state == 'choose_class':
                     for c,r in class_rects:
                         if r.collidepoint(mx,my):
                             selected_class = c
-                            if selected_class == 'Warrior':
-                                p_hp, p_mp = 150, 30
-                            elif selected_class == 'Mage':
-                                p_hp, p_mp = 90, 100
-                            elif selected_class == 'Archer':
-                                p_hp, p_mp = 110, 50
-                            else:
-                                p_hp, p_mp = 180, 20
-                            p_prefix = selected_class.lower()
-                            if p_prefix == 'tank':
-                                p_prefix = 'tanker'
-                            player_img = try_load_image_fuzzy(p_prefix, (SPRITE_W, SPRITE_H)) or generic_player_img
-                            player = Character(input_name or 'Player', GREEN, (0,0), image_surface=player_img, prefix=p_prefix)
-                            player.max_hp = player.hp = p_hp
-                            player.max_mp = player.mp = p_mp
-                            player.class_type = selected_class
-                            if selected_class == 'Warrior':
-                                player.crit_chance = 0.15
-                            elif selected_class == 'Tank':
-                                player.dodge_chance = 0.1
+                            startup.finish('choose_class')
+                            player = make_player(selected_class, input_name or 'Player')
                             floor = 1
                             state = 'player_turn'
                             player_defending = False
@@ -811,24 +4402,38 @@ def main():
                             floating_texts = []
                 elif menu_state == 'world_map':
                     if map_entry_rect.collidepoint(mx, my) and player:
-                        e_name, e_hp, e_mp, e_prefix = pick_enemy_for_floor(floor)
-                        enemy_img = try_load_image_fuzzy(e_prefix, (SPRITE_W, SPRITE_H)) or generic_enemy_img
-                        enemy = Character(e_name, (200,60,80), (0,0), image_surface=enemy_img, prefix=e_prefix)
-                        enemy.max_hp = enemy.hp = int(e_hp * (1 + (floor-1)*0.12))  # NERFED SCALING
-                        enemy.max_mp = enemy.mp = e_mp
+                        enemies = spawn_encounter(floor, opts.max_enemies, generic_enemy_img)
+                        enemy = enemies[0]
+                        if stage is not None:
+                            stage.close()
+                        stage = BattleStage(player, enemies, floor)
+                        enemy_queue = None
+                        PARTICLES.clear()
+                        TIMELINE.clear()
+                        player.stop_animation()
+                        AUDIO.play_music(floor)
+                        EVENTS.emit('battle_start', floor=floor, player=player.class_type, enemies=[e.name for e in enemies])
                         state = 'player_turn'
                         player_defending = False
-                        message = f"Floor {floor}: {enemy.name}! Choose action."
+                        if enemy_ai is not None:
+                            enemy_ai.cancel()
+                        message = f"Floor {floor}: {enemy.name}! Choose action." if len(enemies) == 1 else f"Floor {floor}: {enemy.name} and {len(enemies) - 1} more! Choose action."
                         menu_state = 'playing'
                         floating_texts = []
                     else:
                         message = f"Click Entry Point to start Floor {floor}."
                 elif menu_state == 'playing':
+                    if stage and state == 'player_turn' and len(enemies) > 1:
+                        for e in enemies:
+                            if e.is_alive() and stage.sprite_rect(e).collidepoint(mx,my):
+                                enemy = e
+                                message = f"Target: {enemy.name}"
                     for label, rect in action_btn_rects:
                         if rect.collidepoint(mx,my) and state == 'player_turn' and not player.is_stunned():
+                            EVENTS.emit('action', actor=player.name, action=label, target=enemy.name, source='mouse')
                             if label.startswith('Attack'):
                                 dmg = random.randint(15,28)  # BUFFED
-                                player.play_attack(duration=anim_duration)
+                                player.play_attack(duration=anim_duration, on_done=resolve_player_action)
                                 state = 'player_anim'
                                 pending_action = ('attack', dmg)
                                 message = f"You attack! Deal {dmg} damage..."
@@ -836,9 +4441,11 @@ def main():
                                 cost = 15
                                 if player.mp >= cost:
                                     player.mp -= cost
-                                    heal = random.randint(20,30)
+                                    heal = random.randint(*PLAYER_HEAL)
                                     player.hp = min(player.max_hp, player.hp + heal)
                                     add_floating_text(player, heal, (46,204,113), False)
+                                    EVENTS.emit('heal', target=player.name, amount=heal, hp=player.hp)
+                                    AUDIO.play('heal')
                                     message = f"You healed {heal} HP (-{cost} MP)."
                                     state = 'enemy_turn'
                                 else:
@@ -849,6 +4456,7 @@ def main():
                                 player.mp = min(player.max_mp, player.mp + mp_gain)
                                 add_floating_text(player, mp_gain, (64,150,255), False)
                                 message = f"You brace your shield and recovered {mp_gain} MP."
+                                AUDIO.play('shield')
                                 state = 'enemy_turn'
                             elif label.startswith('Armor Break') or label.startswith('Ice Shards') or label.startswith('Taunt') or label.startswith('Vacuum') or label.startswith('Rage') or label.startswith('Iron Skin') or label.startswith('Triple Shot') or label.startswith('Stun Shot'):
                                 cname = (player.class_type or "").lower()
@@ -856,8 +4464,8 @@ def main():
                                     cost = 15
                                     if player.mp >= cost:
                                         player.mp -= cost
-                                        dmg = random.randint(80,105)  # BUFFED
-                                        player.play_attack(duration=anim_duration)
+                                        dmg = random.randint(*SKILL_DAMAGE['warrior', 'skill1'])  # BUFFED
+                                        player.play_attack(duration=anim_duration, on_done=resolve_player_action)
                                         state = 'player_anim'
                                         pending_action = ('attack', dmg)
                                         enemy.status_effects['vulnerability'] = max(enemy.status_effects.get('vulnerability',0), 2)
@@ -871,6 +4479,7 @@ def main():
                                         rage_gain = 40
                                         player.rage = min(player.max_rage, player.rage + rage_gain)
                                         message = f"Rage! Gained {rage_gain} Rage (+{player.rage}/{player.max_rage}). Enemy turn."
+                                        AUDIO.play('skill')
                                         state = 'enemy_turn'
                                     else:
                                         message = "Not enough MP for Rage."
@@ -878,8 +4487,8 @@ def main():
                                     cost = 20
                                     if player.mp >= cost:
                                         player.mp -= cost
-                                        dmg = random.randint(48,72)  # BUFFED
-                                        player.play_attack(duration=anim_duration)
+                                        dmg = random.randint(*SKILL_DAMAGE['mage', 'skill1'])  # BUFFED
+                                        player.play_attack(duration=anim_duration, on_done=resolve_player_action)
                                         state = 'player_anim'
                                         pending_action = ('attack', dmg)
                                         enemy.status_effects['slow'] = max(enemy.status_effects.get('slow',0), 1)
@@ -894,6 +4503,7 @@ def main():
                                         enemy.status_effects['taunted_by'] = 2
                                         add_floating_text(player, "TAUNT", (100,180,255), False, size=18)
                                         message = "Taunt: enemies forced to target you and +DEF."
+                                        AUDIO.play('skill')
                                         state = 'enemy_turn'
                                     else:
                                         message = "Not enough MP for Taunt."
@@ -901,8 +4511,8 @@ def main():
                                     cost = 15
                                     if player.mp >= cost:
                                         player.mp -= cost
-                                        dmg = random.randint(60,85)  # BUFFED
-                                        player.play_attack(duration=anim_duration)
+                                        dmg = random.randint(*SKILL_DAMAGE['mage', 'skill2'])  # BUFFED
+                                        player.play_attack(duration=anim_duration, on_done=resolve_player_action)
                                         state = 'player_anim'
                                         pending_action = ('attack', dmg)
                                         enemy.status_effects['atk_down'] = max(enemy.status_effects.get('atk_down',0), 2)
@@ -917,6 +4527,7 @@ def main():
                                         player.status_effects['atk_up'] = max(player.status_effects.get('atk_up',0), 1)
                                         add_floating_text(player, "IRON SKIN", (180,180,255), False, size=18)
                                         message = f"Iron Skin used! Block next hit and +ATK for 1 turn."
+                                        AUDIO.play('skill')
                                         state = 'enemy_turn'
                                     else:
                                         message = "Not enough HP for Iron Skin."
@@ -924,8 +4535,8 @@ def main():
                                     cost = 15
                                     if player.mp >= cost:
                                         player.mp -= cost
-                                        dmg = random.randint(18,30) * 3  # BUFFED
-                                        player.play_attack(duration=anim_duration)
+                                        dmg = random.randint(*SKILL_DAMAGE['archer', 'skill1']) * 3  # BUFFED
+                                        player.play_attack(duration=anim_duration, on_done=resolve_player_action)
                                         state = 'player_anim'
                                         pending_action = ('attack', dmg)
                                         message = f"Triple Shot! {dmg} total damage (3 hits)."
@@ -935,8 +4546,8 @@ def main():
                                     cost = 20
                                     if player.mp >= cost:
                                         player.mp -= cost
-                                        dmg = random.randint(24,36)  # BUFFED
-                                        player.play_attack(duration=anim_duration)
+                                        dmg = random.randint(*SKILL_DAMAGE['archer', 'skill2'])  # BUFFED
+                                        player.play_attack(duration=anim_duration, on_done=resolve_player_action)
                                         state = 'player_anim'
                                         pending_action = ('attack', dmg)
                                         enemy.status_effects['stun'] = max(enemy.status_effects.get('stun',0), 1)
@@ -946,6 +4557,7 @@ def main():
                             elif label == 'ULTIMATE':
                                 if player.rage >= player.max_rage:
                                     cname = (player.class_type or "").lower()
+                                    target_hp = enemy.hp
                                     cost = 30
                                     if 'mage' in cname: cost = 35
                                     elif 'archer' in cname: cost = 40
@@ -954,7 +4566,7 @@ def main():
                                         player.mp -= cost
                                     player.rage = 0
                                     if 'warrior' in cname:
-                                        dmg = random.randint(200,250)
+                                        dmg = random.randint(*SKILL_DAMAGE['warrior', 'ultimate'])
                                         enemy.hp = max(0, enemy.hp - dmg)
                                         enemy.play_hurt(duration=500)
                                         add_floating_text(enemy, dmg, (255,40,40), True, size=36)
@@ -966,11 +4578,12 @@ def main():
                                         else:
                                             message = f"Decapitate! Dealt {dmg} damage."
                                     elif 'mage' in cname:
-                                        dmg = random.randint(120,150)
+                                        dmg = random.randint(*SKILL_DAMAGE['mage', 'ultimate'])
                                         enemy.hp = max(0, enemy.hp - dmg)
                                         enemy.status_effects['burn'] = 3
                                         add_floating_text(enemy, dmg, (255,90,0), True, size=34)
                                         add_floating_text(enemy, "BURN", (255,120,60), False, size=18)
+                                        PARTICLES.emit('inferno', enemy.pos[0], enemy.pos[1])
                                         message = f"Inferno! {dmg} damage and Burn."
                                     elif 'tank' in cname:
                                         player.status_effects['invulnerable'] = 1
@@ -978,13 +4591,17 @@ def main():
                                         add_floating_text(player, "ABS GUARD", (100,180,255), False, size=24)
                                         message = "Absolute Guard! Invulnerable and reflect 50%."
                                     elif 'archer' in cname:
-                                        dmg = random.randint(150,200)
+                                        dmg = random.randint(*SKILL_DAMAGE['archer', 'ultimate'])
                                         enemy.hp = max(0, enemy.hp - dmg)
                                         enemy.play_hurt(duration=500)
                                         enemy.status_effects['slow'] = max(enemy.status_effects.get('slow',0), 2)
                                         add_floating_text(enemy, dmg, (255,200,80), True, size=34)
                                         add_floating_text(enemy, "SLOW", (200,200,255), False, size=18)
+                                        PARTICLES.emit('arrows', enemy.pos[0], enemy.pos[1])
                                         message = f"Rain of Arrows! {dmg} damage and Slow for 2 turns."
+                                    EVENTS.emit('ultimate', actor=player.name, cls=player.class_type, target=enemy.name,
+                                                damage=target_hp - enemy.hp, target_hp=enemy.hp)
+                                    AUDIO.play('ultimate')
                                     state = 'enemy_turn'
                                 else:
                                     message = "Ultimate not ready."
@@ -997,26 +4614,24 @@ def main():
                         floating_texts = []
                 elif menu_state == 'floor_cleared':
                     reward_chosen = False
-                    for text, r, color in reward_rects:
+                    for i, (text, r, color) in enumerate(reward_rects):
                         if r.collidepoint(mx,my):
-                            if text == 'Max HP +15':
-                                player.max_hp += 15
-                                player.hp += 15
-                            elif text == 'Max MP +10':
-                                player.max_mp += 10
-                                player.mp += 10
-                            elif text == '+5% Crit Chance':
-                                player.crit_chance = min(0.5, player.crit_chance + 0.05)
+                            if i == 0:
+                                player.max_hp += REWARD_MAX_HP
+                                player.hp += REWARD_MAX_HP
+                            elif i == 1:
+                                player.max_mp += REWARD_MAX_MP
+                                player.mp += REWARD_MAX_MP
+                            elif i == 2:
+                                player.crit_chance = min(MAX_CRIT, player.crit_chance + REWARD_CRIT)
                             reward_chosen = True
                             break
                     if reward_chosen:
-                        if floor < 8:
+                        run_rewards.append(i)
+                        if history and run_id is not None:
+                            history.reward(run_id, floor, text)
+                        if last_floor is None or floor < last_floor:
                             floor += 1
-                            e_name, e_hp, e_mp, e_prefix = pick_enemy_for_floor(floor)
-                            enemy_img = try_load_image_fuzzy(e_prefix, (SPRITE_W, SPRITE_H)) or generic_enemy_img
-                            enemy = Character(e_name, (200,60,80), (0,0), image_surface=enemy_img, prefix=e_prefix)
-                            enemy.max_hp = enemy.hp = int(e_hp * (1 + (floor-1)*0.12))  # NERFED
-                            enemy.max_mp = enemy.mp = e_mp
                             message = f"You are now at Floor {floor} entrance. Click entry point."
                             menu_state = 'world_map'
                             state = 'player_turn'
@@ -1051,181 +4666,36 @@ def main():
                         player_defending = False
                         floating_texts = []
 
-        # Gameplay updates
+        # Gameplay updates (attack animations finish through their callbacks)
+        if menu_state not in ('paused_menu','guide'):
+            TIMELINE.update(dt * speed_scale())
+            if floating_texts:
+                floating_texts = [ft for ft in floating_texts if not ft.expired]
         if menu_state == 'playing' and player and enemy:
-            player.update(dt)
-            enemy.update(dt)
-            if state == 'player_turn':
-                player_defending = False
-                result = enemy.apply_turn_start_effects(player, enemy, add_floating_text)
-                if result == 'dead_by_dot':
-                    menu_state = 'floor_cleared'
-                    message = f"Enemy was defeated by DOT! You cleared floor {floor}!"
-                    continue
-                if enemy.is_stunned():
-                    message = f"{enemy.name} is stunned! Enemy skips turn."
-            if state == 'player_anim':
-                if player.anim_timer == 0:
-                    if pending_action is None:
-                        state = 'enemy_turn'
-                        continue
-                    action, dmg = pending_action
-                    pending_action = None
-                    if action == 'attack':
-                        is_crit = random.random() < player.crit_chance
-                        is_miss = random.random() < enemy.dodge_chance
-                        if is_miss:
-                            final_dmg = 0
-                            add_floating_text(enemy, "DODGED", (255,255,255), True, size=30)
-                            message = f"You missed! Enemy turn."
-                        else:
-                            final_dmg = dmg
-                            if is_crit:
-                                final_dmg = int(dmg * 1.5)
-                                add_floating_text(enemy, "CRIT! " + str(final_dmg), (255,180,0), True, size=36)
-                            else:
-                                add_floating_text(enemy, final_dmg, (255,20,20), True)
-                            enemy.hp = max(0, enemy.hp - final_dmg)
-                            enemy.play_hurt(duration=500)
-                            message = f"Dealt {final_dmg} damage. Enemy turn."
-                            gain = max(1, int(final_dmg * 0.10))
-                            player.rage = min(player.max_rage, player.rage + gain)
-                        if enemy.hp <= 0:
-                            if floor >= 8:
-                                menu_state = 'run_complete'
-                                message = "You cleared the tower! Continue or Exit."
-                            else:
-                                menu_state = 'floor_cleared'
-                                message = f"You cleared floor {floor}! Choose reward!"
-                            continue
-                    state = 'enemy_turn'
-            elif state == 'enemy_turn':
-                if not enemy.is_alive():
-                    if floor >= 8:
-                        menu_state = 'run_complete'
-                        message = "You cleared the tower! Continue or Exit."
-                    else:
-                        menu_state = 'floor_cleared'
-                        message = f"You cleared floor {floor}! Choose reward!"
-                    continue
-                result = player.apply_turn_start_effects(player, enemy, add_floating_text)
-                if result == 'dead_by_dot':
-                    menu_state = 'defeat'
-                    message = "You were defeated by DOT. Retry or Exit?"
-                    floating_texts = []
+            if battle_speed == 'instant' and state != 'player_turn':
+                if resolve_turn_instantly():
                     continue
-                if enemy.is_stunned():
-                    message = f"{enemy.name} is stunned! Enemy skips turn."
-                    state = 'player_turn'
-                    continue
-                # WEAKENED ENEMY AI
-                if enemy.prefix == 'dragon' and enemy.mp >= 30 and random.random() < 0.5:
-                    enemy.mp -= 30
-                    dmg = random.randint(28,42)
-                    enemy.play_attack(duration=anim_duration)
-                    state = 'enemy_anim'
-                    pending_enemy_action = ('attack', dmg, 'poison')
-                    message = "Dragon breathes POISON fire!"
-                    continue
-                elif enemy.prefix == 'golem' and enemy.mp >= 14 and random.random() < 0.4:
-                    enemy.mp -= 14
-                    dmg = random.randint(17,24)
-                    status = 'stun' if random.random() < 0.4 else None
-                    enemy.play_attack(duration=anim_duration)
-                    state = 'enemy_anim'
-                    pending_enemy_action = ('attack', dmg, status)
-                    message = "Golem uses Rock Smash!"
-                    continue
-                elif enemy.prefix == 'orc' and enemy.mp >= 10 and random.random() < 0.3:
-                    enemy.mp -= 10
-                    dmg = random.randint(10,17)
-                    enemy.play_attack(duration=anim_duration)
-                    state = 'enemy_anim'
-                    pending_enemy_action = ('attack', dmg, 'vulnerability')
-                    message = "Orc throws a Debilitating Axe!"
-                    continue
-                dmg_mult = 1.0
-                if player.status_effects.get('vulnerability',0) > 0:
-                    dmg_mult = 1.2
-                choice = random.random()
-                if choice < 0.7:
-                    dmg = int(random.randint(6,13) * dmg_mult)
-                    enemy.play_attack(duration=anim_duration)
-                    state = 'enemy_anim'
-                    pending_enemy_action = ('attack', dmg)
-                    message = "Enemy attacks..."
-                else:
-                    heal = random.randint(6,10)
-                    enemy.hp = min(enemy.max_hp, enemy.hp + heal)
-                    add_floating_text(enemy, heal, (46,204,113), False)
-                    message = f"Enemy healed {heal} HP."
-                    state = 'player_turn'
-            elif state == 'enemy_anim':
-                if enemy.anim_timer == 0:
-                    if pending_enemy_action is None:
-                        state = 'player_turn'
-                        continue
-                    action = pending_enemy_action[0]
-                    dmg = pending_enemy_action[1]
-                    status_effect = pending_enemy_action[2] if len(pending_enemy_action) > 2 else None
-                    pending_enemy_action = None
-                    if action == 'attack':
-                        final = dmg
-                        is_dodge = random.random() < player.dodge_chance
-                        if is_dodge:
-                            final = 0
-                            add_floating_text(player, "DODGE", (255,255,255), True, size=30)
-                            message = f"{enemy.name} missed!"
-                        else:
-                            if player_defending == True:
-                                final = int(dmg * player.defend_damage_reduction)
-                            elif player.status_effects.get('invulnerable',0) > 0:
-                                reflect = player.status_effects.get('reflect_pct', 0)
-                                if reflect > 0:
-                                    refd = int(final * reflect)
-                                    enemy.hp = max(0, enemy.hp - refd)
-                                    add_floating_text(enemy, refd, (255,160,80), True)
-                                final = 0
-                                message = "Your shield reflected damage!"
-                            if player.status_effects.get('iron_skin',0) > 0:
-                                player.status_effects['iron_skin'] = max(0, player.status_effects.get('iron_skin',0)-1)
-                                final = 0
-                                add_floating_text(player, "BLOCKED", (180,180,255), False, size=18)
-                            if final > 0:
-                                player.play_hurt(duration=480)
-                                player.hp = max(0, player.hp - final)
-                                add_floating_text(player, final, (255,80,80), True)
-                                mp_recover = 5
-                                player.mp = min(player.max_mp, player.mp + mp_recover)
-                                add_floating_text(player, mp_recover, (64,150,255), False)
-                                if player.hp <= 0:
-                                    menu_state = 'defeat'
-                                    message = "You were defeated! Retry or Exit?"
-                                    floating_texts = []
-                                    state = 'player_turn'
-                                    continue
-                            if status_effect:
-                                if status_effect == 'poison':
-                                    player.status_effects['poison'] = max(player.status_effects.get('poison',0), 2)
-                                elif status_effect == 'stun':
-                                    player.status_effects['stun'] = max(player.status_effects.get('stun',0), 1)
-                                elif status_effect == 'vulnerability':
-                                    player.status_effects['vulnerability'] = max(player.status_effects.get('vulnerability',0), 2)
-                            message = f"{enemy.name} dealt {final} damage."
-                        player_defending = False
-                    state = 'player_turn'
+            elif battle_step():
+                continue
 
         # Draw
         screen.fill((8,10,12))
         if menu_state in ('playing', 'paused_menu'):
-            status_bottom = draw_battle_panel_lr(screen, font, bigfont, player if player else Character("P",GREEN,(0,0)), enemy if enemy else Character("E",(200,60,80),(0,0)), message, state, floor) if player and enemy else 140
-            if player and enemy:
-                draw_battle_sprites(screen, player, enemy, status_bottom, font, message, floor)
+            win_chance = None
+            if win_estimator and player and enemy:
+                win_chance = win_estimator.observe(player, enemies, player_defending)
+            status_bottom = draw_battle_panel_lr(screen, font, bigfont, player if player else Character("P",GREEN,(0,0)), enemy if enemy else Character("E",(200,60,80),(0,0)), message, state, floor, win_chance) if player and enemy else 140
+            if player and enemy and stage:
+                draw_battle_sprites(screen, stage, font, message, enemy)
+                PARTICLES.draw(screen)
             draw_pause_button(screen, font)
+            if policy:
+                draw_hint_button(screen, font)
+            draw_speed_button(screen, font, battle_speed)
             if menu_state == 'playing' and player:
                 action_btn_rects = draw_action_panel_modern(screen, font, player)
             if menu_state == 'paused_menu':
-                msg = bigfont.render("PAUSED", True, WHITE)
+                msg = render_text(bigfont, "PAUSED", WHITE)
                 screen.blit(msg, (WIDTH//2 - msg.get_width()//2, HEIGHT//2 - 80))
                 draw_rounded_rect(screen, (modal_pause_continue.x-4, modal_pause_continue.y-4, modal_pause_continue.w+8, modal_pause_continue.h+8), (28,30,34), radius=8, border=2, border_color=(6,6,8))
                 draw_text_center(screen, "Continue", font, (modal_pause_continue.centerx, modal_pause_continue.centery), color=WHITE)
@@ -1255,6 +4725,14 @@ def main():
             draw_text_center(screen, "Quit", font, (quit_btn.centerx, quit_btn.centery), color=WHITE)
             draw_rounded_rect(screen, (guide_btn.x-4, guide_btn.y-4, guide_btn.w+8, guide_btn.h+8), (30,30,34), radius=8, border=2, border_color=(6,6,8))
             draw_text_center(screen, "Guide", font, (guide_btn.centerx, guide_btn.centery), color=WHITE)
+            if autosaver and autosaver.current:
+                draw_rounded_rect(screen, (resume_btn.x-4, resume_btn.y-4, resume_btn.w+8, resume_btn.h+8), (30,30,34), radius=8, border=2, border_color=(6,6,8))
+                draw_text_center(screen, f"Resume F{autosaver.current['floor']}", font, (resume_btn.centerx, resume_btn.centery), color=WHITE)
+            if history:
+                draw_rounded_rect(screen, (board_btn.x-4, board_btn.y-4, board_btn.w+8, board_btn.h+8), (30,30,34), radius=8, border=2, border_color=(6,6,8))
+                draw_text_center(screen, "Leaderboard", font, (board_btn.centerx, board_btn.centery), color=WHITE)
+        elif menu_state == 'leaderboard':
+            draw_leaderboard(screen, font, bigfont, board_class, board_rows, len(board_cursors) - 1, board_tabs, board_nav)
         elif menu_state == 'enter_name':
             prompt = font.render("Enter your name:", True, WHITE)
             screen.blit(prompt, (WIDTH//2 - prompt.get_width()//2, HEIGHT//2 - 80))
@@ -1283,6 +4761,8 @@ def main():
             draw_rounded_rect(screen, (modal_exit.x-4, modal_exit.y-4, modal_exit.w+8, modal_exit.h+8), (28,30,34), radius=8, border=2, border_color=(6,6,8))
             draw_text_center(screen, "Exit", font, (modal_exit.centerx, modal_exit.centery), color=WHITE)
         elif menu_state == 'defeat':
+            if post.defeat_bg:
+                screen.blit(post.defeat_bg, (0, 0))
             msg = bigfont.render("You were defeated", True, WHITE)
             screen.blit(msg, (WIDTH//2 - msg.get_width()//2, HEIGHT//2 - 80))
             draw_rounded_rect(screen, (modal_retry.x-4, modal_retry.y-4, modal_retry.w+8, modal_retry.h+8), (28,30,34), radius=8, border=2, border_color=(6,6,8))
@@ -1294,6 +4774,7 @@ def main():
                 "Heal: costs MP",
                 "Shield: defend and recover MP (reduces 70% dmg)",
                 "Bottom row: Skill1, ULTIMATE, Skill2",
+                "T / Speed button: battle speed 1x, 2x, 4x, instant",
                 "ESC to return"
             ]
             for i,l in enumerate(lines):
@@ -1301,9 +4782,61 @@ def main():
                 screen.blit(s, (80, 120 + i*28))
         for ft in floating_texts:
             ft.draw(screen)
-        pygame.display.flip()
+        if menu_state == 'playing':
+            post.apply(screen, player)
+        ALLOCS.draw(screen, get_font(14))
+        viewport.present()
+        if capture:
+            capture.capture(screen)
+        if startup.pending or startup.first_frame_at is None:
+            startup.frame(frame_ms)
+    if enemy_ai is not None:
+        enemy_ai.close()
+    if capture:
+        capture.close()
+        print(f"[capture] {capture.summary()}")
+    if opts.startup_report and startup.pending:
+        startup.print_report()
+    if AUDIO.enabled:
+        print(f"[audio] {AUDIO.summary()}")
+    if autosaver:
+        if menu_state == 'playing' and state == 'player_turn' and enemy_queue is None and player:
+            autosave(battle=True)
+        autosaver.close()
+        print(f"[save] {autosaver.summary()}")
+    if history:
+        if run_id is not None:
+            history.end_run(run_id, 'abandoned', floor - 1, run_turns)
+        history.close()
+        print(f"[history] {history.summary()}")
+    if spectator:
+        spectator.close()
+        print(f"[spectate] {spectator.summary()}")
+    if win_estimator is not None:
+        win_estimator.close()
+        print(f"[winhud] {win_estimator.summary()}")
+    if watchdog:
+        watchdog.close()
+        print(watchdog.summary())
+    if EVENTS.enabled:
+        EVENTS.close()
+        print(f"[events] {EVENTS.summary(frame_ms_total)}")
+    replay_ok = True
+    if recorder or replay:
+        final = {'frames': frame_index, 'menu_state': menu_state, 'state': state, 'floor': floor,
+                 'player': [player.class_type, player.hp, player.max_hp, player.mp, player.rage] if player else None,
+                 'enemies': [[e.name, e.hp] for e in enemies]}
+        if recorder:
+            recorder.close(final)
+        if replay:
+            replay_ok = replay.check(final)
+    if post.ns:
+        print(f"[post] {post.summary()}")
+    print(f"[surfaces] {SURFACES.summary()}")
+    if ALLOCS.enabled:
+        print(f"[alloc] {ALLOCS.summary()}")
     pygame.quit()
-    sys.exit()
+    sys.exit(0 if replay_ok else 1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(parse_args())
\ No newline at end of file
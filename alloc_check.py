@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from aaa_full import (ALLOCS, CLASS_STATS, GREEN, HEIGHT, PARTICLES, SPRITE_H, SPRITE_W, SURFACES, TIMELINE, WIDTH, BattleStage,
+                      Character, FloatingText, Viewport, draw_action_panel_modern, draw_battle_panel_lr, draw_battle_sprites,
+                      draw_hint_button, draw_pause_button, get_font, parse_window_size, spawn_encounter, try_load_image_fuzzy)
+
+# -------------------------
+# Check: no surfaces allocated per frame in a steady battle
+# -------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Draw a battle headless under the allocation probe and fail if steady-state "
+                                             "frames allocate any surface.")
+    ap.add_argument("--frames", type=int, default=600, help="steady-state frames checked")
+    ap.add_argument("--warmup", type=int, default=30, help="frames drawn first so caches fill")
+    ap.add_argument("--floor", type=int, default=3)
+    ap.add_argument("--enemies", type=int, default=3)
+    ap.add_argument("--player-class", default="Warrior", choices=sorted(CLASS_STATS))
+    ap.add_argument("--window-size", type=parse_window_size, default=(WIDTH * 3 // 2, HEIGHT * 3 // 2), metavar="WxH")
+    args = ap.parse_args()
+
+    ALLOCS.install()
+    pygame.init()
+    viewport = Viewport(args.window_size)
+    screen = viewport.canvas
+    font = get_font(20)
+    bigfont = get_font(34)
+    p_prefix = 'tanker' if args.player_class == 'Tank' else args.player_class.lower()
+    player = Character("Check", GREEN, (0, 0), image_surface=try_load_image_fuzzy(p_prefix, (SPRITE_W, SPRITE_H)), prefix=p_prefix)
+    player.class_type = args.player_class
+    player.max_hp = player.hp = CLASS_STATS[args.player_class][0]
+    player.status_effects['poison'] = 2
+    enemies = spawn_encounter(args.floor, args.enemies)
+    enemies[0].status_effects['stun'] = 1
+    stage = BattleStage(player, enemies, args.floor)
+    texts = []
+
+    def frame(message):
+        SURFACES.begin_frame()
+        ALLOCS.begin_frame()
+        TIMELINE.update(16)
+        PARTICLES.update(16)
+        texts[:] = [ft for ft in texts if not ft.expired]
+        screen.fill((8, 10, 12))
+        draw_battle_panel_lr(screen, font, bigfont, player, enemies[0], message, 'player_turn', args.floor, (0.63, 2000))
+        draw_battle_sprites(screen, stage, font, message, enemies[0])
+        PARTICLES.draw(screen)
+        draw_pause_button(screen, font)
+        draw_hint_button(screen, font)
+        draw_action_panel_modern(screen, font, player)
+        for ft in texts:
+            ft.draw(screen)
+        viewport.present()
+
+    # an exchange first: attack, hurt, damage number and particles
+    player.play_attack()
+    enemies[0].play_hurt()
+    texts.append(FloatingText(enemies[0].pos[0], enemies[0].pos[1], 42, (255, 20, 20)))
+    PARTICLES.emit('hit', enemies[0].pos[0], enemies[0].pos[1])
+    for _ in range(args.warmup):
+        frame("You attack!")
+    ALLOCS.begin_frame()
+    print(f"[alloc] warmup: {ALLOCS.summary()}")
+
+    # idle player turn: nothing changes, so nothing should be allocated
+    while texts or PARTICLES.active:
+        frame("Your turn")
+    ALLOCS.begin_frame()
+    start_count = ALLOCS.total_count
+    ALLOCS.totals = {}
+    for _ in range(args.frames):
+        frame("Your turn")
+    ALLOCS.begin_frame()
+    count = ALLOCS.total_count - start_count
+    frames = args.frames
+    print(f"[alloc] steady state: {count} surfaces over {frames} frames ({count / frames:.3f}/frame)")
+    for site, (n, nbytes) in ALLOCS.top(ALLOCS.totals):
+        print(f"[alloc]   {n:6d} {nbytes / 1024:9.1f} KB  {site}")
+    stage.close()
+    pygame.quit()
+    return 0 if count == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
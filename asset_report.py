@@ -0,0 +1,59 @@
+import argparse
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from aaa_full import (BATTLE_PANEL_BOTTOM, ENEMY_ROSTER, GROUND_Y, HEIGHT, SPRITE_H, SPRITE_W, WIDTH,
+                      find_best_file, floor_background_prefix, optimize_surface, surface_format)
+
+# -------------------------
+# Assets the game loads, at the sizes it loads them
+# -------------------------
+def game_assets():
+    sprite = (SPRITE_W, SPRITE_H)
+    yield "map", "map", (WIDTH, HEIGHT)
+    for floor in range(1, len(ENEMY_ROSTER) + 1):
+        prefix = floor_background_prefix(floor)
+        yield prefix, prefix, (WIDTH, GROUND_Y - BATTLE_PANEL_BOTTOM)
+    for prefix in ("warrior", "mage", "tanker", "archer") + tuple(e[3] for e in ENEMY_ROSTER):
+        yield prefix, prefix, sprite
+        yield "avatar" + prefix, "avatar" + prefix, (64, 64)
+
+def blit_us(screen, surf, reps):
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        screen.blit(surf, (0, 0))
+    return (time.perf_counter() - t0) * 1e6 / reps
+
+# -------------------------
+# Report
+# -------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Show the blit format chosen per asset and its measured blit cost.")
+    ap.add_argument("--reps", type=int, default=200)
+    args = ap.parse_args()
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    print(f"{'asset':22} {'file':22} {'size':>9} {'format':>8} {'alpha us':>9} {'chosen us':>9} {'speedup':>8}")
+    total_before = total_after = 0.0
+    for label, prefix, size in game_assets():
+        path = find_best_file(prefix)
+        if not path:
+            continue
+        baseline = pygame.transform.scale(pygame.image.load(path).convert_alpha(), size)
+        chosen = optimize_surface(baseline)
+        before = blit_us(screen, baseline, args.reps)
+        after = blit_us(screen, chosen, args.reps)
+        total_before += before
+        total_after += after
+        print(f"{label:22} {os.path.basename(path)[:22]:22} {size[0]:4d}x{size[1]:<4d} {surface_format(chosen):>8} "
+              f"{before:9.1f} {after:9.1f} {before / max(after, 1e-9):7.2f}x")
+    print(f"{'total':22} {'':22} {'':9} {'':8} {total_before:9.1f} {total_after:9.1f} "
+          f"{total_before / max(total_after, 1e-9):7.2f}x")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import wave
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from aaa_full import AUDIO, AUDIO_BUFFER, AUDIO_RATE, SOUND_EFFECTS, synth_effect
+
+# -------------------------
+# Disk access probe
+# -------------------------
+OPENS = [0]
+COUNTING = [False]
+
+def audit(event, args):
+    if COUNTING[0] and event in ("open", "os.listdir", "os.scandir"):
+        OPENS[0] += 1
+
+# -------------------------
+# Report
+# -------------------------
+def trigger_pattern(rng, frames, rate, burst):
+    # per 60 fps frame: usually nothing, sometimes one combat sound, rarely a
+    # burst (an ultimate landing with status ticks and hits) that overflows
+    # the channel pool
+    names = list(SOUND_EFFECTS)
+    for _ in range(frames):
+        r = rng.random()
+        if r < 0.02:
+            yield [rng.choice(names) for _ in range(burst)]
+        elif r < 0.02 + rate / 60:
+            yield [rng.choice(names)]
+        else:
+            yield []
+
+def stream_check(seconds):
+    # mixer.music streams from disk; use a shipped music file or write a
+    # short synthesized one to check the streaming path
+    path = AUDIO.music_files.get(1)
+    tmp = None
+    if path is None:
+        rate, _, channels = pygame.mixer.get_init()
+        tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+        tmp.close()
+        with wave.open(tmp.name, "wb") as w:
+            w.setnchannels(channels)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(synth_effect('sine', 220, 330, int(seconds * 1000), 0.2, rate, channels))
+        path = AUDIO.music_files[1] = tmp.name
+    t0 = time.perf_counter()
+    AUDIO.play_music(1)
+    start_ms = (time.perf_counter() - t0) * 1000
+    busy = pygame.mixer.music.get_busy()
+    AUDIO.stop_music()
+    if tmp:
+        os.remove(tmp.name)
+    return os.path.basename(path), start_ms, busy
+
+def main():
+    ap = argparse.ArgumentParser(description="Exercise the audio layer under the SDL dummy driver and report trigger latency.")
+    ap.add_argument("--seconds", type=float, default=10.0, help="simulated play time at 60 fps")
+    ap.add_argument("--rate", type=float, default=4.0, help="single sounds per second")
+    ap.add_argument("--burst", type=int, default=12, help="sounds fired in the same frame during a burst")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    pygame.mixer.pre_init(AUDIO_RATE, -16, 2, AUDIO_BUFFER)
+    pygame.init()
+    print(f"[audio] driver {os.environ['SDL_AUDIODRIVER']}, mixer {pygame.mixer.get_init()}")
+    if not AUDIO.load():
+        return 1
+    sys.addaudithook(audit)
+    rng = random.Random(args.seed)
+    frames = int(args.seconds * 60)
+    triggers = 0
+    t0 = time.perf_counter()
+    COUNTING[0] = True
+    for i, batch in enumerate(trigger_pattern(rng, frames, args.rate, args.burst)):
+        for name in batch:
+            AUDIO.play(name)
+        triggers += len(batch)
+        delay = t0 + (i + 1) / 60 - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    COUNTING[0] = False
+    print(f"[audio] {triggers} triggers over {frames} frames in {time.perf_counter() - t0:.2f} s, "
+          f"{OPENS[0]} file opens/listings during triggers")
+    print(f"[audio] {AUDIO.summary()}")
+    name, start_ms, busy = stream_check(2)
+    print(f"[audio] music stream {name}: started in {start_ms:.1f} ms, playing {busy}")
+    pygame.quit()
+    return 0 if OPENS[0] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,350 @@
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import sqlite3
+import time
+
+import aaa_full as game
+from aaa_full import BattleSim, CLASS_STATS, TOWER_FLOORS, roll_enemy_move
+
+CACHE_FILE = "balance_cache.db"
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS params (hash TEXT PRIMARY KEY, json TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS evals (
+    hash TEXT NOT NULL, cls TEXT NOT NULL, batch INTEGER NOT NULL, runs INTEGER NOT NULL,
+    seed INTEGER NOT NULL, floors INTEGER NOT NULL, reached TEXT NOT NULL, cleared TEXT NOT NULL,
+    PRIMARY KEY (hash, cls, batch, runs, seed, floors));
+"""
+CLASSES = ('Warrior', 'Mage', 'Archer', 'Tank')
+# chance to clear floor N having reached it
+DEFAULT_TARGET = (0.97, 0.94, 0.9, 0.86, 0.82, 0.77, 0.72, 0.65)
+MAX_TURNS = 200
+MUTATE_TRIES = 50  # mutation attempts per requested candidate
+HEAL_BELOW = 0.35
+DAMAGE_SKILLS = {'warrior': ('skill1',), 'mage': ('skill1', 'skill2'), 'archer': ('skill1', 'skill2'), 'tank': ()}
+# --tune group: key prefix
+GROUPS = {'enemy-hp': 'hp.', 'enemy-mp': 'mp.', 'floor-step': 'floor_hp_step', 'skills': 'dmg.',
+          'heal': 'heal', 'rewards': 'reward.'}
+BASE_ROSTER = game.ENEMY_ROSTER
+
+# -------------------------
+# Parameters <-> game globals
+# -------------------------
+def current_params():
+    p = {}
+    for name, hp, mp, prefix in game.ENEMY_ROSTER:
+        p['hp.' + prefix] = hp
+        p['mp.' + prefix] = mp
+    p['floor_hp_step'] = game.FLOOR_HP_STEP
+    for (cls, action), rng in game.SKILL_DAMAGE.items():
+        p[f'dmg.{cls}.{action}'] = list(rng)
+    p['heal'] = list(game.PLAYER_HEAL)
+    p['reward.max_hp'] = game.REWARD_MAX_HP
+    p['reward.max_mp'] = game.REWARD_MAX_MP
+    p['reward.crit'] = game.REWARD_CRIT
+    return p
+
+def apply_params(p):
+    game.ENEMY_ROSTER = tuple((name, p['hp.' + prefix], p['mp.' + prefix], prefix) for name, _, _, prefix in BASE_ROSTER)
+    game.FLOOR_HP_STEP = p['floor_hp_step']
+    game.SKILL_DAMAGE = {tuple(k.split('.')[1:]): tuple(v) for k, v in p.items() if k.startswith('dmg.')}
+    game.PLAYER_HEAL = tuple(p['heal'])
+    game.REWARD_MAX_HP = p['reward.max_hp']
+    game.REWARD_MAX_MP = p['reward.max_mp']
+    game.REWARD_CRIT = p['reward.crit']
+
+def param_hash(p):
+    return hashlib.sha1(json.dumps(p, sort_keys=True).encode()).hexdigest()[:16]
+
+def mutate(center, rng, sigma, rate, tuned):
+    # log-normal scaling of a random subset; ranges scale both ends together
+    out = {}
+    for k, v in center.items():
+        if not k.startswith(tuned) or rng.random() >= rate:
+            out[k] = v
+            continue
+        f = math.exp(rng.gauss(0, sigma))
+        if isinstance(v, list):
+            out[k] = [max(1, round(x * f)) for x in v]
+        elif isinstance(v, int):
+            out[k] = max(1, round(v * f))
+        else:
+            out[k] = round(v * f, 4)
+    out['reward.crit'] = min(out['reward.crit'], game.MAX_CRIT)
+    return out
+
+# -------------------------
+# Headless tower runs
+# -------------------------
+def choose_action(s):
+    acts = s.legal_player_actions()
+    if 'ultimate' in acts:
+        return 'ultimate'
+    if 'heal' in acts and s.p_hp < HEAL_BELOW * s.p_max_hp:
+        return 'heal'
+    if s.cls == 'warrior' and 'skill2' in acts and s.rage >= 60:
+        return 'skill2'
+    for a in DAMAGE_SKILLS.get(s.cls, ()):
+        if a in acts:
+            return a
+    return 'attack'
+
+def next_floor(prev, class_type, floor):
+    # HP, MP, rage, crit and statuses carry over; the enemy is fresh
+    s = BattleSim.for_floor(class_type, floor)
+    if prev is not None:
+        s.p_hp, s.p_max_hp, s.p_mp, s.p_max_mp = prev.p_hp, prev.p_max_hp, prev.p_mp, prev.p_max_mp
+        s.rage, s.crit, s.p_status = prev.rage, prev.crit, prev.p_status
+    return s
+
+def take_reward(s, rng):
+    pick = rng.randrange(3)
+    if pick == 0:
+        s.p_max_hp += game.REWARD_MAX_HP
+        s.p_hp += game.REWARD_MAX_HP
+    elif pick == 1:
+        s.p_max_mp += game.REWARD_MAX_MP
+        s.p_mp += game.REWARD_MAX_MP
+    else:
+        s.crit = min(game.MAX_CRIT, s.crit + game.REWARD_CRIT)
+
+def play_run(class_type, floors, rng):
+    # last floor cleared; a fight over MAX_TURNS counts as a loss
+    s = None
+    for floor in range(1, floors + 1):
+        s = next_floor(s, class_type, floor)
+        for _ in range(MAX_TURNS):
+            s.step_player(choose_action(s), rng)
+            if s.winner is None:
+                s.step_enemy(roll_enemy_move(s.e_prefix, s.e_mp, rng), rng)
+            if s.winner is not None:
+                break
+        if s.winner != 'player':
+            return floor - 1
+        take_reward(s, rng)
+    return floors
+
+def batch_seed(seed, class_type, batch):
+    # common random numbers: every candidate plays the same seeds
+    return seed * 1000003 + batch * 16 + CLASSES.index(class_type)
+
+def evaluate_batch(task):
+    h, params, class_type, batch, runs, seed, floors = task
+    apply_params(params)
+    rng = random.Random(batch_seed(seed, class_type, batch))
+    reached = [0] * floors
+    cleared = [0] * floors
+    for _ in range(runs):
+        last = play_run(class_type, floors, rng)
+        for f in range(min(last + 1, floors)):
+            reached[f] += 1
+        for f in range(last):
+            cleared[f] += 1
+    return (h, class_type, batch, runs, seed, floors), reached, cleared
+
+# -------------------------
+# Evaluation cache (SQLite, one row per batch)
+# -------------------------
+class EvalCache:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(CACHE_SCHEMA)
+        self.hits = 0
+    def get(self, key):
+        row = self.conn.execute("SELECT reached, cleared FROM evals WHERE hash=? AND cls=? AND batch=? AND runs=? "
+                                "AND seed=? AND floors=?", key).fetchone()
+        return None if row is None else (json.loads(row[0]), json.loads(row[1]))
+    def put(self, key, params, reached, cleared):
+        # committed per batch so an interrupted search loses at most the batches in flight
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO params VALUES (?, ?)", (key[0], json.dumps(params, sort_keys=True)))
+            self.conn.execute("INSERT OR REPLACE INTO evals VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              key + (json.dumps(reached), json.dumps(cleared)))
+    def close(self):
+        self.conn.close()
+
+class Evaluator:
+    def __init__(self, cache, pool, classes, runs, seed, floors):
+        self.cache = cache
+        self.pool = pool
+        self.classes = classes
+        self.runs = runs
+        self.seed = seed
+        self.floors = floors
+        self.batches_run = 0
+    def rates(self, candidates, batches):
+        # {hash: {class: [clear rate per floor]}} over batches 0..batches-1
+        todo = []
+        totals = {}
+        for p in candidates:
+            h = param_hash(p)
+            for cls in self.classes:
+                for b in range(batches):
+                    key = (h, cls, b, self.runs, self.seed, self.floors)
+                    got = self.cache.get(key)
+                    if got is None:
+                        todo.append((h, p, cls, b, self.runs, self.seed, self.floors))
+                    else:
+                        self._add(totals, key, *got)
+                        self.cache.hits += 1
+        params = {param_hash(p): p for p in candidates}
+        results = self.pool.imap_unordered(evaluate_batch, todo) if self.pool else map(evaluate_batch, todo)
+        for key, reached, cleared in results:
+            self.cache.put(key, params[key[0]], reached, cleared)
+            self._add(totals, key, reached, cleared)
+            self.batches_run += 1
+        return {h: {cls: [c / r if r else 0.0 for r, c in zip(*counts)] for cls, counts in per_cls.items()}
+                for h, per_cls in totals.items()}
+    def _add(self, totals, key, reached, cleared):
+        h, cls = key[0], key[1]
+        r, c = totals.setdefault(h, {}).setdefault(cls, ([0] * self.floors, [0] * self.floors))
+        for f in range(self.floors):
+            r[f] += reached[f]
+            c[f] += cleared[f]
+
+def loss(rates, targets):
+    return sum((got - want) ** 2 for cls, per_floor in rates.items() for got, want in zip(per_floor, targets[cls]))
+
+# -------------------------
+# Successive halving
+# -------------------------
+def halving_round(evaluator, candidates, targets, eta, batches):
+    # every rung keeps the best 1/eta and gives them eta times the runs;
+    # rungs reuse the batches already cached for lower rungs
+    while True:
+        rates = evaluator.rates(candidates, batches)
+        scored = sorted(candidates, key=lambda p: loss(rates[param_hash(p)], targets))
+        if len(scored) == 1:
+            return scored[0], rates[param_hash(scored[0])], batches
+        candidates = scored[:max(1, len(scored) // eta)]
+        batches *= eta
+
+def search(evaluator, start, targets, args, tuned):
+    rng = random.Random(args.seed)
+    best = start
+    sigma = args.sigma
+    for gen in range(args.generations):
+        t0 = time.perf_counter()
+        candidates = [best]
+        seen = {param_hash(best)}
+        # a small tuned set at a small sigma may round back to the same few
+        # values; go on with the distinct candidates found
+        for _ in range(MUTATE_TRIES * args.candidates):
+            if len(candidates) >= args.candidates:
+                break
+            p = mutate(best, rng, sigma, args.mutate, tuned)
+            if param_hash(p) not in seen:
+                seen.add(param_hash(p))
+                candidates.append(p)
+        if len(candidates) < args.candidates:
+            print(f"[balance] generation {gen + 1}: only {len(candidates) - 1} distinct mutations found")
+        winner, rates, batches = halving_round(evaluator, candidates, targets, args.eta, args.batches)
+        moved = "kept" if winner is best else "moved"
+        best = winner
+        print(f"[balance] generation {gen + 1}/{args.generations}: loss {loss(rates, targets):.4f} over "
+              f"{batches * evaluator.runs} runs/class, {moved}, sigma {sigma:.3f}, {time.perf_counter() - t0:.1f} s")
+        sigma *= args.decay
+    return best, batches
+
+# -------------------------
+# Report
+# -------------------------
+def print_curves(rates, targets, floors):
+    print(f"{'class':8} " + " ".join(f"{'F' + str(f + 1):>11}" for f in range(floors)))
+    for cls, per_floor in rates.items():
+        print(f"{cls:8} " + " ".join(f"{got * 100:5.1f}/{want * 100:4.0f}%" for got, want in zip(per_floor, targets[cls])))
+
+def print_constants(p):
+    print("ENEMY_ROSTER = (")
+    for name, _, _, prefix in BASE_ROSTER:
+        print(f"    ({name!r}, {p['hp.' + prefix]}, {p['mp.' + prefix]}, {prefix!r}),")
+    print(")")
+    print(f"FLOOR_HP_STEP = {p['floor_hp_step']}")
+    print(f"PLAYER_HEAL = ({p['heal'][0]}, {p['heal'][1]})")
+    print("SKILL_DAMAGE = {")
+    for k, v in p.items():
+        if k.startswith('dmg.'):
+            cls, action = k.split('.')[1:]
+            print(f"    ({cls!r}, {action!r}): ({v[0]}, {v[1]}),")
+    print("}")
+    print(f"REWARD_MAX_HP = {p['reward.max_hp']}")
+    print(f"REWARD_MAX_MP = {p['reward.max_mp']}")
+    print(f"REWARD_CRIT = {p['reward.crit']}")
+
+def load_targets(path, classes, floors):
+    # JSON {class: [clear chance per floor]}; missing classes use the default curve
+    given = {}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            given = json.load(f)
+    targets = {}
+    for cls in classes:
+        curve = list(given.get(cls, DEFAULT_TARGET))
+        if len(curve) < floors:
+            raise SystemExit(f"[balance] target curve for {cls} has {len(curve)} floors, need {floors}")
+        targets[cls] = curve[:floors]
+    return targets
+
+# -------------------------
+# CLI
+# -------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Search enemy stats, floor scaling, skill damage, heal and reward sizes "
+                                             "so simulated tower runs match a target clear-rate curve per class and floor.")
+    ap.add_argument("--targets", help="JSON file {class: [clear chance per floor]}")
+    ap.add_argument("--classes", nargs="*", default=list(CLASSES), choices=sorted(CLASS_STATS))
+    ap.add_argument("--floors", type=int, default=TOWER_FLOORS)
+    ap.add_argument("--tune", nargs="+", default=list(GROUPS), choices=list(GROUPS))
+    ap.add_argument("--generations", type=int, default=10)
+    ap.add_argument("--candidates", type=int, default=32, help="candidates per generation, the first is the current best")
+    ap.add_argument("--eta", type=int, default=2, help="halving factor per rung")
+    ap.add_argument("--batches", type=int, default=1, help="batches per candidate and class on the first rung")
+    ap.add_argument("--runs", type=int, default=100, help="tower runs per batch")
+    ap.add_argument("--sigma", type=float, default=0.15, help="log-scale step of a mutated parameter")
+    ap.add_argument("--decay", type=float, default=0.8, help="sigma multiplier per generation")
+    ap.add_argument("--mutate", type=float, default=0.3, help="chance each tuned parameter changes")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--cache", default=CACHE_FILE)
+    ap.add_argument("--out", help="write the best parameters as JSON")
+    args = ap.parse_args()
+    if args.eta < 2:
+        ap.error("--eta must be at least 2")
+
+    targets = load_targets(args.targets, args.classes, args.floors)
+    tuned = tuple(GROUPS[g] for g in args.tune)
+    start = current_params()
+    cache = EvalCache(args.cache)
+    pool = multiprocessing.Pool(args.jobs) if args.jobs > 1 else None
+    t0 = time.perf_counter()
+    try:
+        evaluator = Evaluator(cache, pool, args.classes, args.runs, args.seed, args.floors)
+        print(f"[balance] {len(args.classes)} classes x {args.floors} floors, tuning {', '.join(args.tune)}, "
+              f"{args.jobs} worker(s), cache {args.cache}")
+        best, final_batches = search(evaluator, start, targets, args, tuned)
+        # current values against the winner on the winner's final sample
+        rates = evaluator.rates([start, best], final_batches)
+    finally:
+        # also stops queued batches on Ctrl+C; finished ones are already cached
+        if pool:
+            pool.terminate()
+    print(f"[balance] {evaluator.batches_run} batches simulated, {cache.hits} cache hits, "
+          f"{time.perf_counter() - t0:.1f} s")
+    cache.close()
+    for label, p in (("current", start), ("best", best)):
+        r = rates[param_hash(p)]
+        print(f"[balance] {label}: loss {loss(r, targets):.4f} ({final_batches * args.runs} runs/class), clear % / target")
+        print_curves(r, targets, args.floors)
+    print_constants(best)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(best, f, indent=1, sort_keys=True)
+        print(f"[balance] Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from aaa_full import (GREEN, GROUND_Y, HEIGHT, SPRITE_H, SPRITE_W, WIDTH, BattleStage, Character, FLOOR_ASSETS,
+                      TIMELINE, floor_background_prefix, get_font, spawn_encounter, try_load_image_fuzzy, draw_battle_sprites)
+
+# -------------------------
+# Pre-stage 1v1 renderer, kept for comparison
+# -------------------------
+def legacy_draw(surface, player, enemy, top, font, message, floor):
+    bg_h = GROUND_Y - top
+    bg_surf = FLOOR_ASSETS.get(floor_background_prefix(floor), (WIDTH, bg_h))
+    surface.blit(bg_surf, (0, top))
+    player.pos[0], player.pos[1] = WIDTH // 4, GROUND_Y - SPRITE_H//2
+    enemy.pos[0], enemy.pos[1] = WIDTH * 3 // 4, GROUND_Y - SPRITE_H//2
+    enemy.is_flipped = True
+    s = pygame.Surface((160, 26), pygame.SRCALPHA)
+    pygame.draw.ellipse(s, (0,0,0,120), (0,0,160,26))
+    surface.blit(s, (player.pos[0]-80, GROUND_Y - 18))
+    surface.blit(s, (enemy.pos[0]-80, GROUND_Y - 18))
+    for c in (player, enemy):
+        img = c.image
+        if c.is_flipped:
+            img = pygame.transform.flip(img, True, False)
+        surface.blit(img, img.get_rect(center=(c.pos[0] + c.offset_x, c.pos[1])))
+    msg = font.render(message, True, (245,245,245))
+    surface.blit(msg, (WIDTH//2 - msg.get_width()//2, top + 8))
+
+# -------------------------
+# Benchmark
+# -------------------------
+def run(label, frames, chars, draw):
+    # turn-based pattern: characters attack one after another, with a short
+    # idle gap between turns
+    rng = random.Random(1)
+    turn, idle = 0, 0
+    t0 = time.perf_counter()
+    for i in range(frames):
+        if all(c.anim_timer == 0 for c in chars):
+            idle += 1
+            if idle > rng.randint(5, 20):
+                chars[turn % len(chars)].play_attack(600)
+                turn += 1
+                idle = 0
+        TIMELINE.update(16)
+        draw()
+    ms = (time.perf_counter() - t0) * 1000 / frames
+    print(f"{label:28} {ms:7.3f} ms/frame")
+    return ms
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare battle sprite rendering: legacy 1v1 vs LayeredDirty stage.")
+    ap.add_argument("--frames", type=int, default=2000)
+    ap.add_argument("--floor", type=int, default=3)
+    args = ap.parse_args()
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    font = get_font(20)
+    player = Character("Bench", GREEN, (0, 0), image_surface=try_load_image_fuzzy("warrior", (SPRITE_W, SPRITE_H)), prefix="warrior")
+
+    enemy = spawn_encounter(args.floor, 1)[0]
+    base = run("legacy 1v1 (direct blits)", args.frames, [player, enemy],
+               lambda: legacy_draw(screen, player, enemy, 140, font, "bench", args.floor))
+    results = {}
+    for n in (1, 6):
+        enemies = spawn_encounter(11, n)
+        stage = BattleStage(player, enemies, args.floor)
+        results[n] = run(f"stage {n} enemies (LayeredDirty)", args.frames, [player] + enemies,
+                         lambda: draw_battle_sprites(screen, stage, font, "bench", enemies[0]))
+    print(f"6 enemies vs legacy 1v1: {(results[6] / base - 1) * 100:+.1f}%")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from aaa_full import ALLOCS, GLYPH_LABELS, HEIGHT, WIDTH, get_font, glyph_atlas
+
+# -------------------------
+# Workload: the numbers a battle actually shows
+# -------------------------
+STYLES = ((22, (255,20,20)), (36, (255,180,0)), (22, (46,204,113)), (12, (20,20,20)), (13, (255,200,120)))
+
+def battle_strings(rng, n):
+    out = []
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.45:
+            out.append(str(rng.randint(1, 999)))
+        elif r < 0.6:
+            out.append("CRIT! " + str(rng.randint(20, 999)))
+        elif r < 0.75:
+            out.append("+" + str(rng.randint(1, 60)))
+        elif r < 0.9:
+            out.append(f"RAGE {rng.randint(0, 100)}/100")
+        else:
+            out.append(rng.choice(GLYPH_LABELS))
+    return out
+
+# -------------------------
+# Checks and benchmark
+# -------------------------
+def max_diff(font, color, text):
+    # atlas output vs font.render, both over the same opaque background
+    w, h = font.size(text)
+    ref = pygame.Surface((w + 8, h)).convert()
+    got = ref.copy()
+    ref.fill((30, 40, 50))
+    got.fill((30, 40, 50))
+    ref.blit(font.render(text, True, color), (4, 0))
+    glyph_atlas(font, color).draw(got, text, (4, 0))
+    a, b = pygame.surfarray.array3d(ref), pygame.surfarray.array3d(got)
+    return int(abs(a.astype(int) - b.astype(int)).max()) if a.size else 0
+
+def run(strings, hold, draw, chunk=250):
+    # seconds taken by each run of `chunk` strings, every string staying on
+    # screen for `hold` consecutive draws
+    times = []
+    for start in range(0, len(strings), chunk):
+        part = strings[start:start + chunk]
+        t0 = time.perf_counter()
+        for i, (text, font, color, atlas) in enumerate(part, start):
+            x, y = (i * 37) % (WIDTH - 200), (i * 53) % (HEIGHT - 40)
+            for _ in range(hold):
+                draw(text, font, color, atlas, x, y)
+        times.append(time.perf_counter() - t0)
+    return times
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare drawing battle numbers through the glyph atlas with font.render.")
+    ap.add_argument("--strings", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    rng = random.Random(args.seed)
+    strings = battle_strings(rng, args.strings)
+
+    # each style holds its font and its atlas, as FloatingText does
+    def with_render(text, font, color, atlas, x, y):
+        screen.blit(font.render(text, True, color), (x, y))
+    def with_atlas(text, font, color, atlas, x, y):
+        atlas.draw(screen, text, (x, y))
+    def styled(styles):
+        pick = random.Random(args.seed)
+        return [(t,) + pick.choice(styles) for t in strings]
+
+    styles = [(get_font(size), color) for size, color in STYLES]
+    styles = [(font, color, glyph_atlas(font, color)) for font, color in styles]
+    work = styled(styles)
+    worst = max(max_diff(font, color, text) for text, font, color, _ in work[:500])
+    print(f"[glyphs] max channel difference vs font.render over 500 strings: {worst}")
+    # one untimed pass each, so both start with the font's glyph cache filled;
+    # then --repeat alternating passes over the whole workload, keeping each
+    # chunk's best time, so a burst of scheduler noise spoils only the chunks
+    # it lands in
+    run(work, 1, with_render)
+    run(work, 1, with_atlas)
+    slower = []
+    for hold, label in ((1, "new string every draw"), (60, "string held 60 draws")):
+        times = {with_render: [], with_atlas: []}
+        for _ in range(args.repeat):
+            for draw in times:
+                times[draw].append(run(work, hold, draw))
+        base, atlas = (sum(map(min, zip(*times[draw]))) * 1e6 / (len(work) * hold) for draw in times)
+        print(f"{label:22} font.render {base:6.2f} us  atlas {atlas:6.2f} us  ({(atlas / base - 1) * 100:+.1f}%)")
+        if atlas > base:
+            slower.append(label)
+
+    # allocation count under the probe, with fonts created after it is installed
+    ALLOCS.install()
+    styles = [(get_font(size, prefer_family="glyphbench"), color) for size, color in STYLES]
+    styles = [(font, color, glyph_atlas(font, color)) for font, color in styles]
+    work = styled(styles)
+    for label, draw in (("font.render", with_render), ("atlas", with_atlas)):
+        ALLOCS.begin_frame()
+        before = ALLOCS.total_count
+        run(work, 1, draw)
+        ALLOCS.begin_frame()
+        print(f"{label:12} {ALLOCS.total_count - before} surfaces allocated for {len(work)} draws")
+    pygame.quit()
+    if slower:
+        print(f"[glyphs] FAIL: atlas slower than font.render ({', '.join(slower)})")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
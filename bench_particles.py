@@ -0,0 +1,62 @@
+import argparse
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from aaa_full import HEIGHT, PARTICLE_PRESETS, WIDTH, ParticleSystem, np
+
+# -------------------------
+# Benchmark
+# -------------------------
+def run(screen, background, count, frames):
+    system = ParticleSystem(capacity=count)
+    presets = ('inferno', 'arrows', 'burn', 'poison', 'hit')
+    i = 0
+    # refill every frame so the system stays at capacity for the whole run
+    upd = draw = 0.0
+    frame_worst = 0.0
+    for _ in range(frames):
+        t0 = time.perf_counter()
+        while system.active < count:
+            before = system.active
+            system.emit(presets[i % len(presets)], WIDTH * 3 // 4, HEIGHT // 2)
+            i += 1
+            if system.active == before:
+                break
+        t1 = time.perf_counter()
+        system.update(16)
+        t2 = time.perf_counter()
+        screen.blit(background, (0, 0))
+        system.draw(screen)
+        t3 = time.perf_counter()
+        upd += t2 - t1
+        draw += t3 - t2
+        frame_worst = max(frame_worst, (t3 - t0) * 1000)
+    upd_ms = upd * 1000 / frames
+    draw_ms = draw * 1000 / frames
+    rate = count / upd_ms if upd_ms else float('inf')
+    print(f"{count:7d} particles  update {upd_ms:6.3f} ms ({rate:10.0f} particles/ms)  "
+          f"draw {draw_ms:6.3f} ms  worst frame {frame_worst:6.2f} ms  {'OK' if frame_worst < 16 else 'OVER 16 ms'}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure particle update throughput and frame cost.")
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--counts", nargs="*", type=int, default=[500, 2000, 5000, 10000, 20000])
+    args = ap.parse_args()
+    if np is None:
+        print("[particles] NumPy is not installed; the particle system is disabled.")
+        return
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    background = pygame.Surface((WIDTH, HEIGHT)).convert()
+    background.fill((14, 18, 22))
+    print("presets: " + ", ".join(f"{k} {v[0]}" for k, v in PARTICLE_PRESETS.items()))
+    for count in args.counts:
+        run(screen, background, count, args.frames)
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
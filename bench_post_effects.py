@@ -0,0 +1,116 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from aaa_full import (DEFEAT_BRIGHTNESS, FLASH_ALPHA, FLASH_COLOR, GREEN, HEIGHT, LUMA, POST_STEPS, SPRITE_H, SPRITE_W,
+                      STATUS_TINTS, WIDTH, BattleStage, Character, PostEffects, np, spawn_encounter, try_load_image_fuzzy)
+
+BUDGET_MS = 2.0
+
+# -------------------------
+# Reference results in floating point
+# -------------------------
+def reference_blend(rgb, color, steps):
+    a = steps / POST_STEPS
+    return rgb * (1 - a) + np.asarray(color, np.float64) * a
+
+def reference_desaturate(rgb, brightness):
+    grey = (rgb @ (np.asarray(LUMA, np.float64) / 256)) * brightness
+    return np.repeat(grey[..., None], 3, axis=2)
+
+def max_error(surface, want):
+    got = pygame.surfarray.array3d(surface).astype(np.float64)
+    return float(np.abs(got - want).max())
+
+# -------------------------
+# Benchmark
+# -------------------------
+def timed(frame, work, frames, fn):
+    # avg, p99 and worst ms; the budget is checked against p99, so slow
+    # frames that come back (a cache built mid-battle) fail it, while the
+    # worst frame alone can still be one scheduler hiccup
+    times = []
+    for _ in range(frames):
+        work.blit(frame, (0, 0))
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return sum(times) / frames, times[min(frames - 1, int(frames * 0.99))], times[-1]
+
+def main():
+    ap = argparse.ArgumentParser(description="Time each full-screen post effect on a battle frame and check it "
+                                             f"against a float reference (budget {BUDGET_MS} ms per effect).")
+    ap.add_argument("--frames", type=int, default=300)
+    args = ap.parse_args()
+    if np is None:
+        print("[post] NumPy is not installed; post effects are disabled.")
+        return 0
+    pygame.init()
+    pygame.display.set_mode((WIDTH, HEIGHT))
+    frame = pygame.Surface((WIDTH, HEIGHT)).convert()
+    player = Character("Bench", GREEN, (0, 0), image_surface=try_load_image_fuzzy("warrior", (SPRITE_W, SPRITE_H)), prefix="warrior")
+    stage = BattleStage(player, spawn_encounter(3, 3), 3)
+    frame.fill((8, 10, 12))
+    stage.draw(frame)
+    work = frame.copy()
+    post = PostEffects(work)
+    if not post.enabled:
+        print("[post] canvas format not supported; post effects are disabled.")
+        return 0
+    rgb = pygame.surfarray.array3d(frame).astype(np.float64)
+    flash_steps = round(FLASH_ALPHA[1] * POST_STEPS)
+    tint_color, tint_alpha = STATUS_TINTS['poison']
+    tint_steps = round(tint_alpha * POST_STEPS)
+
+    def with_pixels(fn):
+        def run():
+            px = pygame.surfarray.pixels2d(work)
+            fn(px)
+            del px
+        return run
+
+    def everything():
+        # worst battle frame: poison and burn, a fresh hit and the vignette at full strength
+        player.status_effects.update(poison=2, burn=2)
+        player.hp = 1
+        post.flash = FLASH_ALPHA[1]
+        post.apply(work, player)
+
+    cases = [
+        ("damage flash", with_pixels(lambda px: post.blend(px, FLASH_COLOR, flash_steps)),
+         lambda: reference_blend(rgb, FLASH_COLOR, flash_steps)),
+        ("poison tint", with_pixels(lambda px: post.blend(px, tint_color, tint_steps)),
+         lambda: reference_blend(rgb, tint_color, tint_steps)),
+        # every strength in turn, as the pulse does at low HP
+        ("low HP vignette", with_pixels(lambda px, s=itertools.cycle(range(1, POST_STEPS + 1)): post.vignette(px, next(s))),
+         None),
+        ("defeat desaturate", with_pixels(lambda px: post.desaturate(px, DEFEAT_BRIGHTNESS)),
+         lambda: reference_desaturate(rgb, DEFEAT_BRIGHTNESS)),
+        ("all battle effects", everything, None),
+    ]
+    print(f"[post] {WIDTH}x{HEIGHT} frame, {args.frames} frames per effect, {POST_STEPS} blend steps")
+    ok = True
+    for name, fn, reference in cases:
+        avg, p99, worst = timed(frame, work, args.frames, fn)
+        err = ""
+        if reference is not None:
+            work.blit(frame, (0, 0))
+            fn()
+            err = f"  max error {max_error(work, reference()):4.1f}/255"
+        # the combined frame is several effects, the budget is per effect
+        verdict = "" if fn is everything else "OK" if p99 < BUDGET_MS else "OVER"
+        ok &= verdict != "OVER"
+        print(f"{name:20} avg {avg:6.3f} ms  p99 {p99:6.3f} ms  worst {worst:6.3f} ms  {verdict}{err}")
+    stage.close()
+    pygame.quit()
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from aaa_full import HISTORY_SCHEMA, LEADERBOARD_PAGE, RunHistory, TOWER_FLOORS, run_score
+
+CLASSES = ('Warrior', 'Mage', 'Tank', 'Archer')
+REWARDS = ('Max HP +15', 'Max MP +10', '+5% Crit Chance')
+
+# -------------------------
+# Synthetic data
+# -------------------------
+def fill(path, runs, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(HISTORY_SCHEMA)
+    t0 = time.perf_counter()
+    floors_total = 0
+    chunk = 50000
+    now = time.time()
+    for start in range(1, runs + 1, chunk):
+        run_rows, floor_rows = [], []
+        for run_id in range(start, min(runs, start + chunk - 1) + 1):
+            cleared = min(TOWER_FLOORS, int(rng.expovariate(0.45)))
+            turns = 0
+            for f in range(1, cleared + 1):
+                t = rng.randint(2, 5 + f * 2)
+                turns += t
+                floor_rows.append((run_id, f, t, rng.randint(1, 200), rng.choice(REWARDS)))
+            outcome = 'cleared' if cleared == TOWER_FLOORS else rng.choice(('defeat', 'defeat', 'abandoned'))
+            turns += rng.randint(0, 6) if outcome != 'cleared' else 0
+            run_rows.append((run_id, f"P{run_id}", rng.choice(CLASSES), 0, now, now, cleared, turns, outcome,
+                             run_score(cleared, turns)))
+        with conn:
+            conn.executemany("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", run_rows)
+            conn.executemany("INSERT INTO floors VALUES (?, ?, ?, ?, ?)", floor_rows)
+        floors_total += len(floor_rows)
+    conn.execute("ANALYZE")
+    conn.close()
+    return time.perf_counter() - t0, floors_total
+
+# -------------------------
+# Query latency
+# -------------------------
+def timed(label, fn, reps):
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    print(f"{label:34} p50 {statistics.median(samples):8.1f} us   p99 {samples[int(len(samples) * 0.99) - 1]:8.1f} us")
+
+def main():
+    ap = argparse.ArgumentParser(description="Load synthetic runs into the run-history schema and time the game's queries.")
+    ap.add_argument("--runs", type=int, default=1_000_000)
+    ap.add_argument("--reps", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--db", help="database file (default: a temporary file, removed afterwards)")
+    args = ap.parse_args()
+    tmpdir = None
+    path = args.db
+    if path is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, "runs.db")
+    load_s, floors = fill(path, args.runs, args.seed)
+    print(f"[bench] loaded {args.runs} runs and {floors} floor rows in {load_s:.1f} s "
+          f"({os.path.getsize(path) / 1048576:.0f} MB)")
+
+    history = RunHistory(path)
+    for sql in ("SELECT id FROM runs WHERE class = 'Mage' AND outcome != 'in_progress' ORDER BY score DESC, id DESC LIMIT 10",
+                "SELECT id FROM runs WHERE class = 'Mage' AND outcome != 'in_progress' AND (score, id) < (1, 2) "
+                "ORDER BY score DESC, id DESC LIMIT 10",
+                "SELECT reward, runs, turns_sum * 1.0 / runs FROM floor_stats WHERE floor = 5 AND runs > 0"):
+        plan = " | ".join(row[-1] for row in history.reader.execute("EXPLAIN QUERY PLAN " + sql))
+        print(f"[plan] {plan}")
+
+    timed("leaderboard first page", lambda: history.leaderboard_page('Mage'), args.reps)
+    cursor = None
+    for _ in range(1000):
+        rows = history.leaderboard_page('Mage', cursor)
+        cursor = (rows[-1][5], rows[-1][0])
+    timed("leaderboard page 1001 (keyset)", lambda: history.leaderboard_page('Mage', cursor), args.reps)
+    offset = 1000 * LEADERBOARD_PAGE
+    timed("same page via OFFSET (for contrast)", lambda: history.reader.execute(
+        "SELECT id FROM runs WHERE class = 'Mage' AND outcome != 'in_progress' "
+        "ORDER BY score DESC, id DESC LIMIT ? OFFSET ?", (LEADERBOARD_PAGE, offset)).fetchall(), max(10, args.reps // 10))
+    timed("floor stats (floor 5)", lambda: history.floor_stats(5), args.reps)
+    print(f"[bench] floor 5 rewards: {history.floor_stats(5)}")
+
+    # start_run writes its row in place (SQLite assigns the id), the rest only queue
+    started = queued = 0.0
+    for i in range(1000):
+        t0 = time.perf_counter()
+        rid = history.start_run(f"bench{i}", 'Tank', False)
+        t1 = time.perf_counter()
+        history.floor_cleared(rid, 1, 4, 100)
+        history.reward(rid, 1, REWARDS[0])
+        history.end_run(rid, 'defeat', 1, 7)
+        started += t1 - t0
+        queued += time.perf_counter() - t1
+    history.close()
+    print(f"[bench] game-thread cost: start_run {started * 1e3:.1f} us, other history calls "
+          f"{queued * 1e6 / 3000:.1f} us; {history.summary()}")
+    if tmpdir:
+        tmpdir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import math
+import os
+import random
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from aaa_full import GREEN, HEIGHT, SPRITE_H, SPRITE_W, TIMELINE, WIDTH, Character, FloatingText, get_font, make_frames
+
+# -------------------------
+# Pre-timeline animation, kept for comparison
+# -------------------------
+class LegacyAnimatedSprite:
+    def __init__(self, frames, frame_time=150):
+        self.frames = frames
+        self.frame_time = frame_time
+        self.current = 0
+        self.timer = 0
+    def update(self, dt):
+        self.timer += dt
+        if self.timer >= self.frame_time:
+            self.timer -= self.frame_time
+            self.current = (self.current + 1) % len(self.frames)
+
+class LegacyCharacter:
+    def __init__(self, image):
+        self.image = image
+        self.anims = [LegacyAnimatedSprite(make_frames(GREEN, pose), ft)
+                      for pose, ft in (('idle', 200), ('attack', 120), ('hurt', 180), ('idle', 200))]
+        self.state = 'idle'
+        self.anim_timer = 0
+        self.attack_duration = 500
+        self.hurt_duration = 600
+        self.offset_x = 0
+    def play_attack(self, duration):
+        self.state = 'attack'
+        self.anim_timer = self.attack_duration = duration
+    def update(self, dt):
+        for a in self.anims:
+            a.update(dt)
+        if self.anim_timer > 0:
+            self.anim_timer = max(0, self.anim_timer - dt)
+            if self.image is not None and self.state == 'attack':
+                prog = 1.0 - (self.anim_timer / self.attack_duration)
+                self.offset_x = int(18 * math.sin(prog * math.pi))
+            else:
+                self.offset_x = 0
+        if self.anim_timer == 0 and self.state != 'idle':
+            self.state = 'idle'
+            self.offset_x = 0
+
+class LegacyFloatingText:
+    def __init__(self, x, y, value, color, duration=1000, size=22):
+        self.x, self.y = x, y - 40
+        self.value = str(value)
+        self.color = color
+        self.duration = duration
+        self.timer = 0
+        self.font = get_font(size)
+    def update(self, dt):
+        self.timer += dt
+        self.y -= 0.04 * dt
+    def draw(self, surface):
+        alpha = max(0, 255 - int(255 * (self.timer / self.duration)))
+        for color, d in (((0,0,0), 2), (self.color, 0)):
+            s = self.font.render(self.value, True, color)
+            s.set_alpha(alpha)
+            surface.blit(s, (self.x - s.get_width()//2 + d, self.y + d))
+    def is_expired(self):
+        return self.timer >= self.duration
+
+# -------------------------
+# Benchmark
+# -------------------------
+def run(label, frames, chars, make_text, step, surface):
+    # turn-based pattern: one character attacks at a time with idle gaps;
+    # every hit spawns a damage number
+    rng = random.Random(1)
+    turn, idle = 0, 0
+    texts = []
+    update_s = draw_s = 0.0
+    for i in range(frames):
+        if all(c.anim_timer == 0 for c in chars):
+            idle += 1
+            if idle > rng.randint(5, 20):
+                chars[turn % len(chars)].play_attack(600)
+                texts.append(make_text(rng.randint(100, 800), 300, rng.randint(5, 250)))
+                turn += 1
+                idle = 0
+        t0 = time.perf_counter()
+        texts = step(chars, texts)
+        t1 = time.perf_counter()
+        for ft in texts:
+            ft.draw(surface)
+        update_s += t1 - t0
+        draw_s += time.perf_counter() - t1
+    us = update_s * 1e6 / frames
+    print(f"{label:10} update {us:7.2f} us/frame   text draw {draw_s * 1e6 / frames:7.2f} us/frame")
+    return us
+
+def legacy_step(chars, texts):
+    for c in chars:
+        c.update(16)
+    out = []
+    for ft in texts:
+        ft.update(16)
+        if not ft.is_expired():
+            out.append(ft)
+    return out
+
+def timeline_step(chars, texts):
+    TIMELINE.update(16)
+    return [ft for ft in texts if not ft.expired] if texts else texts
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare per-character animation updates with the shared tween timeline.")
+    ap.add_argument("--frames", type=int, default=20000)
+    ap.add_argument("--characters", type=int, default=7, help="player plus enemies on screen")
+    args = ap.parse_args()
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    img = pygame.Surface((SPRITE_W, SPRITE_H))
+    base = run("legacy", args.frames, [LegacyCharacter(img) for _ in range(args.characters)],
+               lambda x, y, v: LegacyFloatingText(x, y, v, (255,20,20)), legacy_step, screen)
+    new = run("timeline", args.frames, [Character("Bench", GREEN, (0, 0), image_surface=img) for _ in range(args.characters)],
+              lambda x, y, v: FloatingText(x, y, v, (255,20,20)), timeline_step, screen)
+    TIMELINE.clear()
+    t0 = time.perf_counter()
+    for _ in range(args.frames):
+        TIMELINE.update(16)
+    print(f"idle timeline {(time.perf_counter() - t0) * 1e6 / args.frames:.2f} us/frame")
+    print(f"update: timeline vs legacy {(new / base - 1) * 100:+.1f}%")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
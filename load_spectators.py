@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import time
+
+from spectator_client import apply_message
+
+# -------------------------
+# Spectator swarm (own process, so it does not share the game's GIL)
+# -------------------------
+async def spectator(host, port, deadline):
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                return None
+            await asyncio.sleep(0.05)
+    state, messages, nbytes = {}, 0, 0
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        apply_message(state, line)
+        messages += 1
+        nbytes += len(line)
+    writer.close()
+    return messages, nbytes, state
+
+async def swarm(host, port, clients, connect_timeout):
+    deadline = time.monotonic() + connect_timeout
+    return await asyncio.gather(*(spectator(host, port, deadline) for _ in range(clients)))
+
+def run_swarm(host, port, clients, connect_timeout, out):
+    out.put(asyncio.run(swarm(host, port, clients, connect_timeout)))
+
+# -------------------------
+# Game runs
+# -------------------------
+GAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aaa_full.py")
+REPLAY_LINE = re.compile(r"\[replay\] .*: (\d+) frames in ([\d.]+) s")
+
+def replay(recording, extra):
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    proc = subprocess.run([sys.executable, GAME, "--replay", recording, "--no-win-hud"] + extra, env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    m = REPLAY_LINE.search(proc.stdout)
+    if not m:
+        sys.exit(f"replay failed:\n{proc.stdout[-2000:]}")
+    spect = [line for line in proc.stdout.splitlines() if line.startswith("[spectate]")]
+    return int(m.group(1)), float(m.group(2)) * 1000 / int(m.group(1)), spect
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure game frame cost with and without many spectators connected.")
+    ap.add_argument("recording", help="input recording made with --record (replayed uncapped)")
+    ap.add_argument("--clients", type=int, default=100)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--repeat", type=int, default=2, help="runs per configuration; the fastest is kept")
+    args = ap.parse_args()
+
+    base = min(replay(args.recording, [])[1] for _ in range(args.repeat))
+    print(f"[load] no server:            {base:6.3f} ms/frame")
+    best = None
+    for _ in range(args.repeat):
+        out = multiprocessing.Queue()
+        sw = multiprocessing.Process(target=run_swarm, args=("127.0.0.1", args.port, args.clients, 30, out))
+        sw.start()
+        frames, ms, spect = replay(args.recording, ["--spectate", str(args.port)])
+        results = out.get(timeout=60)
+        sw.join()
+        if best is None or ms < best[0]:
+            best = (ms, results, spect)
+    ms, results, spect = best
+    connected = [r for r in results if r is not None]
+    print(f"[load] {args.clients} spectators:      {ms:6.3f} ms/frame ({(ms / base - 1) * 100:+.1f}%)")
+    for line in spect:
+        print(line)
+    if connected:
+        msgs = [r[0] for r in connected]
+        kb = sum(r[1] for r in connected) / len(connected) / 1024
+        final = connected[0][2]
+        same = all(r[2] == final for r in connected)
+        print(f"[load] {len(connected)}/{args.clients} connected, {min(msgs)}-{max(msgs)} messages "
+              f"({kb:.1f} KB) per client, final state identical on all clients: {same}")
+    else:
+        print("[load] no spectator managed to connect")
+
+if __name__ == "__main__":
+    main()
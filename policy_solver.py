@@ -0,0 +1,157 @@
+import argparse
+import random
+import time
+
+from aaa_full import (BattleSim, ENEMY_SPECIALS, POLICY_ACTIONS, POLICY_CLASSES, POLICY_FILE,
+                      PolicyTable, pick_enemy_for_floor, policy_digits, policy_key, roll_enemy_move)
+
+WIN, LOSS = -1, -2
+
+# -------------------------
+# Discretized state -> representative battle
+# -------------------------
+def _bucket_range(b, n, top):
+    lo = max(1, -(-b * top // n))
+    hi = top if b == n - 1 else max(lo, -(-(b + 1) * top // n) - 1)
+    return lo, hi
+
+def sim_from_key(key, template, rng=None):
+    # rng=None gives the bucket's lower bound (used for action legality);
+    # otherwise a uniform point inside the bucket, so small hits and heals
+    # cross bucket edges with the right probability
+    hp_b, mp_b, rage_b, ehp_b, spec_b, poison, vuln, stun, iron, inv, burn = policy_digits(key)
+    pick = (lambda lo, hi: lo) if rng is None else rng.randint
+    s = template.copy()
+    s.p_hp = pick(*_bucket_range(hp_b, 10, s.p_max_hp))
+    mp_lo = min(s.p_max_mp, mp_b * 5)
+    s.p_mp = pick(mp_lo, min(s.p_max_mp, mp_lo + 4) if mp_b < 8 else s.p_max_mp)
+    s.rage = 100 if rage_b == 4 else pick(rage_b * 25, rage_b * 25 + 24)
+    s.e_hp = pick(*_bucket_range(ehp_b, 10, s.e_max_hp))
+    spec = ENEMY_SPECIALS.get(s.e_prefix)
+    s.e_mp = min(template.e_mp, spec_b * spec[0]) if spec else template.e_mp
+    s.p_status = {'poison': poison, 'stun': stun, 'vulnerability': vuln, 'invulnerable': inv, 'iron_skin': iron}
+    if inv:
+        s.p_status['reflect_pct'] = 0.5
+    s.e_status = {'poison': 0, 'stun': 0, 'vulnerability': 0, 'invulnerable': 0, 'burn': burn}
+    return s
+
+# -------------------------
+# Memoized transition model + value iteration
+# -------------------------
+def build_model(template, samples, rng):
+    # one decision = player action followed by the enemy's classic reply;
+    # outcome distributions are sampled once per (state, action) and reused
+    start = policy_key(template)
+    model = {}
+    frontier = [start]
+    while frontier:
+        key = frontier.pop()
+        if key in model:
+            continue
+        per_action = []
+        for act in sim_from_key(key, template).legal_player_actions():
+            counts = {}
+            for _ in range(samples):
+                s = sim_from_key(key, template, rng)
+                s.step_player(act, rng)
+                if s.winner is None:
+                    s.step_enemy(roll_enemy_move(s.e_prefix, s.e_mp, rng), rng)
+                if s.winner == 'player':
+                    nxt = WIN
+                elif s.winner == 'enemy':
+                    nxt = LOSS
+                else:
+                    nxt = policy_key(s)
+                    if nxt not in model:
+                        frontier.append(nxt)
+                counts[nxt] = counts.get(nxt, 0) + 1
+            per_action.append((POLICY_ACTIONS.index(act), [(k, c / samples) for k, c in counts.items()]))
+        model[key] = per_action
+    return start, model
+
+def value_iteration(model, tol=1e-4, max_sweeps=500):
+    value = dict.fromkeys(model, 0.0)
+    value[WIN] = 1.0
+    value[LOSS] = 0.0
+    for sweep in range(max_sweeps):
+        delta = 0.0
+        for key, per_action in model.items():
+            top = 0.0
+            for a, outcomes in per_action:
+                v = 0.0
+                for nxt, p in outcomes:
+                    v += p * value[nxt]
+                if v > top:
+                    top = v
+            delta = max(delta, abs(top - value[key]))
+            value[key] = top
+        if delta < tol:
+            break
+    return value, sweep + 1
+
+def fastest_actions(model, value, slack=1e-3, max_sweeps=500):
+    # win chance alone cannot tell a finishing blow from shielding forever, so
+    # among the actions within `slack` of the best chance pick the one with the
+    # fewest expected turns until the fight ends
+    near = {}
+    for key, per_action in model.items():
+        cands = []
+        for a, outcomes in per_action:
+            if sum(p * value[nxt] for nxt, p in outcomes) >= value[key] - slack:
+                cands.append((a, outcomes))
+        near[key] = cands
+    turns = dict.fromkeys(model, 0.0)
+    turns[WIN] = turns[LOSS] = 0.0
+    best = {}
+    for _ in range(max_sweeps):
+        delta = 0.0
+        for key, cands in near.items():
+            low, low_a = None, 0
+            for a, outcomes in cands:
+                t = 1.0
+                for nxt, p in outcomes:
+                    t += p * turns[nxt]
+                if low is None or t < low:
+                    low, low_a = t, a
+            delta = max(delta, abs(low - turns[key]))
+            turns[key] = low
+            best[key] = low_a
+        if delta < 1e-3:
+            break
+    return best
+
+def solve(class_type, floor, samples=12, seed=0):
+    template = BattleSim.for_floor(class_type, floor)
+    rng = random.Random(seed)
+    start, model = build_model(template, samples, rng)
+    value, sweeps = value_iteration(model)
+    best = fastest_actions(model, value)
+    table = {k: (best[k] << 8) | int(round(value[k] * 255)) for k in model}
+    return table, value[start], sweeps
+
+# -------------------------
+# CLI
+# -------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Solve best player actions per class and floor and write a policy table.")
+    ap.add_argument("--out", default=POLICY_FILE)
+    ap.add_argument("--classes", nargs="*", default=list(POLICY_CLASSES), choices=POLICY_CLASSES)
+    ap.add_argument("--floors", nargs="*", type=int, default=list(range(1, 9)))
+    ap.add_argument("--samples", type=int, default=12, help="outcome samples per state and action")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    sections = {}
+    print(f"{'class':8} {'floor':>5} {'enemy':16} {'states':>7} {'sweeps':>6} {'win%':>6} {'solve s':>8} {'bytes':>8}")
+    for cls in args.classes:
+        for floor in args.floors:
+            t0 = time.perf_counter()
+            table, win, sweeps = solve(cls, floor, args.samples, args.seed)
+            elapsed = time.perf_counter() - t0
+            sections[(cls, floor)] = table
+            print(f"{cls:8} {floor:5d} {pick_enemy_for_floor(floor)[0]:16} {len(table):7d} {sweeps:6d} "
+                  f"{win*100:6.1f} {elapsed:8.2f} {len(table)*6:8d}")
+    size = PolicyTable(sections).save(args.out)
+    print(f"[policy] Wrote {args.out}: {len(sections)} sections, {size} bytes")
+
+if __name__ == "__main__":
+    main()
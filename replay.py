@@ -0,0 +1,40 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# -------------------------
+# Replay runner: re-run recorded sessions headless and uncapped
+# -------------------------
+GAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aaa_full.py")
+
+def run_one(path, extra):
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, GAME, "--replay", path] + extra, env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    elapsed = time.perf_counter() - t0
+    report = [line for line in proc.stdout.splitlines() if line.startswith("[replay]")]
+    for line in report:
+        print(line)
+    if proc.returncode not in (0, 1):
+        print(proc.stdout[-2000:])
+    return proc.returncode == 0, elapsed
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay input recordings (made with --record) and check their final state.")
+    ap.add_argument("recordings", nargs="+")
+    ap.add_argument("--event-log", metavar="DIR", help="also write the replayed battle events into DIR")
+    args = ap.parse_args()
+    failed = 0
+    total = 0.0
+    for path in args.recordings:
+        ok, elapsed = run_one(path, ["--event-log", args.event_log] if args.event_log else [])
+        total += elapsed
+        failed += not ok
+    print(f"[replay] {len(args.recordings) - failed}/{len(args.recordings)} recordings OK in {total:.1f} s")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from aaa_full import (CLASS_STATS, FLOOR_ASSETS, GREEN, HEIGHT, SPRITE_H, SPRITE_W, SURFACES, TIMELINE, WIDTH, BattleStage, Character,
+                      draw_battle_panel_lr, draw_battle_sprites, get_font, spawn_enemy, try_load_image_fuzzy)
+
+# -------------------------
+# Memory probe
+# -------------------------
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# -------------------------
+# Soak: climb the endless tower headless
+# -------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Climb the endless tower headless and report memory and time per floor.")
+    ap.add_argument("--floors", type=int, default=10000)
+    ap.add_argument("--frames", type=int, default=2, help="battle frames drawn per floor")
+    ap.add_argument("--report-every", type=int, default=1000)
+    ap.add_argument("--player-class", default="Warrior", choices=sorted(CLASS_STATS))
+    args = ap.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    font = get_font(20)
+    bigfont = get_font(34)
+    p_prefix = 'tanker' if args.player_class == 'Tank' else args.player_class.lower()
+    player = Character("Soak", GREEN, (0, 0), image_surface=try_load_image_fuzzy(p_prefix, (SPRITE_W, SPRITE_H)), prefix=p_prefix)
+    player.class_type = args.player_class
+    player.max_hp = player.hp = CLASS_STATS[args.player_class][0]
+    generic_enemy_img = try_load_image_fuzzy("enemy", (SPRITE_W, SPRITE_H))
+
+    start_rss = rss_mb()
+    print(f"[soak] start rss {start_rss:.1f} MB")
+    t_start = time.perf_counter()
+    t_window = t_start
+    worst_ms = 0.0
+    for floor in range(1, args.floors + 1):
+        t0 = time.perf_counter()
+        enemy = spawn_enemy(floor, generic_enemy_img)
+        stage = BattleStage(player, [enemy], floor)
+        for _ in range(args.frames):
+            SURFACES.begin_frame()
+            TIMELINE.update(16)
+            screen.fill((8, 10, 12))
+            bottom = draw_battle_panel_lr(screen, font, bigfont, player, enemy, "soak", 'player_turn', floor)
+            draw_battle_sprites(screen, stage, font, "soak", enemy)
+        enemy.hp = 0
+        stage.close()
+        worst_ms = max(worst_ms, (time.perf_counter() - t0) * 1000)
+        if floor % args.report_every == 0 or floor == args.floors:
+            now = time.perf_counter()
+            n = (floor - 1) % args.report_every + 1
+            print(f"[soak] floor {floor:6d}  {enemy.name:22}  hp {enemy.max_hp:8d}  rss {rss_mb():7.1f} MB  "
+                  f"{(now - t_window) * 1000 / n:6.2f} ms/floor  cached {len(FLOOR_ASSETS.surfaces)}  "
+                  f"evicted {FLOOR_ASSETS.evictions}  store {SURFACES.bytes_used / 1048576:.1f} MB")
+            t_window = now
+    total = time.perf_counter() - t_start
+    end_rss = rss_mb()
+    print(f"[soak] {args.floors} floors in {total:.1f} s ({total * 1000 / args.floors:.2f} ms/floor, "
+          f"worst {worst_ms:.1f} ms), rss {start_rss:.1f} -> {end_rss:.1f} MB ({end_rss - start_rss:+.1f} MB)")
+    print(f"[surfaces] {SURFACES.summary()}")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
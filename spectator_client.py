@@ -0,0 +1,108 @@
+import argparse
+import json
+import socket
+import sys
+
+import pygame
+
+from aaa_full import SPECTATE_HOST, TRACKED_STATUSES, WHITE, draw_hp_bar_colored, get_font
+
+# -------------------------
+# State from the server's full snapshots and deltas
+# -------------------------
+def apply_message(state, line):
+    msg = json.loads(line)
+    if msg['t'] == 'full':
+        state.clear()
+    for k, v in msg['v'].items():
+        if v is None:
+            state.pop(k, None)
+        else:
+            state[k] = v
+
+def status_text(bits):
+    return " ".join(k.upper() for i, k in enumerate(TRACKED_STATUSES) if bits & (1 << i))
+
+# -------------------------
+# Rendering
+# -------------------------
+def draw_side(surface, font, small, state, prefix, x, y, w):
+    name = state.get(prefix + 'name', '?')
+    surface.blit(font.render(name, True, WHITE), (x, y))
+    draw_hp_bar_colored(surface, x, y + 28, w, 14, state.get(prefix + 'hp', 0), state.get(prefix + 'max_hp', 0), (28,200,40))
+    hp = small.render(f"{state.get(prefix + 'hp', 0)}/{state.get(prefix + 'max_hp', 0)}", True, (200,200,210))
+    surface.blit(hp, (x + w + 8, y + 26))
+    if prefix + 'max_mp' in state:
+        draw_hp_bar_colored(surface, x, y + 46, w, 10, state.get(prefix + 'mp', 0), state[prefix + 'max_mp'], (64,150,255))
+    extra = status_text(state.get(prefix + 'st', 0))
+    if prefix == 'p.':
+        extra = f"RAGE {state.get('p.rage', 0)}  " + extra
+    surface.blit(small.render(extra, True, (255,200,120)), (x, y + 60))
+
+def draw_state(surface, font, small, state, connected):
+    surface.fill((12,14,18))
+    if not connected:
+        surface.blit(font.render("Waiting for the game...", True, (150,150,160)), (20, 20))
+        return
+    head = f"FLOOR {state.get('floor', '?')}  [{state.get('menu', '?')}]"
+    surface.blit(font.render(head, True, (220,220,230)), (20, 14))
+    surface.blit(small.render(state.get('msg', ''), True, (200,200,210)), (20, 44))
+    if 'p.hp' in state:
+        state.setdefault('p.name', 'Player')
+        draw_side(surface, font, small, state, 'p.', 20, 80, 240)
+    for i in range(state.get('n', 0)):
+        draw_side(surface, font, small, state, f'e{i}.', 360, 80 + i * 84, 200)
+
+# -------------------------
+# Main
+# -------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Watch a game started with --spectate PORT.")
+    ap.add_argument("port", type=int)
+    ap.add_argument("--host", default=SPECTATE_HOST)
+    args = ap.parse_args()
+    pygame.init()
+    screen = pygame.display.set_mode((660, 600))
+    pygame.display.set_caption("Tower Run - spectator")
+    font = get_font(20)
+    small = get_font(14)
+    clock = pygame.time.Clock()
+    state = {}
+    sock = None
+    buf = b""
+    running = True
+    while running:
+        clock.tick(30)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+        if sock is None:
+            try:
+                sock = socket.create_connection((args.host, args.port), timeout=0.2)
+                sock.setblocking(False)
+                buf = b""
+            except OSError:
+                sock = None
+        if sock is not None:
+            try:
+                while True:
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        sock.close()
+                        sock = None
+                        break
+                    buf += chunk
+            except BlockingIOError:
+                pass
+            except OSError:
+                sock = None
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                apply_message(state, line)
+        draw_state(screen, font, small, state, sock is not None)
+        pygame.display.flip()
+    pygame.quit()
+    sys.exit()
+
+if __name__ == "__main__":
+    main()
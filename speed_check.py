@@ -0,0 +1,101 @@
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from aaa_full import BATTLE_SPEEDS, CLASS_STATS, FPS, HEIGHT, RECORDED_OPTIONS, RECORDING_VERSION, WIDTH, parse_args
+
+GAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aaa_full.py")
+CLASSES = ['Warrior', 'Mage', 'Tank', 'Archer']
+
+# -------------------------
+# Scripted input: the same decisions at every speed
+# -------------------------
+def click(x, y):
+    return {'type': 'MOUSEBUTTONDOWN', 'pos': [x, y], 'button': 1}
+
+def key(k, u=''):
+    return {'type': 'KEYDOWN', 'key': k, 'unicode': u, 'mod': 0}
+
+def write_recording(path, seed, speed, frames, player_class, max_enemies):
+    # Start, default name, class, then every frame the same inputs. Each
+    # one only does something on the screen or turn state it belongs to
+    # (ultimate or attack on the player's turn, first reward / retry,
+    # map entry), so the choices follow the battle, not the frame count.
+    opts = parse_args([])
+    opts.battle_speed = speed
+    opts.max_enemies = max_enemies
+    options = {k: getattr(opts, k) for k in RECORDED_OPTIONS}
+    i = CLASSES.index(player_class)
+    class_x = WIDTH//2 - (len(CLASSES) * 160 + (len(CLASSES) - 1) * 20)//2 + i * 180 + 80
+    script = {1: [click(WIDTH//2, HEIGHT//2 - 16)], 2: [key(pygame.K_RETURN)], 3: [click(class_x, HEIGHT//2 + 64)]}
+    every = [click(WIDTH//2 - 100, HEIGHT//2 + 64), click(WIDTH//2, HEIGHT//2 + 130), key(pygame.K_u, 'u'), key(pygame.K_a, 'a')]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({'version': RECORDING_VERSION, 'seed': seed, 'options': options}) + "\n")
+        for n in range(frames):
+            f.write(json.dumps({'dt': 1000 // FPS, 'ev': script.get(n, every if n > 3 else [])}) + "\n")
+
+def battle_events(log_dir):
+    # outcome records without the timing fields
+    out = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "events-*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                frame = rec.pop('frame')
+                rec.pop('t_ms')
+                out.append((frame, rec))
+    return out
+
+def run_speed(work, seed, speed, frames, player_class, max_enemies):
+    rec = os.path.join(work, f"speed-{speed}.jsonl")
+    logs = os.path.join(work, f"events-{speed}")
+    write_recording(rec, seed, speed, frames, player_class, max_enemies)
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    proc = subprocess.run([sys.executable, GAME, "--replay", rec, "--event-log", logs, "--no-audio", "--no-win-hud"],
+                          env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if proc.returncode != 0:
+        print(proc.stdout[-2000:])
+        raise SystemExit(f"[speed] {speed}: game exited with {proc.returncode}")
+    return battle_events(logs)
+
+# -------------------------
+# Check: battle outcomes do not depend on the speed setting
+# -------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Play the same seeded run at every battle speed and fail if the battle "
+                                             "events differ.")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--frames", type=int, default=3000, help="frames played at each speed")
+    ap.add_argument("--player-class", default="Warrior", choices=sorted(CLASS_STATS))
+    ap.add_argument("--max-enemies", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as work:
+        runs = {speed: run_speed(work, args.seed, speed, args.frames, args.player_class, args.max_enemies)
+                for speed in BATTLE_SPEEDS}
+    base = runs[BATTLE_SPEEDS[0]]
+    n = min(len(events) for events in runs.values())
+    ok = True
+    for speed, events in runs.items():
+        turns = sum(1 for _, rec in events[:n] if rec['event'] == 'action')
+        last = events[n - 1][0] if n else 0
+        same = [rec for _, rec in events[:n]] == [rec for _, rec in base[:n]]
+        ok &= same
+        print(f"[speed] {speed:8} {len(events):5d} events in {args.frames} frames; first {n} ({turns} player actions) "
+              f"took {last} frames, {'identical' if same else 'DIFFERENT'}")
+        if not same:
+            i = next(i for i in range(n) if events[i][1] != base[i][1])
+            print(f"[speed]   first difference at event {i}: {base[i][1]} vs {events[i][1]}")
+    return 0 if ok and n else 1
+
+if __name__ == "__main__":
+    sys.exit(main())